@@ -2,12 +2,18 @@
 
 import re
 import sys
+from multiprocessing import Pool
 
 import numpy as np
 import pandas as pd
 
+from attacut import preprocessing as pp
+
 SEPARATOR = "|"
 
+# removing tags and collapsing repeated separators, fused into one regex pass
+NORMALIZE_STEPS = ("remove_tags", "collapse_pipes")
+
 # regex for removing to a space surrounded by separators, i.e. abc| | -> abc
 TAILING_SURROUNDING_SEPS_RX = re.compile(
     "{sep}? ?{sep}$".format(sep=re.escape(SEPARATOR))
@@ -22,6 +28,18 @@ TAG_RX = re.compile("<\/?[A-Z]+>")
 # regex for tailing separator, i.e.  a|dog| -> a|dog
 TAILING_SEP_RX = re.compile("{sep}$".format(sep=re.escape(SEPARATOR)))
 
+# corpus-level counts, i.e. sums of the per-sample statistics
+COUNT_COLUMNS = [
+    "char_level:tp",
+    "char_level:fp",
+    "char_level:tn",
+    "char_level:fn",
+    "word_level:correctly_tokenised_words",
+    "word_level:total_words_in_sample",
+    "word_level:total_words_in_ref_sample",
+]
+
+
 def _f1(precision: float, recall: float) -> float:
     """
     Compute f1.
@@ -105,12 +123,10 @@ def preprocessing(txt: str, remove_space: bool = True) -> str:
     :return: preprocessed text
     :rtype: str
     """
-    txt = txt.strip()
-    txt = re.sub(TAG_RX, "", txt)
-    txt = re.sub(MULTIPLE_SEPS_RX, "|", txt)
+    txt = pp.compile_steps(NORMALIZE_STEPS)(txt.strip())
 
-    txt = re.sub(TAILING_SURROUNDING_SEPS_RX, "", txt)
-    txt = re.sub(TAILING_SEP_RX, "", txt).strip()
+    txt = TAILING_SURROUNDING_SEPS_RX.sub("", txt)
+    txt = TAILING_SEP_RX.sub("", txt).strip()
 
     if txt[-1] == "|":
         raise SystemExit("still has some tailing pipe (|)")
@@ -245,4 +261,306 @@ def _find_words_correctly_tokenised(
     ref_b = dict(zip(ref_boundaries, [1] * len(ref_boundaries)))
 
     labels = tuple(map(lambda x: ref_b.get(x, 0), predicted_boundaries))
-    return labels
\ No newline at end of file
+    return labels
+
+
+def benchmark_corpus(ref_samples: list, samples: list, per_sample: bool = False,
+    num_workers: int = 0, chunk_size: int = 50000) -> dict:
+    """
+    Corpus-level counterpart of :meth:`benchmark`.
+    Both corpora are turned into concatenated {0, 1} arrays with line offsets,
+    and the statistics are computed in a few vectorized passes.
+    :param list[str] ref_samples: ground truth samples
+    :param list[str] samples: samples that we want to evaluate
+    :param bool per_sample: also return per-sample counts and indicators
+    :param int num_workers: number of processes; chunks of ``chunk_size``
+        pairs are evaluated in parallel when larger than one
+    :return: counts summed over the corpus (keys as in COUNT_COLUMNS) and,
+        if ``per_sample``, a ``per_sample`` dict of per-line arrays
+    :rtype: dict
+    """
+    pairs = list(zip(ref_samples, samples))
+
+    if num_workers > 1 and len(pairs) > chunk_size:
+        chunks = [
+            (pairs[i:i+chunk_size], i, per_sample)
+            for i in range(0, len(pairs), chunk_size)
+        ]
+        with Pool(num_workers) as pool:
+            results = pool.map(_benchmark_chunk, chunks)
+    else:
+        results = [_benchmark_chunk((pairs, 0, per_sample))]
+
+    stats = dict((c, sum(r[c] for r in results)) for c in COUNT_COLUMNS)
+
+    if per_sample:
+        stats["per_sample"] = dict(
+            (k, np.concatenate([r["per_sample"][k] for r in results]))
+            for k in results[0]["per_sample"].keys()
+        )
+
+    return stats
+
+
+def summarize(stats: dict) -> dict:
+    """
+    Add precision, recall and f1 at character and word level to corpus counts.
+    :param dict stats: counts from :meth:`benchmark_corpus`
+    :return: float counts together with the derived metrics
+    :rtype: dict[str, float]
+    """
+    def _div(a, b):
+        return a / b if b > 0 else 0.0
+
+    st = dict((c, float(stats[c])) for c in COUNT_COLUMNS)
+
+    st["char_level:precision"] = _div(
+        st["char_level:tp"], st["char_level:tp"] + st["char_level:fp"]
+    )
+    st["char_level:recall"] = _div(
+        st["char_level:tp"], st["char_level:tp"] + st["char_level:fn"]
+    )
+    st["char_level:f1"] = _f1(st["char_level:precision"], st["char_level:recall"])
+
+    st["word_level:precision"] = _div(
+        st["word_level:correctly_tokenised_words"], st["word_level:total_words_in_sample"]
+    )
+    st["word_level:recall"] = _div(
+        st["word_level:correctly_tokenised_words"], st["word_level:total_words_in_ref_sample"]
+    )
+    st["word_level:f1"] = _f1(st["word_level:precision"], st["word_level:recall"])
+
+    return st
+
+
+def _benchmark_chunk(args) -> dict:
+    pairs, start_ix, per_sample = args
+
+    refs, samples, index = [], [], []
+    for i, (r, s) in enumerate(pairs):
+        # empty lines can't be evaluated, see `benchmark`
+        if not r.strip() or not s.strip():
+            continue
+
+        refs.append(preprocessing(r))
+        samples.append(preprocessing(s))
+        index.append(start_ix + i)
+
+    ref_bits, ref_offsets = _corpus_binary_representation(refs)
+    bits, offsets = _corpus_binary_representation(samples)
+
+    stats = compute_corpus_stats(ref_bits, ref_offsets, bits, offsets, per_sample)
+
+    if per_sample:
+        stats["per_sample"]["index"] = np.array(index, dtype=np.int64)
+
+    return stats
+
+
+def compute_corpus_stats(ref_bits, ref_offsets, bits, offsets, per_sample=False) -> dict:
+    """
+    Compute :meth:`compute_stats` for every line at once.
+    :param np.ndarray ref_bits: concatenated {0, 1} reference sequences
+    :param np.ndarray ref_offsets: start of each reference line, plus the total length
+    :param np.ndarray bits: concatenated {0, 1} predicted sequences
+    :param np.ndarray offsets: start of each predicted line, plus the total length
+    :param bool per_sample: also return per-line counts and indicators
+    :return: counts summed over lines (and per line if ``per_sample``)
+    :rtype: dict
+    """
+    total_lines = ref_offsets.shape[0] - 1
+
+    ref_lengths = np.diff(ref_offsets)
+    lengths = np.diff(offsets)
+
+    # lines whose lengths differ (the tokenizer changed the text)
+    # are rare; they fall back to the per-line implementation.
+    same = ref_lengths == lengths
+
+    counts = dict((c, np.zeros(total_lines, dtype=np.int64)) for c in COUNT_COLUMNS)
+    indicators = [""] * total_lines if per_sample else None
+
+    if same.any():
+        r = ref_bits[np.repeat(same, ref_lengths)].astype(bool)
+        p = bits[np.repeat(same, lengths)].astype(bool)
+
+        line_offsets = np.concatenate(([0], np.cumsum(ref_lengths[same])))
+        line_ix = np.flatnonzero(same)
+
+        def _per_line(x):
+            cs = np.concatenate(([0], np.cumsum(x)))
+            return cs[line_offsets[1:]] - cs[line_offsets[:-1]]
+
+        counts["char_level:tp"][line_ix] = _per_line(r & p)
+        counts["char_level:fp"][line_ix] = _per_line(~r & p)
+        counts["char_level:tn"][line_ix] = _per_line(~r & ~p)
+        counts["char_level:fn"][line_ix] = _per_line(r & ~p)
+        counts["word_level:total_words_in_sample"][line_ix] = _per_line(p)
+        counts["word_level:total_words_in_ref_sample"][line_ix] = _per_line(r)
+
+        # a predicted word [s, e) is correct if the reference has boundaries
+        # at s and e and none in between; every line starts with a boundary,
+        # so e (the next predicted start) never crosses into the next line.
+        starts = np.flatnonzero(p)
+        ends = np.append(starts[1:], p.shape[0])
+
+        r_ext = np.append(r, True)
+        cs_r = np.concatenate(([0], np.cumsum(r)))
+        correct = r_ext[starts] & r_ext[ends] & (cs_r[ends] - cs_r[starts + 1] == 0)
+
+        word_line = np.searchsorted(line_offsets, starts, side="right") - 1
+        counts["word_level:correctly_tokenised_words"][line_ix] = np.bincount(
+            word_line, weights=correct, minlength=line_ix.shape[0]
+        ).astype(np.int64)
+
+        if per_sample:
+            words_per_line = np.bincount(word_line, minlength=line_ix.shape[0])
+            for i, ind in zip(line_ix, np.split(correct.astype(np.int8), np.cumsum(words_per_line)[:-1])):
+                indicators[i] = "".join(map(str, ind))
+
+    for i in np.flatnonzero(~same):
+        st = _stats_from_bits(
+            ref_bits[ref_offsets[i]:ref_offsets[i+1]], bits[offsets[i]:offsets[i+1]]
+        )
+
+        for c in COUNT_COLUMNS:
+            counts[c][i] = st[c]
+
+        if per_sample:
+            indicators[i] = st["global:tokenisation_indicators"]
+
+    stats = dict((c, int(v.sum())) for c, v in counts.items())
+
+    if per_sample:
+        stats["per_sample"] = dict(counts)
+        stats["per_sample"]["global:tokenisation_indicators"] = np.array(indicators, dtype=object)
+
+    return stats
+
+
+def _stats_from_bits(ref_sample, sample) -> dict:
+    # the same computation as `compute_stats` on {0, 1} sequences
+    c_pos_pred, c_neg_pred = np.argwhere(sample == 1), np.argwhere(sample == 0)
+
+    c_pos_pred = c_pos_pred[c_pos_pred < ref_sample.shape[0]]
+    c_neg_pred = c_neg_pred[c_neg_pred < ref_sample.shape[0]]
+
+    tokenization_indicators = _find_words_correctly_tokenised(
+        _find_word_boudaries(ref_sample), _find_word_boudaries(sample)
+    )
+
+    return {
+        "char_level:tp": np.sum(ref_sample[c_pos_pred] == 1),
+        "char_level:fp": np.sum(ref_sample[c_pos_pred] == 0),
+        "char_level:tn": np.sum(ref_sample[c_neg_pred] == 0),
+        "char_level:fn": np.sum(ref_sample[c_neg_pred] == 1),
+        "word_level:correctly_tokenised_words": np.sum(tokenization_indicators),
+        "word_level:total_words_in_sample": np.sum(sample),
+        "word_level:total_words_in_ref_sample": np.sum(ref_sample),
+        "global:tokenisation_indicators": "".join(map(str, tokenization_indicators)),
+    }
+
+
+def _corpus_binary_representation(samples: list):
+    """
+    Transform texts to one concatenated {0, 1} sequence, see :meth:`_binary_representation`.
+    :param list[str] samples: texts with separators
+    :return: {0, 1} sequence (uint8) and offsets of each text (with the total length at the end)
+    :rtype: tuple[np.ndarray, np.ndarray]
+    """
+    lengths = np.fromiter(map(len, samples), dtype=np.int64, count=len(samples))
+    offsets = np.concatenate(([0], np.cumsum(lengths)))
+
+    chars = np.frombuffer("".join(samples).encode("utf-32-le"), dtype=np.uint32)
+
+    is_sep = chars == ord(SEPARATOR)
+
+    is_boundary = np.zeros(chars.shape[0], dtype=bool)
+    is_boundary[1:] = is_sep[:-1]
+    is_boundary[offsets[:-1][lengths > 0]] = True
+
+    bits = is_boundary[~is_sep].astype(np.uint8)
+
+    cs = np.concatenate(([0], np.cumsum(is_sep)))
+    seps_per_line = cs[offsets[1:]] - cs[offsets[:-1]]
+
+    return bits, np.concatenate(([0], np.cumsum(lengths - seps_per_line)))
+
+
+def words_to_bits(words: list) -> np.ndarray:
+    """
+    {0, 1} representation of a tokenized line, i.e. the same as
+    :meth:`_binary_representation` of ``preprocessing("|".join(words))``
+    without building and parsing the joined string when it's not needed.
+    :param list[str] words: tokenized line
+    :return: {0, 1} sequence (uint8); empty if nothing is left after preprocessing
+    :rtype: np.ndarray
+    """
+    txt = "".join(words)
+
+    if not txt.strip():
+        return np.zeros(0, dtype=np.uint8)
+
+    if txt != txt.strip() or SEPARATOR in txt or TAG_RX.search(txt) or not all(words):
+        bits, _ = _corpus_binary_representation([preprocessing(SEPARATOR.join(words))])
+        return bits
+
+    bits = np.zeros(len(txt), dtype=np.uint8)
+    bits[np.cumsum([0] + list(map(len, words[:-1])))] = 1
+
+    return bits
+
+
+class CorpusEvaluator:
+    """
+    Streaming counterpart of :meth:`benchmark_corpus`:
+    predictions are scored as soon as they are available.
+    Lines whose reference or prediction is empty are skipped.
+    :param list[str] ref_samples: ground truth samples, one per input line
+    """
+    def __init__(self, ref_samples: list):
+        self.ref_index = np.full(len(ref_samples), -1, dtype=np.int64)
+
+        refs = []
+        for i, r in enumerate(ref_samples):
+            if r.strip():
+                self.ref_index[i] = len(refs)
+                refs.append(preprocessing(r))
+
+        self.ref_bits, self.ref_offsets = _corpus_binary_representation(refs)
+
+        self.reset()
+
+    def reset(self):
+        # start over, e.g. for the next model, keeping the preprocessed references
+        self.counts = dict((c, 0) for c in COUNT_COLUMNS)
+
+    def add(self, line_ix: list, bits: list):
+        """
+        :param list[int] line_ix: line numbers of the predictions
+        :param list[np.ndarray] bits: {0, 1} predictions, see :meth:`words_to_bits`
+        """
+        refs, preds = [], []
+        for i, b in zip(line_ix, bits):
+            if i >= self.ref_index.shape[0] or self.ref_index[i] < 0 or b.shape[0] == 0:
+                continue
+
+            j = self.ref_index[i]
+            refs.append(self.ref_bits[self.ref_offsets[j]:self.ref_offsets[j+1]])
+            preds.append(b)
+
+        if not preds:
+            return
+
+        def _offsets(arrs):
+            return np.concatenate(([0], np.cumsum([a.shape[0] for a in arrs])))
+
+        stats = compute_corpus_stats(
+            np.concatenate(refs), _offsets(refs), np.concatenate(preds), _offsets(preds)
+        )
+
+        for c in COUNT_COLUMNS:
+            self.counts[c] += stats[c]
+
+    def stats(self) -> dict:
+        return dict(self.counts)
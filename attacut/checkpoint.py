@@ -0,0 +1,121 @@
+import os
+import queue
+import random
+import threading
+
+import numpy as np
+import torch
+
+from attacut import logger
+
+log = logger.get_logger(__name__)
+
+# full training state, see scripts/train.py
+CHECKPOINT_FILE = "checkpoint.pth"
+
+
+def to_cpu(obj):
+    # copy tensors so that training can keep updating the originals
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    elif isinstance(obj, dict):
+        return type(obj)((k, to_cpu(v)) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        return type(obj)(to_cpu(v) for v in obj)
+    return obj
+
+
+def atomic_save(obj, path: str):
+    # a crash while writing leaves the previous file intact
+    tmp = "%s.tmp" % path
+    with open(tmp, "wb") as fh:
+        torch.save(obj, fh)
+        fh.flush()
+        os.fsync(fh.fileno())
+
+    os.replace(tmp, path)
+
+
+def rng_state() -> dict:
+    # numpy's keys are kept as a tensor, so that the state only consists
+    # of tensors and python primitives
+    name, keys, pos, has_gauss, cached_gaussian = np.random.get_state()
+
+    state = dict(
+        python=random.getstate(),
+        numpy=(name, torch.from_numpy(keys.astype(np.int64)), pos, has_gauss, cached_gaussian),
+        torch=torch.get_rng_state(),
+    )
+
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+
+    return state
+
+
+def set_rng_state(state: dict):
+    random.setstate(state["python"])
+
+    name, keys, pos, has_gauss, cached_gaussian = state["numpy"]
+    np.random.set_state((name, keys.numpy().astype(np.uint32), pos, has_gauss, cached_gaussian))
+
+    torch.set_rng_state(state["torch"])
+
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+class CheckpointWriter:
+    """
+    Save torch objects from a background thread.
+    The object is copied to CPU memory when :meth:`save` is called and
+    written with :meth:`atomic_save`; :meth:`save` only blocks while a
+    previous write is still in progress.
+    """
+    def __init__(self):
+        self._queue = queue.Queue(maxsize=1)
+        self._error = None
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def save(self, obj, path: str):
+        self._raise_error()
+        self._queue.put((to_cpu(obj), path))
+
+    def wait(self):
+        self._queue.join()
+        self._raise_error()
+
+    def close(self):
+        self.wait()
+        self._queue.put(None)
+        self._thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+
+            if item is None:
+                self._queue.task_done()
+                break
+
+            obj, path = item
+            try:
+                atomic_save(obj, path)
+                log.info("saved %s" % path)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
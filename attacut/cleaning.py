@@ -0,0 +1,90 @@
+import re
+from collections import Counter
+from typing import List, NamedTuple
+
+
+class Rule(NamedTuple):
+    name: str
+    pattern: str
+    replacement: str = ""
+    # pattern is a regular expression, otherwise a literal string;
+    # replacement is always literal
+    regex: bool = False
+
+
+def _independent(earlier: Rule, later: Rule) -> bool:
+    """
+    Whether replacing both literals in one scan gives the same as replacing
+    ``earlier`` everywhere, then ``later``: their occurrences can't overlap
+    (no common characters), and ``earlier``'s replacements can't create
+    occurrences of ``later``, neither with their own characters nor by
+    joining the text around a deleted occurrence (e.g. "<p>" -> "" turns
+    "s<p>s" into "ss").
+    """
+    chars = set(later.pattern)
+
+    return not chars & set(earlier.pattern) \
+        and not chars & set(earlier.replacement) \
+        and (earlier.replacement != "" or len(later.pattern) == 1)
+
+
+class Cleaner:
+    """
+    Apply a list of rules to lines, giving the same as applying them one after
+    another (``str.replace`` for literals, ``re.sub`` for regular expressions).
+    Consecutive literal rules that can't affect each other (see
+    :func:`_independent`) share a pass: one ``str.translate`` table when all of
+    them are single characters, otherwise one regex alternation; every regex
+    rule is a pass of its own. Matches are counted per rule in :attr:`hits`.
+    """
+    def __init__(self, rules: List[Rule]):
+        names = [r.name for r in rules]
+        assert len(set(names)) == len(names), "rule names should be unique"
+
+        self.rules = rules
+        self.hits = Counter()
+
+        groups = []
+        for r in rules:
+            if not r.regex and groups and not groups[-1][0].regex \
+                and all(_independent(q, r) for q in groups[-1]):
+                groups[-1].append(r)
+            else:
+                groups.append([r])
+
+        self._replacements = dict()
+        self._passes = []
+        for group in groups:
+            if all(not r.regex and len(r.pattern) == 1 for r in group):
+                table = str.maketrans(dict((r.pattern, r.replacement) for r in group))
+                self._passes.append((table, [(r.pattern, r.name) for r in group]))
+                continue
+
+            alternatives = []
+            for r in group:
+                key = "r%d" % len(self._replacements)
+                self._replacements[key] = r
+                alternatives.append("(?P<%s>%s)" % (key, r.pattern if r.regex else re.escape(r.pattern)))
+
+            self._passes.append((re.compile("|".join(alternatives)), None))
+
+    def __call__(self, line: str) -> str:
+        for p, chars in self._passes:
+            if chars is None:
+                line = p.sub(self._replace, line)
+                continue
+
+            for ch, name in chars:
+                n = line.count(ch)
+                if n:
+                    self.hits[name] += n
+
+            line = line.translate(p)
+
+        return line
+
+    def _replace(self, m) -> str:
+        rule = self._replacements[m.lastgroup]
+        self.hits[rule.name] += 1
+
+        return rule.replacement
@@ -1,6 +1,7 @@
 import sys
 import os
 import time
+from contextlib import nullcontext
 
 import numpy as np
 import torch
@@ -8,7 +9,7 @@ from torch.utils.data import Dataset, DataLoader
 from tqdm import tqdm
 
 
-from attacut import Tokenizer, __version__, preprocessing, utils, models
+from attacut import Tokenizer, __version__, benchmark, dataloaders, preprocessing, utils, models
 
 # from https://github.com/pytorch/pytorch/issues/1494#issuecomment-305993854
 from multiprocessing import set_start_method
@@ -20,49 +21,57 @@ except RuntimeError:
 SEP = "|"
 
 
-# For models tranied with weight-decay, some weights are close to zero causing denormal
-# ref: https://en.wikipedia.org/wiki/Denormal_number
-# This block is aken from https://github.com/pytorch/pytorch/issues/19651#issuecomment-486170718
-if not torch.set_flush_denormal(True):
-    print("Unable to set flush denormal")
-    print("Pytorch compiled without advanced CPU")
-    print("at: https://github.com/pytorch/pytorch/blob/84b275b70f73d5fd311f62614bccc405f3d5bfa3/aten/src/ATen/cpu/FlushDenormal.cpp#L13")
+# For models tranied with weight-decay, some weights are close to zero causing denormal;
+# Tokenizer does the same for the threads calling it.
+models.flush_denormal()
 
 
 def get_argument(dict, name, default):
     v = dict.get(name)
     return v if v is not None else default
 
-class AttaCutCLIDataset(Dataset):
-      def __init__(self, src, tokenizer, device):
-          self.src = src
+def featurize(tokenizer, src):
+    """
+    Compute model inputs of every line in ``src`` with ``tokenizer.dataset``.
+    The result can be shared by models whose datasets have the same
+    class and :meth:`attacut.dataloaders.SequenceDataset.dictionary_hash`.
+    """
+    data = []
+    with open(src, "r") as fin:
+        for i, txt in enumerate(fin):
+          txt = preprocessing.TRAILING_SPACE_RX.sub("", txt)
 
-          self.tokenizer = tokenizer
+          with tokenizer.stats.stage("make_feature"):
+              tokens, features = tokenizer.dataset.make_feature(txt)
 
-          self.device = device
+          inputs = (
+              features,
+              torch.zeros(features[1])  # dummy label when won't need it here
+          )
 
-          self.data = []
+          (x, seq), labels, _= tokenizer.dataset.prepare_model_inputs(
+            inputs,
+          )
 
-          self.total_lines = 0
-          with open(self.src, "r") as fin:
-              for i, txt in enumerate(fin):
-                txt = preprocessing.TRAILING_SPACE_RX.sub("", txt)
+          x = dataloaders.drop_batch_dim(x)
 
-                tokens, features = self.tokenizer.dataset.make_feature(txt)
+          # keep the length as a scalar so that collate_fn sees a (batch,) vector
+          data.append((((x, seq.squeeze(0)), labels), tokens))
 
-                inputs = (
-                    features,
-                    torch.zeros(features[1])  # dummy label when won't need it here
-                )
+    return data
 
-                (x, seq), labels, _= self.tokenizer.dataset.prepare_model_inputs(
-                  inputs,
-                )
+class AttaCutCLIDataset(Dataset):
+      def __init__(self, src, tokenizer, device, data=None):
+          self.src = src
 
-                x = torch.squeeze(x)
+          self.tokenizer = tokenizer
+
+          self.device = device
 
-                self.data.append((((x, seq), labels), tokens))
-                self.total_lines += 1
+          # features computed beforehand, see `featurize`
+          self.data = data if data is not None else featurize(tokenizer, src)
+
+          self.total_lines = len(self.data)
 
       def __len__(self):
           return self.total_lines
@@ -77,14 +86,103 @@ def collate_fn(tokenizer, batch, device):
       inputs.append(x)
       tokens.append(t)
 
-    (x, seq), labels, perm_idx = tokenizer.dataset.collate_fn(inputs)
+    with tokenizer.stats.stage("collate_fn"):
+        (x, seq), labels, perm_idx = tokenizer.dataset.collate_fn(inputs)
 
     return ((x.to(device), seq.to(device)), labels, perm_idx), tokens
 
-def main(src, model, num_cores=4, batch_size=32, dest=None, device="cpu"):
+def predict(tokenizer, src, batch_size=32, device="cpu", data=None, pack=False):
+    """
+    Tokenize ``src`` in batches.
+    :param list data: features from :meth:`featurize`, computed if not given
+    :param bool pack: run ``batch_size`` lines as concatenated rows instead of
+        a padded batch, see :meth:`attacut.models.predict_packed`
+    :return: generator of (line number, tokens, predictions) in the file's order
+    """
+    stats = tokenizer.stats
+
+    ds = AttaCutCLIDataset(src, tokenizer, device, data=data)
+    dataloader = DataLoader(
+      ds,
+      batch_size=batch_size,
+      shuffle=False,
+      num_workers=0, # only use main process
+      collate_fn=lambda batch: collate_fn(tokenizer, batch, device)
+    )
+
+    tokenizer.model.to(device)
+
+    tokenizer.model.eval()
 
+    if pack:
+        assert models.can_pack(tokenizer.model), \
+            "packing needs a model with IteratedDilatedConvolutions"
+
+        with torch.no_grad(), tqdm(total=len(ds)) as tq:
+            for i in range(0, len(ds), batch_size):
+                batch = ds.data[i:i+batch_size]
+
+                with stats.stage("model_forward"):
+                    preds = models.predict_packed(
+                        tokenizer.model, [x for ((x, _), _), _ in batch], device=device
+                    )
+
+                for j, ((_, tokens), pred) in enumerate(zip(batch, preds)):
+                    yield i + j, tokens, pred
+
+                tq.update(n=len(batch))
+
+        return
+
+    line_ix = 0
+    with torch.no_grad(), tqdm(total=len(ds)) as tq:
+        for batch in dataloader:
+            (x, labels, perm_idx), tokens = batch
+
+            with stats.stage("model_forward"):
+                logits = tokenizer.model(x)
+
+            seq_lengths = x[1]
+
+            with stats.stage("decode"):
+                preds = tokenizer.model.decode(logits, seq_lengths)
+
+            perm_idx = perm_idx.cpu().detach()
+
+            for ori_ix, after_sorting_ix in enumerate(np.argsort(perm_idx)):
+                yield line_ix, tokens[ori_ix], preds[after_sorting_ix]
+                line_ix += 1
+
+            tq.update(n=seq_lengths.shape[0])
+
+
+def _setup(src, model, num_cores, profile, profile_dest):
     assert num_cores >= 0, "Input given to <num-thread> should greather than or equal one"
 
+    tokenizer = Tokenizer(model, profile=profile or bool(profile_dest))
+
+    total_lines = utils.wc_l(src)
+
+    if num_cores == 0:
+        print(f"Use main process processing for {total_lines} lines")
+    else:
+        print(f"Use {num_cores} cores for processing for {total_lines} lines")
+
+    return tokenizer
+
+
+def _report_profile(stats, profile_dest):
+    if stats.enabled:
+        print(stats.summary())
+
+    if profile_dest:
+        print(f"Saving profile to {profile_dest}")
+        stats.dump(profile_dest)
+
+
+def main(src, model, num_cores=4, batch_size=32, dest=None, device="cpu",
+    profile=False, profile_dest=None, pack=False):
+
     if not src:
       print(__doc__)
       sys.exit(0)
@@ -98,55 +196,93 @@ def main(src, model, num_cores=4, batch_size=32, dest=None, device="cpu"):
     print(f"Using {src}")
     print(f"Output: {dest}")
 
-    tokenizer = Tokenizer(model)
+    tokenizer = _setup(src, model, num_cores, profile, profile_dest)
+    stats = tokenizer.stats
 
-    total_lines = utils.wc_l(src)
+    print(f"device={device}")
 
-    if num_cores == 0:
-        print(f"Use main process processing for {total_lines} lines")
-    else:
-        print(f"Use {num_cores} cores for processing for {total_lines} lines")
+    start_time = time.time()
+
+    with open(dest, "w") as fout:
+        for _, token, pred in predict(tokenizer, src, batch_size, device, pack=pack):
+            with stats.stage("find_words_from_preds"):
+                words = preprocessing.find_words_from_preds(token, pred)
+
+            with stats.stage("write_output"):
+                fout.write("%s\n" % SEP.join(words))
+
+    time_took = time.time() - start_time
 
+    _report_profile(stats, profile_dest)
+
+    return time_took
+
+
+def evaluate(src, label, model, num_cores=4, batch_size=32, dest=None, device="cpu",
+    profile=False, profile_dest=None, pack=False):
+    """
+    Tokenize ``src`` and score the predictions against ``label`` in memory,
+    batch by batch, instead of reading back and re-parsing the output file.
+    :param str dest: optionally, also write the tokenized lines here
+    :return: counts as in :meth:`attacut.benchmark.benchmark_corpus` and time took
+    """
+    tokenizer = _setup(src, model, num_cores, profile, profile_dest)
+    stats = tokenizer.stats
+
+    print(f"Evaluating {src} against {label}")
     print(f"device={device}")
 
     start_time = time.time()
-    ds = AttaCutCLIDataset(src, tokenizer, device)
-    dataloader = DataLoader(
-      ds,
-      batch_size=batch_size,
-      shuffle=False,
-      num_workers=0, # only use main process
-      collate_fn=lambda batch: collate_fn(tokenizer, batch, device)
-    )
 
-    tokenizer.model.to(device)
+    with open(label, "r", encoding="utf-8") as fh:
+        evaluator = benchmark.CorpusEvaluator(list(fh))
 
-    tokenizer.model.eval()
-    results = []
+    score(tokenizer, src, evaluator, batch_size, device, dest=dest, pack=pack)
 
-    with torch.no_grad(), \
-        tqdm(total=total_lines) as tq, \
-        open(dest, "w") as fout:
+    time_took = time.time() - start_time
 
-            for batch in dataloader:
-                (x, labels, perm_idx), tokens = batch
-                logits = tokenizer.model(x)
+    _report_profile(stats, profile_dest)
 
-                seq_lengths = x[1]
+    return evaluator.stats(), time_took
 
-                preds = tokenizer.model.decode(logits, seq_lengths)
 
-                perm_idx = perm_idx.cpu().detach()
+def word_f1(model, data, **kwargs) -> float:
+    """
+    Word-level F1 of ``model`` on ``data``, a directory with input.txt and label.txt
+    (other arguments as in :meth:`evaluate`)
+    """
+    stats, _ = evaluate(f"{data}/input.txt", f"{data}/label.txt", model, **kwargs)
+
+    return benchmark.summarize(stats)["word_level:f1"]
+
 
-                for ori_ix, after_sorting_ix in enumerate(np.argsort(perm_idx)):
-                    pred = preds[after_sorting_ix]
-                    token = tokens[ori_ix]
+def score(tokenizer, src, evaluator, batch_size=32, device="cpu", dest=None, data=None,
+    pack=False):
+    """
+    Feed predictions of ``src`` to ``evaluator`` (:class:`attacut.benchmark.CorpusEvaluator`)
+    as batches finish.
+    :param str dest: optionally, also write the tokenized lines here
+    :param list data: features from :meth:`featurize`, computed if not given
+    """
+    stats = tokenizer.stats
 
-                    words = preprocessing.find_words_from_preds(token, pred)
+    with (open(dest, "w") if dest else nullcontext()) as fout:
+        line_ix, bits = [], []
+        for ix, token, pred in predict(tokenizer, src, batch_size, device, data=data, pack=pack):
+            with stats.stage("find_words_from_preds"):
+                words = preprocessing.find_words_from_preds(token, pred)
+
+            if fout:
+                with stats.stage("write_output"):
                     fout.write("%s\n" % SEP.join(words))
 
-                tq.update(n=seq_lengths.shape[0])
+            with stats.stage("score"):
+                line_ix.append(ix)
+                bits.append(benchmark.words_to_bits(words))
 
-    time_took = time.time() - start_time
+                if len(bits) == batch_size:
+                    evaluator.add(line_ix, bits)
+                    line_ix, bits = [], []
 
-    return time_took
\ No newline at end of file
+        with stats.stage("score"):
+            evaluator.add(line_ix, bits)
@@ -0,0 +1,163 @@
+import glob
+import os
+from functools import lru_cache
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+from attacut import logger, preprocessing
+
+log = logger.get_logger(__name__)
+
+# separators of the preprocessed training format, see SequenceDataset.load_preprocessed_data
+SYLLABLE_SEP = "~"
+LABEL_SEP = ":--:"
+
+# arrays of a binary shard, e.g. 00000-chars.npy; `lines` is written last
+# and marks the shard as complete.
+#   chars: utf-32 code points of all syllables
+#   syllables: offsets of syllables in chars (n_syllables + 1)
+#   labels: word-boundary label of every syllable
+#   lines: offsets of lines in syllables (n_lines + 1)
+BINARY_ARRAYS = ["chars", "syllables", "labels", "lines"]
+
+
+@lru_cache(maxsize=2**16)
+def _word_syllables(word: str) -> Tuple[str]:
+    # words repeat a lot, so ssg runs only once per distinct word
+    return tuple(preprocessing.syllable_tokenize(word))
+
+
+def raw_to_syllable_and_label(line: str) -> Tuple[List[str], List[int]]:
+    """
+    Syllables of a |-segmented line and their labels (1: a word starts here)
+    """
+    syllables, labels = [], []
+    for w in line.strip().split("|"):
+        sys = _word_syllables(w)
+
+        syllables.extend(sys)
+        labels.extend([1] + [0] * (len(sys) - 1))
+
+    return syllables, labels
+
+
+def to_training_line(syllables: List[str], labels: List[int]) -> str:
+    return "%s%s%s" % (SYLLABLE_SEP.join(syllables), LABEL_SEP, "".join(map(str, labels)))
+
+
+def parse_training_line(line: str) -> Tuple[List[str], np.ndarray]:
+    syllables, labels = line.strip().split(LABEL_SEP)
+    return syllables.split(SYLLABLE_SEP), np.array(list(labels)).astype(int)
+
+
+def convert_lines(lines: List[str], steps: Tuple = ()) -> List[Tuple[List[str], List[int]]]:
+    # `steps`: preprocessing.preprocess steps applied to every line first
+    if steps:
+        lines = [preprocessing.preprocess(l.rstrip("\n"), steps=steps) for l in lines]
+
+    return [raw_to_syllable_and_label(l) for l in lines if l.strip()]
+
+
+def write_text_shard(path: str, samples: Iterable[Tuple[List[str], List[int]]]):
+    tmp = "%s.tmp" % path
+    with open(tmp, "w", encoding="utf-8") as fh:
+        for syllables, labels in samples:
+            fh.write("%s\n" % to_training_line(syllables, labels))
+
+    os.replace(tmp, path)
+
+
+def write_binary_shard(prefix: str, samples: Iterable[Tuple[List[str], List[int]]]):
+    syllable_lengths, labels, line_lengths, text = [], [], [], []
+    for sys, lb in samples:
+        syllable_lengths.extend(map(len, sys))
+        labels.extend(lb)
+        line_lengths.append(len(sys))
+        text.extend(sys)
+
+    arrays = dict(
+        chars=np.frombuffer("".join(text).encode("utf-32-le"), dtype=np.uint32),
+        syllables=np.concatenate(([0], np.cumsum(syllable_lengths, dtype=np.int64))),
+        labels=np.array(labels, dtype=np.uint8),
+        lines=np.concatenate(([0], np.cumsum(line_lengths, dtype=np.int64))),
+    )
+
+    for name in BINARY_ARRAYS:
+        tmp = "%s-%s.tmp.npy" % (prefix, name)
+        np.save(tmp, arrays[name])
+        os.replace(tmp, "%s-%s.npy" % (prefix, name))
+
+
+def is_binary_shard_complete(prefix: str) -> bool:
+    return os.path.exists("%s-lines.npy" % prefix)
+
+
+def find_training_file(dir: str, suffix: str) -> str:
+    # dir/suffix, or its binary shards (e.g. training.bin for training.txt) when only those exist
+    path = "%s/%s" % (dir, suffix)
+
+    binary_path = "%s.bin" % os.path.splitext(path)[0]
+    if not os.path.exists(path) and os.path.isdir(binary_path):
+        return binary_path
+
+    return path
+
+
+def read_training_samples(path: str) -> Iterable[Tuple[List[str], np.ndarray]]:
+    """
+    (syllables, labels) of every line of a file in the training format or,
+    if ``path`` is a directory, of its binary shards.
+    """
+    if os.path.isdir(path):
+        yield from BinaryCorpus(path)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield parse_training_line(line)
+
+
+class BinaryCorpus:
+    """
+    Memory-mapped reader of a directory of binary shards written by
+    :meth:`write_binary_shard`; items are (syllables, labels) like
+    :meth:`parse_training_line`.
+    """
+    def __init__(self, path: str):
+        prefixes = sorted(p[:-len("-lines.npy")] for p in glob.glob("%s/*-lines.npy" % path))
+        assert prefixes, "no binary shards in %s" % path
+
+        self.shards = [
+            dict((name, np.load("%s-%s.npy" % (p, name), mmap_mode="r")) for name in BINARY_ARRAYS)
+            for p in prefixes
+        ]
+
+        self.offsets = np.cumsum([0] + [len(s["lines"]) - 1 for s in self.shards])
+
+        log.info("%d lines in %d shards from %s" % (len(self), len(self.shards), path))
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def __getitem__(self, index: int) -> Tuple[List[str], np.ndarray]:
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+
+        shard_ix = np.searchsorted(self.offsets, index, side="right") - 1
+        shard, i = self.shards[shard_ix], index - self.offsets[shard_ix]
+
+        st, end = shard["lines"][i], shard["lines"][i+1]
+        offsets = np.asarray(shard["syllables"][st:end+1])
+
+        # decode the whole line at once and slice syllables from it
+        txt = np.asarray(shard["chars"][offsets[0]:offsets[-1]]).tobytes().decode("utf-32-le")
+        offsets = offsets - offsets[0]
+
+        syllables = [txt[a:b] for a, b in zip(offsets[:-1], offsets[1:])]
+
+        return syllables, np.asarray(shard["labels"][st:end]).astype(int)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
@@ -1,13 +1,87 @@
+import hashlib
+import itertools
+import json
+
 import numpy as np
 import torch
 from torch.utils.data import Dataset
 
-from attacut import logger, preprocessing, utils, char_type
+from attacut import corpus, logger, output_tags, preprocessing, utils, char_type
 
 log = logger.get_logger(__name__)
 
+# lines of training data whose labels are encoded at once
+ENCODING_CHUNK_SIZE = 10000
+
+
+class Workspace:
+    """
+    Growable buffers reused by successive make_feature calls (and for the
+    model's predictions, see Tokenizer.tokenize) instead of allocating new
+    arrays and tensors every time; what they hand out is only valid until
+    the next call. Tokenizer keeps one per thread.
+    """
+    def __init__(self, size: int = 1024):
+        self.lengths = torch.zeros(1, dtype=torch.int64)
+
+        self._grow_features(size)
+
+        # argmax of logits; resize_ keeps the memory unless it has to grow
+        self.values = torch.zeros(size)
+        self.indices = torch.zeros(size, dtype=torch.int64)
+
+    def _grow_features(self, size: int):
+        self.array = np.zeros(size, dtype=np.int64)
+        self.tensor = torch.from_numpy(self.array)
+
+    def features(self, size: int):
+        # numpy and torch views of the same memory
+        if size > self.array.shape[0]:
+            self._grow_features(max(size, 2 * self.array.shape[0]))
+
+        return self.array[:size], self.tensor[:size]
+
+    def seq_lengths(self, length: int) -> torch.Tensor:
+        return self.lengths.fill_(length)
+
+    def outputs(self, shape):
+        return self.values.resize_(shape), self.indices.resize_(shape)
+
+
+def features_from_rows(rows, batch_dim=True, workspace: Workspace = None):
+    """
+    int64 features of equally long rows, (1, rows, len) or without
+    ``batch_dim`` (len,) for a single row, and their length as tensors;
+    with a ``workspace``, these are views of its buffers.
+    """
+    length = len(rows[0])
+    shape = (1, len(rows), length) if batch_dim else (length,)
+
+    if workspace is None:
+        features = np.array(rows, dtype=np.int64).reshape(shape)
+        return torch.from_numpy(features), torch.from_numpy(np.array([length], dtype=np.int64))
+
+    array, tensor = workspace.features(len(rows) * length)
+    array = array.reshape(len(rows), length)
+    for i, r in enumerate(rows):
+        array[i] = r
+
+    return tensor.view(shape), workspace.seq_lengths(length)
+
+
+def drop_batch_dim(features: torch.Tensor) -> torch.Tensor:
+    # (1, channels, len) -> (channels, len); unlike squeeze, keeps one-token lines intact.
+    # SyllableSeqDataset's features have no batch dimension.
+    return features[0] if features.dim() == 3 else features
+
 
 class SequenceDataset(Dataset):
+    # replaced by Tokenizer when per-stage profiling is enabled
+    profiler = utils.NULL_PROFILER
+
+    # what a step of the sequence is: "char" or "syllable"
+    level = None
+
     def __init__(self, dir: str = None, dict_dir: str = None, path: str = None, output_scheme = None):
         if path:
             self.load_preprocessed_data(path, output_scheme)
@@ -22,23 +96,44 @@ class SequenceDataset(Dataset):
         self.data = []
 
         suffix = path.split("/")[-1]
-        with open(path) as f, \
-            utils.Timer("load-seq-data--%s" % suffix) as timer:
-            for line in f:
-                # we have syllables and bi tag for word boundary for each syllable here
-                syllables, w_bi_labels = line.strip().split(":--:")
-                w_bi_labels = np.array(list(w_bi_labels)).astype(int)
-                syllables = syllables.split("~")
-                self.data.append(self._process_training_line(syllables, w_bi_labels, output_scheme))
+
+        samples = corpus.read_training_samples(path)
+
+        with utils.Timer("load-seq-data--%s" % suffix) as timer:
+            while True:
+                chunk = list(itertools.islice(samples, ENCODING_CHUNK_SIZE))
+                if not chunk:
+                    break
+
+                self.data.extend(self._process_training_lines(chunk, output_scheme))
 
         self.total_samples = len(self.data)
 
-    def make_feature(self, txt: str):
+    def _process_training_lines(self, samples, output_scheme):
+        if not hasattr(self, "_training_line_features"):
+            return [self._process_training_line(sy, lb, output_scheme) for sy, lb in samples]
+
+        # labels of many lines are encoded with one call (see output_tags.encode_lines)
+        xs, ys, sy_ixs = zip(*(self._training_line_features(sy, lb) for sy, lb in samples))
+        ys = output_tags.encode_lines(output_scheme, ys, sy_ixs)
+
+        return [((x, len(y)), y) for x, y in zip(xs, ys)]
+
+    def make_feature(self, txt: str, workspace: Workspace = None):
         raise NotImplementedError
 
     def setup_featurizer(self, path: str):
         raise NotImplementedError
 
+    def dictionary_hash(self) -> str:
+        # identifies the dictionaries (ch_dict, sy_dict, ...) used by make_feature
+        h = hashlib.sha1()
+        for name in sorted(k for k in vars(self) if k.endswith("dict")):
+            h.update(name.encode("utf-8"))
+            h.update(json.dumps(getattr(self, name), sort_keys=True, ensure_ascii=False).encode("utf-8"))
+
+        return h.hexdigest()
+
     @staticmethod
     def prepare_model_inputs(inputs, device="cpu"):
 
@@ -62,12 +157,15 @@ class SequenceDataset(Dataset):
 
     @classmethod
     def load_preprocessed_file_with_suffix(cls, dir: str, suffix: str, output_scheme) -> "SequenceDataset":
-        path = "%s/%s" % (dir, suffix)
+        path = corpus.find_training_file(dir, suffix)
+
         log.info("Loading preprocessed data from %s" % path)
         return cls(dir=dir, dict_dir=f"{dir}/dictionary", path=path, output_scheme=output_scheme)
 
 
 class CharacterSeqDataset(SequenceDataset):
+    level = "char"
+
     def __init__(self, dir:str = None, dict_dir: str = None, path: str = None, output_scheme = None):
 
         self.dict = utils.load_dict(f"{dict_dir}/characters.json")
@@ -79,7 +177,7 @@ class CharacterSeqDataset(SequenceDataset):
         return dict(num_tokens=len(self.dict))
 
 
-    def make_feature(self, txt):
+    def make_feature(self, txt, workspace=None):
         characters = list(txt)
         ch_ix = list(
             map(
@@ -90,16 +188,16 @@ class CharacterSeqDataset(SequenceDataset):
 
         ch_type_ix = char_type.get_char_type_ix(characters)
 
-        features = np.stack((ch_ix, ch_type_ix), axis=0) \
-            .reshape((1, 2, -1)) \
-            .astype(np.int64)
+        return characters, features_from_rows((ch_ix, ch_type_ix), workspace=workspace)
 
-        seq_lengths = np.array([features.shape[-1]], dtype=np.int64)
+    def _process_training_line(self, syllables, w_bi_labels, output_scheme):
+        x, y, syl4chr = self._training_line_features(syllables, w_bi_labels)
 
-        return characters, (torch.from_numpy(features), torch.from_numpy(seq_lengths))
+        y = output_scheme.encode(y, syl4chr)
 
-    # @staticmethod
-    def _process_training_line(self, syllables, w_bi_labels, output_scheme):
+        return (x, len(y)), y
+
+    def _training_line_features(self, syllables, w_bi_labels):
         assert len(syllables) == len(w_bi_labels)
 
         characters, syl4chr, labels = [], [], []
@@ -131,9 +229,7 @@ class CharacterSeqDataset(SequenceDataset):
 
         x = np.stack((ch_ix, ct_ix), axis=0)
 
-        y = output_scheme.encode(y, syl4chr)
-
-        return (x, len(y)), y
+        return x, y, syl4chr
 
     @staticmethod
     def collate_fn(batch):
@@ -167,6 +263,8 @@ class CharacterSeqDataset(SequenceDataset):
 
 
 class SyllableCharacterSeqDataset(SequenceDataset):
+    level = "char"
+
     def __init__(self, dir:str = None, dict_dir: str = None, path: str = None, output_scheme = None):
 
         self.ch_dict = utils.load_dict(f"{dict_dir}/characters.json")
@@ -186,8 +284,9 @@ class SyllableCharacterSeqDataset(SequenceDataset):
             dict_dir=self.dict_dir
         )
 
-    def make_feature(self, txt):
-        syllables = preprocessing.syllable_tokenize(txt)
+    def make_feature(self, txt, workspace=None):
+        with self.profiler.stage("syllable_tokenize"):
+            syllables = preprocessing.syllable_tokenize(txt)
 
         sy2ix, ch2ix = self.sy_dict, self.ch_dict
 
@@ -207,16 +306,16 @@ class SyllableCharacterSeqDataset(SequenceDataset):
             ch_type_ix.extend(char_type.get_char_type_ix(characters))
             syllable_ix.extend([six]*len(chs))
 
-        features = np.stack((ch_ix, ch_type_ix, syllable_ix), axis=0) \
-            .reshape((1, 3, -1)) \
-            .astype(np.int64)
+        return list(txt), features_from_rows((ch_ix, ch_type_ix, syllable_ix), workspace=workspace)
 
-        seq_lengths = np.array([features.shape[-1]], dtype=np.int64)
+    def _process_training_line(self, syllables, w_bi_labels, output_scheme):
+        x, y, syllable_indices = self._training_line_features(syllables, w_bi_labels)
 
-        return list(txt), (torch.from_numpy(features), torch.from_numpy(seq_lengths))
+        y = output_scheme.encode(y, syllable_indices)
 
-    # @staticmethod
-    def _process_training_line(self, syllables, w_bi_labels, output_scheme):
+        return (x, len(y)), y
+
+    def _training_line_features(self, syllables, w_bi_labels):
         assert len(syllables) == len(w_bi_labels)
 
         characters, syllable_indices, labels = [], [], []
@@ -248,13 +347,11 @@ class SyllableCharacterSeqDataset(SequenceDataset):
 
         x = np.stack((ch_ix, ct_ix, syllable_indices), axis=0)
 
-        y = output_scheme.encode(y, syllable_indices)
-
         assert len(y) == len(ch_ix)
         assert len(y) == len(ct_ix)
         assert len(y) == len(syllable_indices)
 
-        return (x, len(y)), y
+        return x, y, syllable_indices
 
     @staticmethod
     def collate_fn(batch):
@@ -287,6 +384,8 @@ class SyllableCharacterSeqDataset(SequenceDataset):
         return inputs, labels, perm_idx
 
 class SyllableSeqDataset(SequenceDataset):
+    level = "syllable"
+
     def __init__(self, dir:str = None, dict_dir: str = None, path: str = None, output_scheme = None):
 
         self.sy_dict = utils.load_dict(f"{dict_dir}/syllables.json")
@@ -299,8 +398,9 @@ class SyllableSeqDataset(SequenceDataset):
             num_tokens=len(self.sy_dict)
         )
 
-    def make_feature(self, txt):
-        syllables = preprocessing.syllable_tokenize(txt)
+    def make_feature(self, txt, workspace=None):
+        with self.profiler.stage("syllable_tokenize"):
+            syllables = preprocessing.syllable_tokenize(txt)
 
         sy2ix = self.sy_dict
 
@@ -311,15 +411,7 @@ class SyllableSeqDataset(SequenceDataset):
             syllable_ix.append(six)
 
         # dims: (len,)
-        features = np.array(syllable_ix)\
-            .astype(np.int64)\
-            .reshape(-1)
-
-        seq_lengths = np.array([features.shape[-1]], dtype=np.int64)
-        
-        features = torch.from_numpy(features)
-
-        return syllables, (features, torch.from_numpy(seq_lengths))
+        return syllables, features_from_rows((syllable_ix,), batch_dim=False, workspace=workspace)
 
     def _process_training_line(self, syllables, w_bi_labels, output_scheme):
         sy_ix = list(map(lambda s: preprocessing.syllable2ix(self.sy_dict, s), syllables))
@@ -356,3 +448,103 @@ class SyllableSeqDataset(SequenceDataset):
         labels = torch.from_numpy(labels)[perm_idx]
 
         return inputs, labels, perm_idx
+
+
+class SyllableStepDataset(SequenceDataset):
+    """
+    One step per syllable; features are (1 + 2 * MAX_SYLLABLE_CHARS, len):
+    syllable ids, then ids and types of the syllable's characters (first
+    MAX_SYLLABLE_CHARS of them, <PAD> after the end).
+    """
+    level = "syllable"
+
+    MAX_SYLLABLE_CHARS = 8
+
+    def __init__(self, dir:str = None, dict_dir: str = None, path: str = None, output_scheme = None):
+
+        self.ch_dict = utils.load_dict(f"{dict_dir}/characters.json")
+        self.sy_dict = utils.load_dict(f"{dict_dir}/syllables.json")
+        self.dict_dir = dict_dir
+
+        print(f"we have {len(self.sy_dict)} syllables from {dict_dir}")
+
+        super(SyllableStepDataset, self).__init__(dir, dict_dir, path, output_scheme)
+
+    def setup_featurizer(self):
+        return dict(
+            num_char_tokens=len(self.ch_dict),
+            num_tokens=len(self.sy_dict),
+            dict_dir=self.dict_dir
+        )
+
+    def _syllable_features(self, syllables, workspace=None):
+        w = self.MAX_SYLLABLE_CHARS
+
+        if workspace is None:
+            features = np.zeros((1 + 2 * w, len(syllables)), dtype=np.int64)
+        else:
+            features, _ = workspace.features((1 + 2 * w) * len(syllables))
+            features[:] = 0
+            features = features.reshape((1 + 2 * w, len(syllables)))
+
+        for i, syllable in enumerate(syllables):
+            characters = list(syllable)[:w]
+
+            features[0, i] = preprocessing.syllable2ix(self.sy_dict, syllable)
+            features[1:1+len(characters), i] = list(
+                map(lambda ch: preprocessing.character2ix(self.ch_dict, ch), characters)
+            )
+            features[1+w:1+w+len(characters), i] = char_type.get_char_type_ix(characters)
+
+        return features
+
+    def make_feature(self, txt, workspace=None):
+        with self.profiler.stage("syllable_tokenize"):
+            syllables = preprocessing.syllable_tokenize(txt)
+
+        features = self._syllable_features(syllables, workspace=workspace)
+        shape = (1, features.shape[0], len(syllables))
+
+        if workspace is None:
+            return syllables, (torch.from_numpy(features.reshape(shape)),
+                torch.from_numpy(np.array([len(syllables)], dtype=np.int64)))
+
+        _, tensor = workspace.features(features.size)
+
+        return syllables, (tensor.view(shape), workspace.seq_lengths(len(syllables)))
+
+    def _process_training_line(self, syllables, w_bi_labels, output_scheme):
+        assert len(syllables) == len(w_bi_labels)
+
+        x = self._syllable_features(syllables)
+
+        # positions are syllables: a word of a repeated syllable (ละ~ละ) has two
+        y = output_scheme.encode(np.array(w_bi_labels).astype(int), x[0], syllable_level=True)
+
+        return (x, len(y)), y
+
+    @staticmethod
+    def collate_fn(batch):
+        total_samples = len(batch)
+
+        seq_lengths = np.array(list(map(lambda x: x[0][1], batch)))
+        max_length = np.max(seq_lengths)
+
+        channels = batch[0][0][0].shape[0]
+
+        features = np.zeros((total_samples, channels, max_length), dtype=np.int64)
+        labels = np.zeros((total_samples, max_length), dtype=np.int64)
+
+        for i, s in enumerate(batch):
+            total_features = s[0][0].shape[1]
+            features[i, :, :total_features] = s[0][0]
+            labels[i, :total_features] = s[1]
+
+        seq_lengths = torch.from_numpy(seq_lengths)
+        seq_lengths, perm_idx = seq_lengths.sort(0, descending=True)
+
+        inputs = (torch.from_numpy(features)[perm_idx], seq_lengths)
+
+        labels = torch.from_numpy(labels)[perm_idx]
+
+        return inputs, labels, perm_idx
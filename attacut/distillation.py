@@ -0,0 +1,221 @@
+import hashlib
+import os
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, Dataset
+
+from attacut import corpus, logger, loss, models, output_tags, utils
+
+log = logger.get_logger(__name__)
+
+
+def crf_marginals(crf, emissions, mask):
+    # forward-backward for pytorch-crf's linear-chain CRF (batch_first=True)
+    # emissions: b x seq x tags, mask: b x seq
+    mask = mask.bool()
+    batch_size, seq_len, _ = emissions.shape
+
+    alphas = [crf.start_transitions + emissions[:, 0]]
+    for t in range(1, seq_len):
+        nxt = torch.logsumexp(
+            alphas[-1].unsqueeze(2) + crf.transitions.unsqueeze(0), dim=1
+        ) + emissions[:, t]
+        alphas.append(torch.where(mask[:, t].unsqueeze(1), nxt, alphas[-1]))
+
+    end = crf.end_transitions.expand(batch_size, -1)
+    betas = [end]
+    for t in range(seq_len - 2, -1, -1):
+        nxt = torch.logsumexp(
+            crf.transitions.unsqueeze(0) + (emissions[:, t+1] + betas[0]).unsqueeze(1),
+            dim=2
+        )
+        betas.insert(0, torch.where(mask[:, t+1].unsqueeze(1), nxt, end))
+
+    alpha, beta = torch.stack(alphas, dim=1), torch.stack(betas, dim=1)
+
+    # alpha is carried over padded positions, so the last one is the partition
+    log_z = torch.logsumexp(alphas[-1] + crf.end_transitions, dim=1)
+
+    return torch.exp(alpha + beta - log_z.view(-1, 1, 1))
+
+
+def boundary_probs(model, logits, seq_lengths, temperature=1.0):
+    # probability that each position starts a word; odd tags are word
+    # beginnings in every scheme of output_tags.
+    logits = logits / temperature
+    if hasattr(model, "crf"):
+        mask = loss.create_mask_with_length(seq_lengths).to(logits.device)
+        probs = crf_marginals(model.crf, logits, mask)
+    else:
+        probs = F.softmax(logits, dim=2)
+
+    # float32 forward-backward can overshoot 1 slightly
+    return probs[:, :, 1::2].sum(dim=2).clamp(0, 1)
+
+
+def distillation_loss(criterion, alpha=0.5, temperature=1.0):
+    # ref: https://arxiv.org/abs/1503.02531
+    def _loss(model, logits, labels, seq_lengths, soft_targets):
+        hard = criterion(model, logits, labels, seq_lengths)
+
+        probs = boundary_probs(model, logits, seq_lengths, temperature) \
+            .clamp(1e-6, 1 - 1e-6)
+
+        soft = F.binary_cross_entropy(probs, soft_targets, reduction="none")
+
+        mask = loss.create_mask_with_length(seq_lengths)
+        soft = (soft * mask).sum(dim=1).mean()
+
+        return alpha * hard + (1 - alpha) * (temperature ** 2) * soft
+
+    return _loss
+
+
+def syllable_lengths(syllables):
+    # character datasets turn an empty syllable into a single <PAD> character
+    return np.array([max(len(s), 1) for s in syllables], dtype=np.int64)
+
+
+def to_syllable_level(probs, syllables, is_char_level):
+    if not is_char_level:
+        return probs
+
+    starts = np.cumsum(syllable_lengths(syllables)) - syllable_lengths(syllables)
+    return probs[starts]
+
+
+def from_syllable_level(probs, syllables, is_char_level):
+    if not is_char_level:
+        return probs
+
+    lengths = syllable_lengths(syllables)
+    expanded = np.zeros(lengths.sum(), dtype=probs.dtype)
+    expanded[np.cumsum(lengths) - lengths] = probs
+
+    return expanded
+
+
+def is_char_level(dataset_cls):
+    assert dataset_cls.level in ["char", "syllable"], \
+        "%s doesn't say its level" % dataset_cls.__name__
+    return dataset_cls.level == "char"
+
+
+def read_syllables(path):
+    # `path` is a file in the training format or a directory of binary shards
+    for syllables, _ in corpus.read_training_samples(path):
+        yield syllables
+
+
+def cache_path(data_dir, teacher, temperature, suffix="training.txt"):
+    # the mtime of model.pth invalidates targets of a teacher retrained in place
+    key = "%s|%s|%s|%s" % (
+        os.path.abspath(teacher), os.path.getmtime("%s/model.pth" % teacher), temperature, suffix
+    )
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:10]
+
+    return "%s/teacher-cache/%s-%s.npz" % (
+        data_dir, os.path.basename(os.path.normpath(teacher)), digest
+    )
+
+
+def compute_teacher_targets(teacher, data_dir, temperature=1.0,
+    suffix="training.txt", batch_size=64, device="cpu"):
+    """
+    Compute (or load from cache) the teacher's word-beginning probability
+    for every syllable of ``data_dir/suffix`` (or its binary shards, see
+    :meth:`attacut.corpus.find_training_file`).
+    :return: list of float32 arrays, one per line
+    """
+    path = cache_path(data_dir, teacher, temperature, suffix)
+
+    if os.path.exists(path):
+        print("Loading teacher targets from %s" % path)
+        cached = np.load(path)
+        return np.split(cached["probs"], cached["offsets"][1:-1])
+
+    params = utils.load_training_params(teacher)
+    model_cls = models.get_model(params.name)
+    output_scheme = output_tags.get_scheme(
+        utils.parse_model_params(params.params)["oc"]
+    )
+
+    teacher_set = model_cls.dataset(
+        dict_dir=teacher,
+        path=corpus.find_training_file(data_dir, suffix),
+        output_scheme=output_scheme
+    )
+
+    model = model_cls.load(
+        teacher, teacher_set.setup_featurizer(), params.params
+    ).to(device)
+
+    generator = DataLoader(
+        teacher_set,
+        batch_size=batch_size,
+        shuffle=False,
+        collate_fn=model_cls.dataset.collate_fn
+    )
+
+    char_level = is_char_level(model_cls.dataset)
+    results = []
+
+    with torch.no_grad(), utils.Timer("teacher-targets--%s" % suffix):
+        for (x, seq), _, perm_ix in generator:
+            logits = model((x.to(device), seq.to(device)))
+            probs = boundary_probs(model, logits, seq.to(device), temperature) \
+                .cpu().numpy()
+
+            batch = [None] * len(perm_ix)
+            for i, ix in enumerate(perm_ix.tolist()):
+                batch[ix] = probs[i, :seq[i]]
+            results.extend(batch)
+
+    results = [
+        to_syllable_level(p, syllables, char_level).astype(np.float32)
+        for p, syllables in zip(results, read_syllables(corpus.find_training_file(data_dir, suffix)))
+    ]
+
+    offsets = np.cumsum([0] + [len(p) for p in results])
+
+    utils.maybe_create_dir(os.path.dirname(path))
+    np.savez(path, probs=np.concatenate(results), offsets=offsets)
+    print("Saved teacher targets to %s" % path)
+
+    return results
+
+
+class DistillationDataset(Dataset):
+    """
+    Wrap a training set and attach the teacher's soft targets to each sample.
+    """
+    def __init__(self, dataset, soft_targets, syllables):
+        assert len(dataset) == len(soft_targets)
+
+        self.dataset = dataset
+
+        char_level = is_char_level(type(dataset))
+        self.soft_targets = [
+            from_syllable_level(p, sy, char_level)
+            for p, sy in zip(soft_targets, syllables)
+        ]
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, index):
+        return self.dataset[index], self.soft_targets[index]
+
+    def prepare_model_inputs(self, inputs, device="cpu"):
+        return self.dataset.prepare_model_inputs(inputs, device)
+
+    def collate_fn(self, batch):
+        inputs, labels, perm_idx = self.dataset.collate_fn([b for b, _ in batch])
+
+        soft = np.zeros(labels.shape, dtype=np.float32)
+        for i, (_, p) in enumerate(batch):
+            soft[i, :p.shape[0]] = p
+
+        return inputs, labels, perm_idx, torch.from_numpy(soft)[perm_idx]
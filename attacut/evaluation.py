@@ -19,9 +19,14 @@ def compute_metrics(
     fp = np.sum(preds * (1-labels))
     fn = np.sum((1-preds) * labels)
 
-    precision = tp / (tp+fp)
-    recall = tp / (tp+fn)
-    f1 = 2 * precision * recall / (precision + recall)
+    return metrics_from_counts(tp, fp, fn)
+
+
+def metrics_from_counts(tp, fp, fn) -> EvaluationMetrics:
+    # e.g. counts accumulated over batches; 0 instead of nan when undefined
+    precision = tp / (tp+fp) if tp+fp > 0 else 0.0
+    recall = tp / (tp+fn) if tp+fn > 0 else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall > 0 else 0.0
 
     return EvaluationMetrics(
         tp=tp,
@@ -0,0 +1,174 @@
+import json
+import math
+import os
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from attacut import checkpoint as ckpt, models, perf
+
+# file written by perf-suite.py for every trial
+PERF_FILE = "perf.json"
+
+
+class Job(NamedTuple):
+    trial: int
+    rung: int
+    epoch: int
+
+
+def rung_epochs(min_epoch: int, max_epoch: int, eta: int) -> List[int]:
+    """
+    Training budget of every rung: min_epoch, min_epoch*eta, ..., max_epoch
+    """
+    assert 0 < min_epoch <= max_epoch and eta > 1
+
+    epochs = [min_epoch]
+    while epochs[-1] * eta < max_epoch:
+        epochs.append(epochs[-1] * eta)
+
+    if epochs[-1] < max_epoch:
+        epochs.append(max_epoch)
+
+    return epochs
+
+
+class SuccessiveHalving:
+    """
+    Asynchronous successive halving (ASHA): whenever a worker is free, a trial
+    that is in the top 1/eta of its rung is promoted to the next rung;
+    otherwise a new trial is started at the first rung. Trials that aren't
+    promoted are simply not continued, so their worker is free right away.
+    """
+    def __init__(self, total_trials: int, min_epoch: int, max_epoch: int, eta: int = 3):
+        self.total_trials = total_trials
+        self.eta = eta
+        self.epochs = rung_epochs(min_epoch, max_epoch, eta)
+
+        self.started = 0
+        # rung -> {trial: validation loss}
+        self.results = [dict() for _ in self.epochs]
+        self.promoted = [set() for _ in self.epochs]
+
+    def next_job(self) -> Optional[Job]:
+        for rung in reversed(range(len(self.epochs) - 1)):
+            for trial in self._promotable(rung):
+                self.promoted[rung].add(trial)
+                return Job(trial, rung+1, self.epochs[rung+1])
+
+        if self.started < self.total_trials:
+            self.started += 1
+            return Job(self.started-1, 0, self.epochs[0])
+
+        return None
+
+    def report(self, job: Job, val_loss: float):
+        self.results[job.rung][job.trial] = val_loss if math.isfinite(val_loss) else math.inf
+
+    def rung_of(self, trial: int) -> int:
+        return max(r for r, res in enumerate(self.results) if trial in res)
+
+    def _promotable(self, rung: int) -> List[int]:
+        res = self.results[rung]
+        top = sorted(res.keys(), key=lambda t: res[t])[:len(res) // self.eta]
+
+        return [t for t in top if t not in self.promoted[rung]]
+
+
+def read_validation(output_dir: str) -> Dict[str, float]:
+    # validation loss and f1 of the model saved by a run trained with --checkpoint
+    path = "%s/%s" % (output_dir, ckpt.CHECKPOINT_FILE)
+
+    if not os.path.exists(path):
+        return dict(loss=math.inf, f1=0.0)
+
+    state = torch.load(path, map_location="cpu")
+
+    return dict(loss=float(state["validation"]["loss"]), f1=float(state["validation"]["f1"]))
+
+
+def read_throughput(output_dir: str, threads: int) -> Dict[str, float]:
+    # NaN when perf-suite failed (no file, or no results for a model it couldn't run),
+    # like hyperopt-pareto.py treats trials that weren't benchmarked
+    path = "%s/%s" % (output_dir, PERF_FILE)
+
+    results = []
+    if os.path.exists(path):
+        with open(path, "r") as fh:
+            try:
+                results = json.load(fh)
+            except ValueError:
+                pass
+
+    if not results:
+        return dict(chars_per_sec_per_core=math.nan, p50_ms=math.nan, p99_ms=math.nan)
+
+    r = results[0]
+
+    return dict(chars_per_sec_per_core=r["chars_per_sec"] / threads, p50_ms=r["p50_ms"], p99_ms=r["p99_ms"])
+
+
+def trial_row(trial: int, scheduler: SuccessiveHalving, params: Dict, output_dir: str,
+    extra: Dict = dict()) -> Dict:
+    rung = scheduler.rung_of(trial)
+
+    row = dict(params)
+    row.update({
+        "hyperopt:trial": trial,
+        "hyperopt:rung": rung,
+        "hyperopt:epoch": scheduler.epochs[rung],
+        "hyperopt:val_loss": scheduler.results[rung][trial],
+        "hyperopt:model_path": output_dir,
+    })
+    row.update(("hyperopt:%s" % k, v) for k, v in extra.items())
+
+    return row
+
+
+def pareto_front(points: Sequence[Tuple[float, float]]) -> List[int]:
+    """
+    Indices of the points that no other point dominates, maximizing both
+    coordinates, e.g. (f1, throughput); sorted by the first coordinate.
+    """
+    order = sorted(range(len(points)), key=lambda i: (-points[i][0], -points[i][1]))
+
+    front, best_y = [], -math.inf
+    for i in order:
+        if points[i][1] > best_y:
+            front.append(i)
+            best_y = points[i][1]
+
+    return front
+
+
+def config_flops(model_name: str, model_params: str, dict_dir: str, length: int = 128) -> int:
+    # FLOPs of one forward pass over a line of ``length`` characters
+    model_cls = models.get_model(model_name)
+
+    dataset = model_cls.dataset(dict_dir=dict_dir)
+    model = model_cls(dataset.setup_featurizer(), model_params)
+
+    txt = perf.synthetic_lines(length, total_chars=length)[0]
+    _, (x, seq) = dataset.make_feature(txt)
+
+    # SyllableSeqDataset's features come without the batch dimension
+    if x.dim() == 1:
+        x = x.unsqueeze(0)
+
+    return models.count_flops(model, (x, seq))
+
+
+def cost_biased_sample(costs: Sequence[float], n: int, bias: float, seed: int = None) -> List[int]:
+    """
+    Pick ``n`` of the candidates without replacement with probability
+    proportional to cost^-bias; bias 0 is uniform sampling.
+    """
+    costs = np.array(costs, dtype=np.float64)
+    weights = np.power(costs / costs.min(), -bias)
+
+    ix = np.random.RandomState(seed).choice(
+        len(costs), size=min(n, len(costs)), replace=False, p=weights / weights.sum()
+    )
+
+    return sorted(ix.tolist())
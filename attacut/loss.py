@@ -48,4 +48,4 @@ def create_mask_with_length(lens):
     # there is some empty string in the dataset
     mask[:, 0] = 1
 
-    return mask
\ No newline at end of file
+    return mask
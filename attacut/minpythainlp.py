@@ -14,6 +14,16 @@ _thai_arabic = {
 }
 
 
+
+def replace_characters(text: str, mapping) -> str:
+    # for non-latin text, str.replace per character is much faster than
+    # str.translate, which looks up every character of the text
+    for src, dst in mapping:
+        if src in text:
+            text = text.replace(src, dst)
+    return text
+
+
 def thai_digit_to_arabic_digit(text: str) -> str:
     """
     This function convert Thai digits (i.e. ๑, ๓, ๑๐) to Arabic digits
@@ -32,11 +42,4 @@ def thai_digit_to_arabic_digit(text: str) -> str:
     if not text or not isinstance(text, str):
         return ""
 
-    newtext = []
-    for ch in text:
-        if ch in _thai_arabic:
-            newtext.append(_thai_arabic[ch])
-        else:
-            newtext.append(ch)
-
-    return "".join(newtext)
+    return replace_characters(text, _thai_arabic.items())
@@ -1,10 +1,12 @@
 import numpy as np
 import importlib
 import re
+from typing import Dict
 
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 
 import attacut
 from attacut import logger, loss
@@ -19,6 +21,66 @@ def get_device():
         return "cpu"
 
 
+def inference_mode():
+    # torch.inference_mode (PyTorch >= 1.9) skips autograd's bookkeeping entirely
+    if hasattr(torch, "inference_mode"):
+        return torch.inference_mode()
+    return torch.no_grad()
+
+
+_warned_flush_denormal = False
+
+def flush_denormal() -> bool:
+    """
+    Treat denormal floats as zeros in CPU arithmetic of the calling thread.
+    Models trained with weight-decay have weights close to zero, and
+    computing with denormals is slow.
+    ref: https://en.wikipedia.org/wiki/Denormal_number
+    :return: False when not supported, i.e. PyTorch compiled without SSE3
+    """
+    global _warned_flush_denormal
+
+    # from https://github.com/pytorch/pytorch/issues/19651#issuecomment-486170718
+    if torch.set_flush_denormal(True):
+        return True
+
+    if not _warned_flush_denormal:
+        log.warning("Unable to set flush denormal: Pytorch compiled without advanced CPU, see "
+            "https://github.com/pytorch/pytorch/blob/84b275b70f73d5fd311f62614bccc405f3d5bfa3/aten/src/ATen/cpu/FlushDenormal.cpp#L13")
+        _warned_flush_denormal = True
+
+    return False
+
+
+def zero_small_weights(state: Dict[str, torch.Tensor], threshold: float) -> Dict[str, int]:
+    """
+    Set floating-point values with magnitude below ``threshold`` to zero,
+    in place, e.g. denormals left by weight-decay.
+    :return: number of values zeroed per tensor (tensors without any are left out)
+    """
+    zeroed = dict()
+    for name, w in state.items():
+        if not w.is_floating_point():
+            continue
+
+        w = state[name] = w.contiguous()
+        a = w.numpy()
+
+        # magnitudes are compared as integers (the bits without the sign, which
+        # are ordered like the floats): after flush_denormal, denormals would
+        # compare equal to zero.
+        bits = {2: np.int16, 4: np.int32, 8: np.int64}[a.itemsize]
+        magnitude = a.view(bits) & np.iinfo(bits).max
+
+        small = (magnitude != 0) & (magnitude < np.array(threshold, dtype=a.dtype).view(bits))
+        total = int(small.sum())
+        if total:
+            a[small] = 0
+            zeroed[name] = total
+
+    return zeroed
+
+
 class ConvolutionBatchNorm(nn.Module):
     def __init__(self, channels, filters, kernel_size, stride=1, dilation=1):
         super(ConvolutionBatchNorm, self).__init__()
@@ -59,22 +121,61 @@ class ConvolutionLayer(nn.Module):
     def forward(self, x):
         return F.relu(self.conv(x))
 
+class SeparableConvolutionLayer(nn.Module):
+    # depthwise-separable: a (dilated) convolution of every channel alone,
+    # then a 1x1 convolution mixing the channels, i.e. k*c + c*f weights instead of k*c*f.
+    # ref: https://arxiv.org/abs/1610.02357
+    def __init__(self, channels, filters, kernel_size, stride=1, dilation=1):
+        super(SeparableConvolutionLayer, self).__init__()
+
+        padding = kernel_size // 2
+        padding += padding * (dilation-1)
+
+        self.conv = nn.Conv1d(
+            channels,
+            channels,
+            kernel_size,
+            stride=stride,
+            dilation=dilation,
+            padding=padding,
+            groups=channels
+        )
+
+        self.pointwise = nn.Conv1d(channels, filters, 1)
+
+    def forward(self, x):
+        return F.relu(self.pointwise(self.conv(x)))
+
 class IteratedDilatedConvolutions(nn.Module):
     # ref: https://arxiv.org/abs/1702.02098
-    def __init__(self, emb_dim, filters, dropout_rate):
+    def __init__(self, emb_dim, filters, dropout_rate, layer=ConvolutionLayer):
         super(IteratedDilatedConvolutions, self).__init__()
 
-        self.conv1 = ConvolutionLayer(emb_dim, filters, 3, dilation=1)
-        self.conv2 = ConvolutionLayer(filters, filters, 3, dilation=2)
-        self.conv3 = ConvolutionLayer(filters, filters, 3, dilation=4)
+        self.conv1 = layer(emb_dim, filters, 3, dilation=1)
+        self.conv2 = layer(filters, filters, 3, dilation=2)
+        self.conv3 = layer(filters, filters, 3, dilation=4)
 
         self.dropout = torch.nn.Dropout(p=dropout_rate)
 
+    @property
+    def receptive_field(self) -> int:
+        # how far (one side) an output position sees
+        return sum(
+            c.conv.dilation[0] * (c.conv.kernel_size[0] // 2)
+            for c in [self.conv1, self.conv2, self.conv3]
+        )
 
-    def forward(self, x):
-        conv1 = self.dropout(self.conv1(x))
-        conv2 = self.dropout(self.conv2(conv1))
-        return self.dropout(self.conv3(conv2))
+    def forward(self, x, mask=None):
+        if mask is None:
+            conv1 = self.dropout(self.conv1(x))
+            conv2 = self.dropout(self.conv2(conv1))
+            return self.dropout(self.conv3(conv2))
+
+        # mask: (batch, 1, len) with zeros at paddings; keeping paddings at zero
+        # after every layer makes them behave like the convolutions' zero padding.
+        conv1 = self.dropout(self.conv1(x * mask)) * mask
+        conv2 = self.dropout(self.conv2(conv1)) * mask
+        return self.dropout(self.conv3(conv2)) * mask
 
 class EmbeddingWithDropout(nn.Module):
     # ref: https://arxiv.org/pdf/1708.02182.pdf
@@ -113,7 +214,8 @@ class BaseModel(nn.Module):
     def total_trainable_params(self):
         return sum(p.numel() for p in self.parameters() if p.requires_grad)
 
-    def decode(self, logits, seq_lengths):
+    def decode(self, logits, seq_lengths, out=None):
+        # out: (values, indices) tensors shaped like logits.shape[:2] for the argmax
         if hasattr(self, "crf"):
             mask = loss.create_mask_with_length(seq_lengths).to(logits.device)
             crf_tags = self.crf.decode(
@@ -130,7 +232,8 @@ class BaseModel(nn.Module):
                 )
             return decoded_tags
         else:
-            _, indices = torch.max(logits, dim=2)
+            _, indices = torch.max(logits, dim=2, out=out) if out is not None \
+                else torch.max(logits, dim=2)
             return self.output_scheme.decode_condition(
                 indices.cpu().detach().numpy()
             )
@@ -175,21 +278,186 @@ def prepare_embedding(data_config, model_config):
             padding_idx=0
         )
 
-# taken from https://github.com/salesforce/awd-lstm-lm/blob/master/embed_regularize.py#L5
+def padding_mask(ids, like):
+    # (batch, len) token ids -> (batch, 1, len) mask, <PAD> is always 0
+    return (ids != 0).unsqueeze(1).type_as(like)
+
+def pack_sequences(features, gap, max_length=2048):
+    """
+    Concatenate featurized lines, i.e. (..., len) tensors, into rows of at most
+    ``max_length`` positions (longer lines get their own row), separated by
+    ``gap`` <PAD> positions.
+    :return: rows (rows, ..., row len), row lengths and (row, start, length) of each line
+    """
+    rows, spans = [[]], []
+    row_length = 0
+
+    for f in features:
+        length = f.shape[-1]
+
+        if rows[-1] and row_length + gap + length > max_length:
+            rows.append([])
+            row_length = 0
+
+        if rows[-1]:
+            rows[-1].append(f.new_zeros(f.shape[:-1] + (gap,)))
+            row_length += gap
+
+        rows[-1].append(f)
+        spans.append((len(rows) - 1, row_length, length))
+        row_length += length
+
+    rows = [torch.cat(r, dim=-1) for r in rows]
+    row_lengths = torch.tensor([r.shape[-1] for r in rows])
+
+    x = rows[0].new_zeros((len(rows),) + rows[0].shape[:-1] + (int(row_lengths.max()),))
+    for i, r in enumerate(rows):
+        x[i, ..., :r.shape[-1]] = r
+
+    return x, row_lengths, spans
+
+def predict_packed(model, features, device="cpu", max_length=2048):
+    """
+    Predict many (short) lines with an IteratedDilatedConvolutions model by
+    running dense rows of lines instead of a padded batch; the gap between
+    lines is the receptive field, so predictions are the same as per line.
+    :param list features: (..., len) features of each line
+    :return: predictions of each line
+    """
+    gap = model.id_conv.receptive_field
+
+    x, row_lengths, spans = pack_sequences(features, gap, max_length)
+
+    logits = model((x.to(device), row_lengths.to(device)))
+
+    logits = nn.utils.rnn.pad_sequence(
+        [logits[r, s:s+l] for r, s, l in spans], batch_first=True
+    )
+    seq_lengths = torch.tensor([l for _, _, l in spans])
+
+    return model.decode(logits, seq_lengths.to(device))
+
+def can_pack(model) -> bool:
+    return isinstance(getattr(model, "id_conv", None), IteratedDilatedConvolutions)
+
+def run_lstm(lstm, embedding, seq_lengths, packed=False):
+    """
+    Run a batch_first LSTM over (batch, len, dim) embeddings.
+    With ``packed``, outputs at real positions don't depend on the paddings,
+    i.e. they are the same as running each row alone; outputs at padded
+    positions are zeros when the sequences are actually packed.
+    """
+    # a single unbatched sequence has no padding
+    if not packed or embedding.dim() == 2:
+        out, _ = lstm(embedding)
+        return out
+
+    lengths = seq_lengths.reshape(-1).cpu()
+
+    # trailing paddings only reach real positions through the backward
+    # direction; otherwise the (fused) padded computation is cheaper.
+    if not lstm.bidirectional or bool((lengths == embedding.shape[1]).all()):
+        out, _ = lstm(embedding)
+        return out
+
+    out, _ = lstm(pack_padded_sequence(
+        embedding, lengths, batch_first=True, enforce_sorted=False
+    ))
+
+    out, _ = pad_packed_sequence(out, batch_first=True, total_length=embedding.shape[1])
+
+    return out
+
+# adapted from https://github.com/salesforce/awd-lstm-lm/blob/master/embed_regularize.py#L5
+# the dropout mask is drawn only for ids occurring in `words`, instead of
+# masking (and copying) the whole embedding matrix.
 def embedded_dropout(embed, words, dropout=0.1, scale=None):
-    if dropout:
-        mask = embed.weight.data.new().resize_((embed.weight.size(0), 1)).bernoulli_(1 - dropout).expand_as(embed.weight) / (1 - dropout)
-        masked_embed_weight = mask * embed.weight
-    else:
-        masked_embed_weight = embed.weight
-    if scale:
-        masked_embed_weight = scale.expand_as(masked_embed_weight) * masked_embed_weight
-
     padding_idx = embed.padding_idx
     if padding_idx is None:
         padding_idx = -1
 
-    return torch.nn.functional.embedding(words, masked_embed_weight,
+    if not dropout and scale is None:
+        return torch.nn.functional.embedding(words, embed.weight,
+            padding_idx, embed.max_norm, embed.norm_type,
+            embed.scale_grad_by_freq, embed.sparse
+        )
+
+    ids, inverse = torch.unique(words, return_inverse=True)
+
+    # frequencies are lost once the rows are looked up by unique ids
+    assert not embed.scale_grad_by_freq, "scale_grad_by_freq isn't supported with dropout"
+
+    rows = torch.nn.functional.embedding(ids, embed.weight,
         padding_idx, embed.max_norm, embed.norm_type,
-        embed.scale_grad_by_freq, embed.sparse
-    )
\ No newline at end of file
+        False, embed.sparse
+    )
+
+    if dropout:
+        mask = rows.new_empty((rows.size(0), 1)).bernoulli_(1 - dropout) / (1 - dropout)
+        rows = mask * rows
+    if scale is not None:
+        rows = scale.expand_as(rows) * rows
+
+    return rows[inverse]
+
+def use_sparse_embeddings(model):
+    """
+    Make embedding layers produce sparse gradients, i.e. only rows of ids in
+    the batch are updated (see optim.SparseAdam).
+    :return: weights of those embeddings
+    """
+    weights = []
+    for m in model.modules():
+        if isinstance(m, nn.Embedding) and m.weight.requires_grad:
+            m.sparse = True
+            weights.append(m.weight)
+
+    return weights
+
+def count_flops(model, inputs):
+    """
+    Count multiply-add FLOPs (2 per MAC) of Conv1d, Linear and LSTM layers
+    for one forward pass of the given inputs.
+    """
+    flops = []
+
+    def conv_hook(m, i, o):
+        flops.append(
+            2 * o.numel() * (m.in_channels // m.groups) * m.kernel_size[0]
+        )
+
+    def linear_hook(m, i, o):
+        flops.append(2 * o.numel() * m.in_features)
+
+    def lstm_hook(m, i, o):
+        x = i[0]
+        if isinstance(x, torch.nn.utils.rnn.PackedSequence):
+            steps = x.data.shape[0]
+        else:
+            steps = x.shape[0] * x.shape[1] if x.dim() == 3 else x.shape[0]
+
+        directions = 2 if m.bidirectional else 1
+        total, input_size = 0, m.input_size
+        for _ in range(m.num_layers):
+            total += 2 * 4 * (input_size + m.hidden_size) * m.hidden_size * directions
+            input_size = m.hidden_size * directions
+
+        flops.append(steps * total)
+
+    hooks = []
+    for m in model.modules():
+        if isinstance(m, nn.Conv1d):
+            hooks.append(m.register_forward_hook(conv_hook))
+        elif isinstance(m, nn.Linear):
+            hooks.append(m.register_forward_hook(linear_hook))
+        elif isinstance(m, nn.LSTM):
+            hooks.append(m.register_forward_hook(lstm_hook))
+
+    try:
+        with torch.no_grad():
+            model(inputs)
+    finally:
+        for h in hooks:
+            h.remove()
+
+    return int(sum(flops))
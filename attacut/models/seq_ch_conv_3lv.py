@@ -4,11 +4,12 @@ import torch.nn.functional as F
 from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 
 from attacut import utils, dataloaders, output_tags, char_type
-from . import BaseModel, IteratedDilatedConvolutions
+from . import BaseModel, ConvolutionLayer, IteratedDilatedConvolutions, padding_mask
 
 
 class Model(BaseModel):
     dataset = dataloaders.CharacterSeqDataset
+    conv_layer = ConvolutionLayer
 
     def __init__(self, data_config, model_config="embc:16|embt:16|conv:48|l1:16|do:0.1|oc:BI"):
         super(Model, self).__init__()
@@ -35,7 +36,7 @@ class Model(BaseModel):
         emb_dim = config["embc"] + config["embt"]
 
         self.id_conv = IteratedDilatedConvolutions(
-            emb_dim, conv_filters, dropout_rate
+            emb_dim, conv_filters, dropout_rate, layer=self.conv_layer
         )
 
         self.linear1 = nn.Linear(conv_filters, config['l1'])
@@ -55,7 +56,7 @@ class Model(BaseModel):
 
         embedding = embedding.permute(0, 2, 1)
 
-        out = self.id_conv(embedding)
+        out = self.id_conv(embedding, mask=padding_mask(x_char, embedding))
 
         out = out.permute(0, 2, 1)
 
@@ -1,10 +1,9 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 
 from attacut import utils, dataloaders, logger, output_tags, char_type
-from . import BaseModel, ConvolutionLayer
+from . import BaseModel, run_lstm, ConvolutionLayer
 
 log = logger.get_logger(__name__)
 
@@ -12,6 +11,10 @@ log = logger.get_logger(__name__)
 class Model(BaseModel):
     dataset = dataloaders.CharacterSeqDataset
 
+    # skip paddings when running the LSTM, see `run_lstm`; off by default,
+    # since the padded computation is faster on CPU
+    packed = False
+
     def __init__(self, data_config, model_config="embc:16|embt:8|cells:32|l1:16|bi:1|oc:BI"):
         super(Model, self).__init__()
 
@@ -58,7 +61,7 @@ class Model(BaseModel):
 
         embedding = torch.cat((ch_embedding, ch_type_embedding), dim=2)
 
-        out, _ = self.lstm(embedding)
+        out = run_lstm(self.lstm, embedding, seq_lengths, packed=self.packed)
         out = self.dropout(out)
 
         out = F.relu(self.linear1(out))
@@ -0,0 +1,105 @@
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from attacut import utils, dataloaders, logger, output_tags, char_type
+from . import BaseModel, prepare_embedding, IteratedDilatedConvolutions, padding_mask
+
+log = logger.get_logger(__name__)
+
+from torchcrf import CRF
+
+
+class Model(BaseModel):
+    # like seq_sy_ch_conv_3lv, but the convolutions run over syllables;
+    # characters of a syllable are embedded (with their position in the
+    # syllable) and max-pooled into one vector per syllable.
+    dataset = dataloaders.SyllableStepDataset
+
+    def __init__(self, data_config, model_config="embc:16|embt:8|embs:8|conv:16|l1:16|do:0.0|oc:BI"):
+        super(Model, self).__init__()
+
+
+        no_chars = data_config['num_char_tokens']
+        log.info("no. characters: %d" % no_chars)
+
+        no_syllables = data_config['num_tokens']
+        log.info("no. syllables: %d" % no_syllables)
+
+        config = utils.parse_model_params(model_config)
+        conv_filters = config["conv"]
+        dropout_rate = config.get("do", 0)
+
+        self.output_scheme = output_tags.get_scheme(config["oc"])
+
+        self.max_syllable_chars = dataloaders.SyllableStepDataset.MAX_SYLLABLE_CHARS
+
+        self.ch_type_embeddings = nn.Embedding(
+            char_type.get_total_char_types(),
+            config["embt"],
+        )
+
+        self.ch_embeddings = nn.Embedding(
+            no_chars,
+            config["embc"],
+            padding_idx=0
+        )
+
+        self.ch_position_embeddings = nn.Embedding(
+            self.max_syllable_chars,
+            config["embc"],
+        )
+
+        self.sy_embeddings = prepare_embedding(data_config, config)
+
+        if "crf" in config:
+            self.crf = CRF(self.output_scheme.num_tags, batch_first=True)
+
+        emb_dim = config["embc"] + config["embt"] + self.sy_embeddings.weight.shape[1]
+
+        self.id_conv = IteratedDilatedConvolutions(
+            emb_dim, conv_filters, dropout_rate
+        )
+
+        self.linear1 = nn.Linear(conv_filters, config['l1'])
+        self.linear2 = nn.Linear(config['l1'], self.output_scheme.num_tags)
+
+        self.model_params = model_config
+
+    def pool_characters(self, x_char, x_type):
+        # (batch, chars, len) -> (batch, len, embc + embt)
+        positions = torch.arange(x_char.shape[1], device=x_char.device)
+
+        ch_embedding = self.ch_embeddings(x_char) \
+            + self.ch_position_embeddings(positions).unsqueeze(1)
+        ch_type_embedding = self.ch_type_embeddings(x_type)
+
+        embedding = torch.cat((ch_embedding, ch_type_embedding), dim=3)
+
+        # <PAD> characters never win the max; syllables without characters get zeros
+        mask = (x_char != 0).unsqueeze(3)
+        embedding = embedding.masked_fill(~mask, float("-inf")).max(dim=1)[0]
+
+        return embedding.masked_fill(~mask.any(dim=1), 0)
+
+    def forward(self, inputs):
+        x, seq_lengths = inputs
+
+        w = self.max_syllable_chars
+        x_syllable, x_char, x_type = x[:, 0, :], x[:, 1:1+w, :], x[:, 1+w:, :]
+
+        sy_embedding = self.sy_embeddings(x_syllable)
+        ch_embedding = self.pool_characters(x_char, x_type)
+
+        embedding = torch.cat((ch_embedding, sy_embedding), dim=2)
+
+        embedding = embedding.permute(0, 2, 1)
+
+        out = self.id_conv(embedding, mask=padding_mask(x_syllable, embedding))
+
+        out = out.permute(0, 2, 1)
+        out = F.relu(self.linear1(out))
+        out = self.linear2(out)
+
+        return out
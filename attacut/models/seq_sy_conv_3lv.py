@@ -5,7 +5,7 @@ import torch.nn.functional as F
 from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 
 from attacut import utils, dataloaders, logger, output_tags, char_type
-from . import BaseModel, IteratedDilatedConvolutions, prepare_embedding
+from . import BaseModel, ConvolutionLayer, IteratedDilatedConvolutions, padding_mask, prepare_embedding
 
 log = logger.get_logger(__name__)
 
@@ -14,6 +14,7 @@ from torchcrf import CRF
 
 class Model(BaseModel):
     dataset = dataloaders.SyllableSeqDataset
+    conv_layer = ConvolutionLayer
 
     def __init__(self, data_config, model_config="embs:8|conv:16|l1:16|do:0.0|oc:BI"):
         super(Model, self).__init__()
@@ -36,7 +37,7 @@ class Model(BaseModel):
         emb_dim = self.sy_embeddings.weight.shape[1]
 
         self.id_conv = IteratedDilatedConvolutions(
-            emb_dim, conv_filters, dropout_rate
+            emb_dim, conv_filters, dropout_rate, layer=self.conv_layer
         )
 
         self.linear1 = nn.Linear(conv_filters, config['l1'])
@@ -51,7 +52,7 @@ class Model(BaseModel):
 
         embedding = embedding.permute(0, 2, 1)
 
-        out = self.id_conv(embedding)
+        out = self.id_conv(embedding, mask=padding_mask(x, embedding))
 
         out = out.permute(0, 2, 1)
         out = F.relu(self.linear1(out))
@@ -1,12 +1,11 @@
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
-from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
 
 from torchcrf import CRF
 
 from attacut import utils, dataloaders, logger, output_tags, char_type
-from . import BaseModel, ConvolutionLayer, EmbeddingWithDropout
+from . import BaseModel, run_lstm, ConvolutionLayer, EmbeddingWithDropout
 
 log = logger.get_logger(__name__)
 
@@ -14,6 +13,10 @@ log = logger.get_logger(__name__)
 class Model(BaseModel):
     dataset = dataloaders.SyllableSeqDataset
 
+    # skip paddings when running the LSTM, see `run_lstm`; off by default,
+    # since the padded computation is faster on CPU
+    packed = False
+
     def __init__(self, data_config, model_config="embs:8|cells:32|l1:16|oc:BI|crf:1"):
         super(Model, self).__init__()
 
@@ -53,7 +56,7 @@ class Model(BaseModel):
 
         embedding = self.sy_embeddings(x)
 
-        out, _ = self.lstm(embedding)
+        out = run_lstm(self.lstm, embedding, seq_lengths, packed=self.packed)
 
         out = self.dropout(out)
 
@@ -0,0 +1,7 @@
+from . import SeparableConvolutionLayer
+from .seq_sy_conv_3lv import Model as ConvModel
+
+
+class Model(ConvModel):
+    # seq_sy_conv_3lv with depthwise-separable dilated convolutions
+    conv_layer = SeparableConvolutionLayer
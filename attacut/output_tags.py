@@ -1,3 +1,5 @@
+import itertools
+
 import numpy as np
 
 def get_scheme(name):
@@ -24,12 +26,64 @@ def find_word_boundaries(labels):
 
     return word_boundaries
 
+
+def _factorize(values):
+    # values -> non-negative integers, equal iff the values are equal
+    if isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.integer):
+        return values - values.min()
+
+    # a dict is faster than np.unique on (Thai) strings
+    codes = dict()
+    return np.array([codes.setdefault(v, len(codes)) for v in values], dtype=np.int64)
+
+
+def syllables_per_word(labels, sy_ix, syllable_level=False):
+    """
+    Number of syllables of the word that each position belongs to, i.e.
+    distinct values of sy_ix within the word (or its length at syllable level),
+    computed for the whole line at once. Positions before the first boundary
+    are dropped, as in :meth:`find_word_boundaries`.
+    """
+    labels = np.asarray(labels)
+    st = np.flatnonzero(labels == 1)[0]
+
+    word_ix = np.cumsum(labels[st:] == 1) - 1
+    total_words = word_ix[-1] + 1
+
+    if syllable_level:
+        counts = np.bincount(word_ix, minlength=total_words)
+    else:
+        # a (word, syllable) pair counts once, however often the syllable repeats
+        sy = _factorize(sy_ix[st:])
+        total_sy = sy.max() + 1
+        pairs = np.unique(word_ix * total_sy + sy)
+        counts = np.bincount(pairs // total_sy, minlength=total_words)
+
+    return counts[word_ix], labels[st:] == 1
+
+
+def encode_lines(scheme, labels, sy_ix):
+    """
+    scheme.encode of many lines with one call on their concatenation;
+    lines that don't start with a boundary are encoded one by one.
+    """
+    if not all(len(l) > 0 and l[0] == 1 for l in labels):
+        return [scheme.encode(l, s) for l, s in zip(labels, sy_ix)]
+
+    encoded = scheme.encode(
+        np.concatenate(labels),
+        list(itertools.chain.from_iterable(sy_ix))
+    )
+
+    return np.split(encoded, np.cumsum([len(l) for l in labels])[:-1])
+
+
 class SchemeBI:
     
     num_tags = 2
 
     @staticmethod
-    def encode(labels, sy_ix):
+    def encode(labels, sy_ix, syllable_level=False):
         """ don't nothing here"""
 
         return np.array(labels).astype(int)
@@ -51,30 +105,12 @@ class SchemeA():
 
     @staticmethod
     def encode(labels, sy_ix, syllable_level=False):
-        b_locations = np.argwhere(labels == 1).reshape(-1)
-
-        word_boundaries = find_word_boundaries(labels)
+        num_syllables, is_begin = syllables_per_word(labels, sy_ix, syllable_level)
 
-        new_labels = []
-        for wb in word_boundaries:
-            num_chars = wb[1] - wb[0]
-            if syllable_level:
-                num_syllables = num_chars
-            else:
-                num_syllables = len(set(sy_ix[wb[0]:wb[1]]))
+        # 1-2 -> 1, 3-4 -> 3, 5+ -> 5
+        ub = np.minimum((num_syllables + 1) // 2, 3) * 2 - 1
 
-            num_inner = num_chars - 1
-
-            if 1 <= num_syllables <= 2:
-                new_labels.extend([1]+[0]*num_inner)
-            elif 3 <= num_syllables <= 4:
-                new_labels.extend([3]+[2]*num_inner)
-            elif num_syllables >= 5:
-                new_labels.extend([5]+[4]*num_inner)
-            else:
-                raise ValueError("Something went wrong!!")
-
-        return np.array(new_labels).astype(int)
+        return np.where(is_begin, ub, ub - 1).astype(int)
 
 
     @staticmethod
@@ -94,27 +130,11 @@ class SchemeB():
 
     @staticmethod
     def encode(labels, sy_ix, syllable_level=False):
-        b_locations = np.argwhere(labels == 1).reshape(-1)
-
-        word_boundaries = find_word_boundaries(labels)
-
-        new_labels = []
-        for wb in word_boundaries:
-            num_chars = wb[1] - wb[0]
-
-            if syllable_level:
-                num_syllables = num_chars
-            else:
-                num_syllables = len(set(sy_ix[wb[0]:wb[1]]))
-
-            ub = np.min([num_syllables, 4])*2 - 1
+        num_syllables, is_begin = syllables_per_word(labels, sy_ix, syllable_level)
 
-            if num_syllables >= 1:
-                new_labels.extend([ub]+[ub-1]*(num_chars-1))
-            else:
-                raise ValueError("Something went wrong!!")
+        ub = np.minimum(num_syllables, 4) * 2 - 1
 
-        return np.array(new_labels).astype(int)
+        return np.where(is_begin, ub, ub - 1).astype(int)
 
     @staticmethod
     def decode_condition(ix):
@@ -122,10 +142,10 @@ class SchemeB():
 
 class SchemeASyLevel(SchemeB):
     @staticmethod
-    def encode(labels, sy_ix):
+    def encode(labels, sy_ix, syllable_level=True):
         return SchemeA.encode(labels, sy_ix, syllable_level=True)
 
 class SchemeBSyLevel(SchemeB):
     @staticmethod
-    def encode(labels, sy_ix):
+    def encode(labels, sy_ix, syllable_level=True):
         return SchemeB.encode(labels, sy_ix, syllable_level=True)
\ No newline at end of file
@@ -0,0 +1,163 @@
+import math
+import resource
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+import torch
+
+from attacut import logger
+
+log = logger.get_logger(__name__)
+
+# words used for generating synthetic workloads
+SYNTHETIC_WORDS = [
+    "ภาษา", "ไทย", "ยาก", "จัง", "ไป", "โรง", "เรียน", "ดี", "กว่า", "ด้วย",
+    "ผม", "ไม่", "ชอบ", "กิน", "ผัก", "แต่", "นาย", "ใจ", "มาก", "ประชาธิปไตย",
+    "วันนี้", "ทำไม", "บ้าน", "แม่", "จังหวัด", "คน", "ที่", "อย่าง", "2563", " ",
+]
+
+# keys identifying a measurement when comparing against a baseline
+KEYS = ["model", "workload", "batch_size", "threads"]
+
+
+def synthetic_lines(length: int, total_chars: int = 20000, seed: int = 71) -> List[str]:
+    """
+    Generate lines of ``length`` characters from SYNTHETIC_WORDS.
+    """
+    rng = np.random.RandomState(seed)
+
+    lines = []
+    for _ in range(max(1, total_chars // length)):
+        line = ""
+        while len(line) < length:
+            line += SYNTHETIC_WORDS[rng.randint(len(SYNTHETIC_WORDS))]
+        lines.append(line[:length].strip() or "ก")
+
+    return lines
+
+
+def read_lines(path: str, max_lines: int = 0) -> List[str]:
+    lines = []
+    with open(path, "r", encoding="utf-8") as fh:
+        for line in fh:
+            line = line.rstrip("\n")
+            if line:
+                lines.append(line)
+            if max_lines and len(lines) >= max_lines:
+                break
+    return lines
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 ** 2) if sys.platform == "darwin" else rss / 1024
+
+
+def private_memory_mb() -> float:
+    # memory of this process not shared with others, e.g. with its parent after
+    # fork (unlike RSS, which counts shared pages too); Linux only, NaN elsewhere
+    try:
+        with open("/proc/self/smaps_rollup", "r") as fh:
+            kb = sum(int(l.split()[1]) for l in fh if l.startswith(("Private_Clean:", "Private_Dirty:")))
+    except OSError:
+        return math.nan
+
+    return kb / 1024
+
+
+def measure(tokenizer, lines: List[str], batch_size: int, repeat: int = 1) -> Dict[str, float]:
+    """
+    Tokenize ``lines`` in batches and compute throughput and per-batch latency.
+    """
+    batches = [lines[i:i+batch_size] for i in range(0, len(lines), batch_size)]
+    total_chars = sum(map(len, lines)) * repeat
+
+    latencies = []
+    st = time.perf_counter()
+    for _ in range(repeat):
+        for b in batches:
+            bst = time.perf_counter()
+            tokenizer.tokenize_batch(b)
+            latencies.append(time.perf_counter() - bst)
+
+    took = time.perf_counter() - st
+    latencies = np.array(latencies) * 1000
+
+    return dict(
+        chars_per_sec=total_chars / took,
+        p50_ms=float(np.percentile(latencies, 50)),
+        p99_ms=float(np.percentile(latencies, 99)),
+        total_chars=total_chars,
+        time_took=took,
+    )
+
+
+def run_model_suite(model: str, workloads: Dict[str, List[str]], batch_sizes: List[int],
+    threads: List[int], repeat: int = 1) -> List[Dict]:
+    """
+    Sweep workloads x batch sizes x thread counts for one model.
+    Meant to run in a fresh process so that peak RSS belongs to this model only.
+    """
+    from attacut import Tokenizer
+
+    st = time.perf_counter()
+    tokenizer = Tokenizer(model)
+    load_time = time.perf_counter() - st
+
+    # warm up code paths before timing
+    tokenizer.tokenize_batch(synthetic_lines(32, total_chars=256))
+
+    results = []
+    for t in threads:
+        torch.set_num_threads(t)
+        for name, lines in workloads.items():
+            for bs in batch_sizes:
+                stats = measure(tokenizer, lines, bs, repeat=repeat)
+                stats.update(
+                    model=model,
+                    workload=name,
+                    batch_size=bs,
+                    threads=t,
+                    load_time=load_time,
+                    peak_rss_mb=peak_rss_mb(),
+                )
+                log.info("%s" % stats)
+                results.append(stats)
+
+    return results
+
+
+def compare(results: List[Dict], baseline: List[Dict], tolerance: float = 0.1) -> List[str]:
+    """
+    Compare measurements against a baseline; measurements of the baseline
+    missing from ``results`` (e.g. of a model that failed) count as regressions.
+    :return: human readable descriptions of regressions beyond ``tolerance``
+    """
+    key = lambda r: tuple(r[k] for k in KEYS)
+    baseline = dict((key(r), r) for r in baseline)
+
+    measured = set(key(r) for r in results)
+    regressions = [
+        "%s: missing" % "|".join(map(str, k)) for k in baseline if k not in measured
+    ]
+
+    for r in results:
+        b = baseline.get(key(r))
+        if b is None:
+            continue
+
+        name = "|".join(map(str, key(r)))
+
+        if r["chars_per_sec"] < b["chars_per_sec"] * (1 - tolerance):
+            regressions.append("%s: chars_per_sec %.1f < baseline %.1f" % (
+                name, r["chars_per_sec"], b["chars_per_sec"]
+            ))
+
+        for k in ["p50_ms", "p99_ms", "load_time", "peak_rss_mb"]:
+            if k in b and r[k] > b[k] * (1 + tolerance):
+                regressions.append("%s: %s %.3f > baseline %.3f" % (name, k, r[k], b[k]))
+
+    return regressions
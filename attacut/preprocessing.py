@@ -1,9 +1,10 @@
 import re
 import string
-from typing import Dict, List
+from functools import lru_cache
+from typing import Callable, Dict, List, Tuple
 
 import ssg
-from attacut.minpythainlp import thai_digit_to_arabic_digit
+from attacut.minpythainlp import _thai_arabic, replace_characters, thai_digit_to_arabic_digit
 
 ARABIC_RX = re.compile(r"[A-Za-z]+")
 CAMEL_CASE_RX = re.compile(r"([a-z])([A-Z])([a-z])")
@@ -12,6 +13,10 @@ NUMBER_RX = re.compile(r"[0-9,]+")
 TRAILING_SPACE_RX = re.compile(r"\n$")
 URL_RX = re.compile(r"(https?:\/\/)?(\w+\.)?\w+\.\w+")
 SPACE_RX = re.compile(r"\s+")
+TAG_RX = re.compile(r"<\/?[A-Z]+>")
+# a run of tags and pipes, e.g. "|<NE>|", becomes one pipe after removing tags and collapsing pipes
+TAGS_AND_PIPES_RX = re.compile(r"(?:\||<\/?[A-Z]+>)+")
+PIPES_RX = re.compile(r"\|+")
 
 PUNCTUATION_AND_SPACE = list(string.punctuation) + [" "]
 
@@ -55,7 +60,11 @@ def character2ix(ch2ix: Dict[str, int], character: str) -> int:
 
 
 def step_remove_tags(txt: str) -> str:
-    return re.sub(r"<\/?[A-Z]+>", "", txt)
+    return TAG_RX.sub("", txt)
+
+
+def step_collapse_pipes(txt: str) -> str:
+    return PIPES_RX.sub("|", txt)
 
 
 def step_thai_digit_to_arabic_digit(txt: str) -> str:
@@ -82,13 +91,105 @@ def step_remove_last_pipe(txt: str) -> str:
     return re.sub(r"\|$", "", txt)
 
 
+# steps that Normalizer fuses: character mappings, regex passes and pipe trimming
+TRANSLATE_STEPS = ["thai_digit_to_arabic_digit", "new_line_as_space"]
+REGEX_STEPS = ["remove_tags", "collapse_pipes"]
+PIPE_STEPS = ["remove_first_pipe", "remove_last_pipe"]
+
+
+class Normalizer:
+    """
+    Compiled form of a list of preprocessing steps.
+    Consecutive fusable steps are applied as one character mapping, at most one
+    regex pass and pipe trimming, in this order; a run is split wherever that
+    would change the result, e.g. when a pipe is trimmed before tags are removed.
+    Other steps (names or callables) are applied as they are.
+    """
+    def __init__(self, steps: Tuple):
+        self.ops = []
+
+        run = []
+        for s in steps:
+            if isinstance(s, str) and s in TRANSLATE_STEPS + REGEX_STEPS + PIPE_STEPS:
+                if not self._can_extend(run, s):
+                    self.ops.append(self._fuse(run))
+                    run = []
+                run.append(s)
+                continue
+
+            if run:
+                self.ops.append(self._fuse(run))
+                run = []
+
+            self.ops.append(globals()["step_%s" % s] if isinstance(s, str) else s)
+
+        if run:
+            self.ops.append(self._fuse(run))
+
+    def __call__(self, txt: str) -> str:
+        for op in self.ops:
+            txt = op(txt)
+        return txt
+
+    @staticmethod
+    def _can_extend(run: List[str], step: str) -> bool:
+        if step in run:
+            return False
+        elif step == "new_line_as_space":
+            # `\|$` also matches before a trailing new line
+            return "remove_last_pipe" not in run
+        elif step in REGEX_STEPS:
+            return not any(s in run for s in PIPE_STEPS) \
+                and not (step == "remove_tags" and "collapse_pipes" in run)
+        return True
+
+    @staticmethod
+    def _fuse(run: List[str]) -> Callable[[str], str]:
+        mapping = []
+        if "thai_digit_to_arabic_digit" in run:
+            mapping.extend(_thai_arabic.items())
+        if "new_line_as_space" in run:
+            mapping.append(("\n", " "))
+
+        if "remove_tags" in run and "collapse_pipes" in run:
+            rx, repl = TAGS_AND_PIPES_RX, lambda m: "|" if "|" in m.group(0) else ""
+        elif "remove_tags" in run:
+            rx, repl = TAG_RX, ""
+        elif "collapse_pipes" in run:
+            rx, repl = PIPES_RX, "|"
+        else:
+            rx = None
+
+        first_pipe, last_pipe = "remove_first_pipe" in run, "remove_last_pipe" in run
+
+        def normalize(txt: str) -> str:
+            if mapping:
+                txt = replace_characters(txt, mapping)
+
+            if rx is not None:
+                txt = rx.sub(repl, txt)
+
+            if first_pipe and txt.startswith("|"):
+                txt = txt[1:]
+
+            if last_pipe:
+                if txt.endswith("|"):
+                    txt = txt[:-1]
+                elif txt.endswith("|\n"):
+                    txt = txt[:-2] + "\n"
+
+            return txt
+
+        return normalize
+
+
+@lru_cache(maxsize=32)
+def compile_steps(steps: Tuple) -> Normalizer:
+    return Normalizer(steps)
+
+
 def preprocess(txt: str, steps=DEFAULT_PREPROCESSING_STEPS) -> str:
-    for s in steps:
-        if isinstance(s, str):
-            txt = globals()["step_%s" % s](txt)
-        elif callable(s):
-            txt = s(txt)
-    return txt
+    return compile_steps(tuple(steps))(txt)
 
 
 def expand_camel_case_to_tokens(w, verbose=0):
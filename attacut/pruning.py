@@ -0,0 +1,83 @@
+import re
+
+import torch
+
+from attacut import logger, models
+
+log = logger.get_logger(__name__)
+
+CONV_LAYERS = ["conv1", "conv2", "conv3"]
+
+
+def is_prunable(model: models.BaseModel) -> bool:
+    # depthwise-separable layers aren't supported
+    return hasattr(model, "id_conv") \
+        and isinstance(model.id_conv, models.IteratedDilatedConvolutions) \
+        and all(isinstance(getattr(model.id_conv, n), models.ConvolutionLayer) for n in CONV_LAYERS)
+
+
+def channel_importance(model: models.BaseModel):
+    """
+    Score every output channel of the three dilated convolutions.
+    A channel's score is the L1-norm of the filter producing it times the
+    L1-norm of the weights consuming it in the next layer (conv or linear1).
+    :return: list of 1-d tensors, one per convolution layer
+    """
+    convs = [getattr(model.id_conv, n).conv for n in CONV_LAYERS]
+
+    scores = []
+    for i, conv in enumerate(convs):
+        produced = conv.weight.detach().abs().sum(dim=(1, 2))
+
+        if i + 1 < len(convs):
+            consumed = convs[i+1].weight.detach().abs().sum(dim=(0, 2))
+        else:
+            consumed = model.linear1.weight.detach().abs().sum(dim=0)
+
+        scores.append(produced * consumed)
+
+    return scores
+
+
+def replace_conv_width(model_params: str, filters: int) -> str:
+    return re.sub(r"conv:[0-9]+", "conv:%d" % filters, model_params)
+
+
+def prune(model: models.BaseModel, data_config, filters: int) -> models.BaseModel:
+    """
+    Physically remove the weakest channels so that every dilated convolution
+    has ``filters`` outputs; linear1's inputs are sliced accordingly.
+    """
+    assert is_prunable(model), "%s has no IteratedDilatedConvolutions of full convolutions" % type(model)
+
+    new_params = replace_conv_width(model.model_params, filters)
+    pruned = type(model)(data_config, new_params)
+
+    keep = [
+        torch.sort(torch.topk(s, filters).indices).values
+        for s in channel_importance(model)
+    ]
+
+    state = model.state_dict()
+    prev = None
+    for name, ix in zip(CONV_LAYERS, keep):
+        w = state["id_conv.%s.conv.weight" % name][ix]
+        if prev is not None:
+            w = w[:, prev]
+
+        state["id_conv.%s.conv.weight" % name] = w
+        state["id_conv.%s.conv.bias" % name] = state["id_conv.%s.conv.bias" % name][ix]
+        prev = ix
+
+    state["linear1.weight"] = state["linear1.weight"][:, prev]
+
+    pruned.load_state_dict(state)
+    pruned.train(model.training)
+
+    log.info("pruned conv width %d -> %d (variables %d -> %d)" % (
+        model.id_conv.conv1.conv.out_channels, filters,
+        model.total_trainable_params(), pruned.total_trainable_params()
+    ))
+
+    return pruned
+
@@ -1,20 +1,61 @@
+import gc
+import itertools
+import multiprocessing
+import os
+import threading
 from typing import Dict, List
 
 import numpy as np
 import torch
 
-from attacut import (artifacts, dataloaders, logger, models, preprocessing,
-                     utils)
+from attacut import (artifacts, dataloaders, logger, models, perf,
+                     preprocessing, utils)
 
 log = logger.get_logger(__name__)
 
+# text tokenized by Tokenizer.warmup
+WARMUP_TXT = "ภาษาไทยยากจังไปโรงเรียนดีกว่าไปด้วยซิ "
+
 
 def tokenize(txt: str) -> List[str]:
     return SingletonTokenizer().tokenize(txt)
 
 
+# state of a tokenize_parallel worker; the tokenizer is inherited from the parent by fork
+_worker = None
+
+
+def _init_worker(tokenizer, threads, pack):
+    global _worker
+
+    # workers * threads shouldn't exceed the cores
+    torch.set_num_threads(threads)
+
+    # thread-local state (workspace, denormal flushing) isn't inherited meaningfully
+    tokenizer._thread = threading.local()
+
+    _worker = dict(
+        tokenizer=tokenizer,
+        pack=pack,
+        shared_weights=all(w.is_shared() for w in tokenizer.model.state_dict().values()),
+    )
+
+
+def _tokenize_chunk(txts: List[str]):
+    results = _worker["tokenizer"].tokenize_batch(txts, pack=_worker["pack"])
+
+    stats = dict(
+        pid=os.getpid(),
+        peak_rss_mb=perf.peak_rss_mb(),
+        private_mb=perf.private_memory_mb(),
+        shared_weights=_worker["shared_weights"],
+    )
+
+    return results, stats
+
+
 class Tokenizer:
-    def __init__(self, model: str = "attacut-sc"):
+    def __init__(self, model: str = "attacut-sc", profile: bool = False, flush_denormal: bool = True):
         # resolve model's path
         model_path = artifacts.get_path(model)
 
@@ -43,28 +84,186 @@ class Tokenizer:
 
         self.dataset = dataset
 
+        # per-stage timing; a no-op unless `profile` is set
+        self.stats = utils.Profiler(enabled=profile)
+        if profile:
+            self.dataset.profiler = self.stats
+
+        # the setting is per thread, so it's made by every thread calling the
+        # tokenizer (see models.flush_denormal); False leaves threads as they are.
+        self.flush_denormal = flush_denormal
+
+        # per thread: whether it's set up and a workspace for `tokenize`
+        self._thread = threading.local()
+
+        # memory of the workers of the last `tokenize_parallel` call, by pid
+        self.worker_stats = dict()
+
+    def _setup_thread(self) -> dataloaders.Workspace:
+        thread = self._thread
+        if not hasattr(thread, "workspace"):
+            if self.flush_denormal:
+                models.flush_denormal()
+
+            thread.workspace = dataloaders.Workspace()
+
+        return thread.workspace
+
+    def warmup(self, length: int = 512, device="cpu"):
+        """
+        Tokenize a line of ``length`` characters in the calling thread, so that
+        its workspace fits such lines and PyTorch's lazy initialization is
+        done before the first actual call.
+        """
+        txt = (WARMUP_TXT * (length // len(WARMUP_TXT) + 1))[:length]
+        self.tokenize(txt, device=device)
+
     def tokenize(self, txt: str, sep="|", device="cpu", pred_threshold=0.5) -> List[str]:
         if txt == "":  # handle empty input string
             return [""]
         if not txt or not isinstance(txt, str):  # handle None
             return []
 
-        tokens, features = self.dataset.make_feature(txt)
+        workspace = self._setup_thread()
 
-        inputs = (
-            features,
-            torch.Tensor(0)  # dummy label when won't need it here
-        )
+        stats = self.stats
+
+        # features and predictions are written to the thread's workspace
+        with models.inference_mode():
+            with stats.stage("make_feature"):
+                tokens, (x, seq) = self.dataset.make_feature(txt, workspace=workspace)
 
-        x, _, _ = self.dataset.prepare_model_inputs(inputs, device=device)
+            # SyllableSeqDataset's features come without the batch dimension
+            if x.dim() == 1:
+                x = x.unsqueeze(0)
 
-        preds = self.model.decode(self.model(x), len(tokens))
-        preds = np.array(preds).reshape(-1)
+            with stats.stage("model_forward"):
+                logits = self.model((x.to(device), seq.to(device)))
 
-        words = preprocessing.find_words_from_preds(tokens, preds)
+            with stats.stage("decode"):
+                out = workspace.outputs(logits.shape[:2]) if logits.device.type == "cpu" else None
+                preds = self.model.decode(logits, seq.to(device), out=out)
+                preds = np.asarray(preds).reshape(-1)
+
+        with stats.stage("find_words_from_preds"):
+            words = preprocessing.find_words_from_preds(tokens, preds)
 
         return words
 
+    def tokenize_batch(self, txts: List[str], device="cpu", pack=False) -> List[List[str]]:
+        # same output as calling `tokenize` on each text (for bidirectional
+        # LSTMs, only with `model.packed`, see models.run_lstm), but the model
+        # runs once on the padded batch, or with `pack`, on rows of
+        # concatenated lines (IteratedDilatedConvolutions models only).
+        self._setup_thread()
+
+        results = [None] * len(txts)
+        stats = self.stats
+
+        batch, all_tokens, indices = [], [], []
+        for i, txt in enumerate(txts):
+            if txt == "" or not isinstance(txt, str):
+                results[i] = self.tokenize(txt)
+                continue
+
+            with stats.stage("make_feature"):
+                tokens, (features, seq) = self.dataset.make_feature(txt)
+
+            batch.append(((dataloaders.drop_batch_dim(features), seq.squeeze(0)), torch.zeros(seq[0])))
+            all_tokens.append(tokens)
+            indices.append(i)
+
+        if not batch:
+            return results
+
+        if pack:
+            with models.inference_mode(), stats.stage("model_forward"):
+                preds = models.predict_packed(
+                    self.model, [features for (features, _), _ in batch], device=device
+                )
+
+            with stats.stage("find_words_from_preds"):
+                for tokens, i, pred in zip(all_tokens, indices, preds):
+                    results[i] = preprocessing.find_words_from_preds(tokens, pred[:len(tokens)])
+
+            return results
+
+        with stats.stage("collate_fn"):
+            (x, seq), _, perm_idx = self.dataset.collate_fn(batch)
+
+        with models.inference_mode():
+            with stats.stage("model_forward"):
+                logits = self.model((x.to(device), seq.to(device)))
+
+            with stats.stage("decode"):
+                preds = self.model.decode(logits, seq.to(device))
+
+        with stats.stage("find_words_from_preds"):
+            for sorted_ix, ori_ix in enumerate(perm_idx.tolist()):
+                tokens = all_tokens[ori_ix]
+                results[indices[ori_ix]] = preprocessing.find_words_from_preds(
+                    tokens, preds[sorted_ix][:len(tokens)]
+                )
+
+        return results
+
+    def tokenize_parallel(self, txts: List[str], workers: int = None, chunk_size: int = 64,
+        threads: int = 1, pack=False) -> List[List[str]]:
+        """
+        Same output as `tokenize_batch`, computed by ``workers`` (default: all cores)
+        forked processes on chunks of ``chunk_size`` lines, each using ``threads``
+        torch threads; results are in the order of ``txts``.
+
+        The model's weights are moved to shared memory and the dictionaries are
+        inherited from this process, so workers don't hold copies of them.
+        Without fork (e.g. on Windows), lines are tokenized in this process.
+
+        Afterwards, ``worker_stats`` has each worker's peak RSS, private memory
+        (not shared with this process), whether it saw the weights in shared
+        memory and how many chunks it tokenized.
+        """
+        self.worker_stats = dict()
+
+        txts = list(txts)
+        workers = min(workers or os.cpu_count(), -(-len(txts) // chunk_size))
+
+        if workers <= 1 or "fork" not in multiprocessing.get_all_start_methods():
+            if workers > 1:
+                log.warning("fork isn't available; tokenizing in the calling process")
+            return list(itertools.chain.from_iterable(
+                self.tokenize_batch(txts[i:i+chunk_size], pack=pack)
+                for i in range(0, len(txts), chunk_size)
+            ))
+
+        self.model.share_memory()
+
+        chunks = [txts[i:i+chunk_size] for i in range(0, len(txts), chunk_size)]
+
+        # objects that exist now are left alone by the workers' garbage collection,
+        # which would otherwise write to (and so copy) pages of the dictionaries.
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+
+        # command.py makes spawn the default start method, hence the explicit context
+        ctx = multiprocessing.get_context("fork")
+        try:
+            with ctx.Pool(workers, initializer=_init_worker, initargs=(self, threads, pack)) as pool:
+                results = []
+                for words, stats in pool.imap(_tokenize_chunk, chunks):
+                    results.extend(words)
+
+                    pid = stats.pop("pid")
+                    stats["chunks"] = self.worker_stats.get(pid, dict(chunks=0))["chunks"] + 1
+                    self.worker_stats[pid] = stats
+        finally:
+            if hasattr(gc, "unfreeze"):
+                gc.unfreeze()
+
+        for pid, stats in self.worker_stats.items():
+            log.info("worker %d: %s" % (pid, stats))
+
+        return results
+
 
 class SingletonTokenizer(Tokenizer):
     _instance = None
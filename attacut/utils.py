@@ -3,11 +3,12 @@ import os
 import time
 import re
 
+from contextlib import contextmanager
 from typing import Callable, Dict, NamedTuple, Union
 
 import yaml
 
-from attacut import logger
+from attacut import logger, perf
 
 log = logger.get_logger(__name__)
 
@@ -37,6 +38,125 @@ class Timer:
         print("Finished block: %s with %d seconds" % (self.name, diff))
 
 
+class _NullStage:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class Profiler:
+    """
+    Cumulative wall time and call counts per named stage.
+    Stages may be nested, e.g. syllable_tokenize is part of make_feature.
+    When disabled, `stage` returns a shared no-op context manager.
+
+    Memory comes from the process' peak RSS (a high-water mark), so it isn't
+    per stage: `max_rss_mb` is the peak after the stage ended and
+    `max_rss_increase_mb` is how much the stage raised it; a stage using less
+    memory than an earlier peak adds nothing.
+    """
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.reset()
+
+    def reset(self):
+        self.stages = dict()
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._stage(name)
+
+    @contextmanager
+    def _stage(self, name: str):
+        rss_before = perf.peak_rss_mb()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            took = time.perf_counter() - start
+            rss_after = perf.peak_rss_mb()
+
+            st = self.stages.setdefault(
+                name, dict(calls=0, total_time=0.0, max_rss_mb=0.0, max_rss_increase_mb=0.0)
+            )
+            st["calls"] += 1
+            st["total_time"] += took
+            st["max_rss_mb"] = max(st["max_rss_mb"], rss_after)
+            st["max_rss_increase_mb"] += rss_after - rss_before
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        return dict(
+            (k, dict(v, avg_time=v["total_time"] / v["calls"]))
+            for k, v in self.stages.items()
+        )
+
+    def summary(self) -> str:
+        rows = ["%-24s %10s %12s %12s %14s" % (
+            "stage", "calls", "total (s)", "avg (ms)", "max rss (MB)"
+        )]
+
+        for k, v in sorted(self.to_dict().items(), key=lambda x: -x[1]["total_time"]):
+            rows.append("%-24s %10d %12.4f %12.4f %14.1f" % (
+                k, v["calls"], v["total_time"], v["avg_time"] * 1000, v["max_rss_mb"]
+            ))
+
+        return "\n".join(rows)
+
+    def dump(self, path: str):
+        with open(path, "w") as fh:
+            json.dump(self.to_dict(), fh, indent=2)
+
+
+# shared disabled profiler, e.g. for datasets used outside of a Tokenizer
+NULL_PROFILER = Profiler(enabled=False)
+
+
+class EarlyStopping:
+    """
+    Stop once the monitored value hasn't improved for ``patience`` epochs.
+    :param str mode: "min" (e.g. loss) or "max" (e.g. f1)
+    """
+    def __init__(self, patience: int, mode: str = "min"):
+        assert mode in ["min", "max"], "mode should be either min or max"
+
+        self.patience = patience
+        self.mode = mode
+        self.best = None
+        self.bad_epochs = 0
+
+    def is_better(self, value: float) -> bool:
+        if self.best is None:
+            return True
+        return value < self.best if self.mode == "min" else value > self.best
+
+    def step(self, value: float) -> bool:
+        # returns whether to stop
+        if self.is_better(value):
+            self.best = value
+            self.bad_epochs = 0
+        else:
+            self.bad_epochs += 1
+
+        return self.stopped
+
+    @property
+    def stopped(self) -> bool:
+        return self.patience > 0 and self.bad_epochs >= self.patience
+
+    def state_dict(self) -> Dict:
+        return dict(best=self.best, bad_epochs=self.bad_epochs)
+
+    def load_state_dict(self, state: Dict):
+        self.best = state["best"]
+        self.bad_epochs = state["bad_epochs"]
+
+
 def maybe(cond: bool, func: Callable[[], None], desc: str, verbose=0):
     if cond:
         func()
@@ -0,0 +1,114 @@
+import json
+import string
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+from attacut import corpus, logger, preprocessing
+
+log = logger.get_logger(__name__)
+
+# tokens that come first in dictionaries, see preprocessing.syllable2ix and character2ix
+SYLLABLE_SPECIAL_TOKENS = [
+    "<PAD>",
+    "<UNK>",
+    "<SPACE>",
+    "<PUNC>",
+    "<URL>",
+    "<ENGLISH>",
+    "<NUMBER>",
+]
+
+CHARACTER_SPECIAL_TOKENS = [
+    "<PAD>",
+    "<UNK>",
+    "<PUNC>",
+]
+
+
+def count_tokens(samples: Iterable[List[str]]) -> Tuple[Counter, Counter]:
+    """
+    Count syllables (normalized by :meth:`preprocessing.syllable2token`) and characters
+    :param samples: syllables of every line
+    """
+    syllables, characters = Counter(), Counter()
+
+    for sys in samples:
+        syllables.update(map(preprocessing.syllable2token, sys))
+        for sy in sys:
+            characters.update(sy)
+
+    # punctuation marks share a single character token
+    for p in string.punctuation:
+        if p in characters:
+            characters["<PUNC>"] += characters.pop(p)
+
+    return syllables, characters
+
+
+def count_lines(lines: List[str], raw: bool = False) -> Tuple[Counter, Counter]:
+    # `raw` lines are |-segmented text, otherwise the training format
+    if raw:
+        samples = (corpus.raw_to_syllable_and_label(l)[0] for l in lines if l.strip())
+    else:
+        samples = (corpus.parse_training_line(l)[0] for l in lines if l.strip())
+
+    return count_tokens(samples)
+
+
+def count_binary(path: str, start: int, end: int) -> Tuple[Counter, Counter]:
+    data = corpus.BinaryCorpus(path)
+    return count_tokens(data[i][0] for i in range(start, end))
+
+
+def build(counts: Counter, special_tokens: List[str], min_freq: int = 1, top_k: int = 0) -> Dict[str, int]:
+    """
+    Map tokens to indices: special tokens first, then tokens occurring at least
+    ``min_freq`` times by decreasing frequency, at most ``top_k`` of them (0: all)
+    """
+    tokens = sorted(
+        (t for t, c in counts.items() if c >= min_freq and t not in special_tokens),
+        key=lambda t: (-counts[t], t)
+    )
+
+    if top_k:
+        tokens = tokens[:top_k]
+
+    log.info("kept %d of %d tokens" % (len(tokens), len(counts)))
+
+    return dict((t, i) for i, t in enumerate(special_tokens + tokens))
+
+
+def save_dict(dd: Dict[str, int], path: str):
+    # the format of utils.load_dict
+    with open(path, "w", encoding="utf-8") as fh:
+        json.dump(dd, fh, indent=4, ensure_ascii=False)
+
+
+def save_binary(dd: Dict[str, int], counts: Counter, path: str):
+    """
+    Compact variant of a dictionary: tokens in index order as one utf-8 blob
+    with offsets, and their counts (e.g. for applying a different cutoff).
+    """
+    tokens = sorted(dd.keys(), key=dd.get)
+    assert [dd[t] for t in tokens] == list(range(len(tokens))), "indices should be 0..n-1"
+
+    encoded = [t.encode("utf-8") for t in tokens]
+
+    np.savez(
+        path,
+        blob=np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        offsets=np.concatenate(([0], np.cumsum(list(map(len, encoded))))).astype(np.int64),
+        counts=np.array([counts.get(t, 0) for t in tokens], dtype=np.int64),
+    )
+
+
+def load_binary(path: str) -> Tuple[Dict[str, int], Dict[str, int]]:
+    # dictionary and counts saved by save_binary
+    with np.load(path) as data:
+        blob, offsets, counts = data["blob"].tobytes(), data["offsets"], data["counts"]
+
+    tokens = [blob[a:b].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:])]
+
+    return dict((t, i) for i, t in enumerate(tokens)), dict(zip(tokens, counts.tolist()))
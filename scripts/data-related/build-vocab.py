@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""build-vocab.py
+
+Build syllables.json and characters.json from (sharded) corpora: chunks of
+lines are counted by a pool of workers and the counts are merged.
+
+Usage:
+  build-vocab.py <src>... --dest=<dest> [--raw] [--min-freq=<min-freq>] [--top-k=<top-k>] [--char-min-freq=<char-min-freq>] [--num-workers=<num-workers>] [--chunk-size=<chunk-size>]
+
+Arguments:
+  <src>                             Files in the training format, binary corpora (<name>.bin) or, with --raw, |-segmented files
+
+Options:
+  -h --help                         Show this screen.
+  --dest=<dest>                     Dictionary directory, e.g. ./data/best-syllable-big/dictionary
+  --raw                             <src> are |-segmented text
+  --min-freq=<min-freq>             Minimum count of a syllable [default: 1]
+  --top-k=<top-k>                   Keep only the K most frequent syllables, 0 for all [default: 0]
+  --char-min-freq=<char-min-freq>   Minimum count of a character [default: 1]
+  --num-workers=<num-workers>       Number of processes, 0 for all cores [default: 0]
+  --chunk-size=<chunk-size>         Lines per task of a worker [default: 10000]
+"""
+
+import itertools
+import os
+import sys
+import time
+from collections import Counter
+from functools import partial
+from multiprocessing import Pool
+
+sys.path.insert(0, os.getcwd())
+
+from docopt import docopt
+
+from attacut import corpus, vocab
+
+
+def tasks(paths, chunk_size):
+    for path in paths:
+        if os.path.isdir(path):
+            total = len(corpus.BinaryCorpus(path))
+            for st in range(0, total, chunk_size):
+                yield (path, st, min(st + chunk_size, total))
+            continue
+
+        with open(path, "r", encoding="utf-8") as fh:
+            while True:
+                lines = list(itertools.islice(fh, chunk_size))
+                if not lines:
+                    break
+                yield lines
+
+
+def count(task, raw=False):
+    if isinstance(task, tuple):
+        return vocab.count_binary(*task)
+    return vocab.count_lines(task, raw=raw)
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+
+    dest = arguments["--dest"]
+    chunk_size = int(arguments["--chunk-size"])
+    num_workers = int(arguments["--num-workers"]) or os.cpu_count()
+
+    syllables, characters = Counter(), Counter()
+
+    st_time = time.time()
+    with Pool(num_workers) as pool:
+        counted = pool.imap_unordered(
+            partial(count, raw=arguments["--raw"]),
+            tasks(arguments["<src>"], chunk_size)
+        )
+
+        # reduce
+        for i, (sy, ch) in enumerate(counted):
+            syllables.update(sy)
+            characters.update(ch)
+
+            if (i+1) % 100 == 0:
+                print("counted %d chunks (%.0f lines/s)" % (i+1, (i+1) * chunk_size / (time.time() - st_time)))
+
+    print("%d distinct syllables and %d characters" % (len(syllables), len(characters)))
+
+    os.makedirs(dest, exist_ok=True)
+
+    for name, counts, special_tokens, min_freq, top_k in [
+        ("syllables", syllables, vocab.SYLLABLE_SPECIAL_TOKENS,
+            int(arguments["--min-freq"]), int(arguments["--top-k"])),
+        ("characters", characters, vocab.CHARACTER_SPECIAL_TOKENS,
+            int(arguments["--char-min-freq"]), 0),
+    ]:
+        dd = vocab.build(counts, special_tokens, min_freq=min_freq, top_k=top_k)
+
+        vocab.save_dict(dd, f"{dest}/{name}.json")
+        vocab.save_binary(dd, counts, f"{dest}/{name}.npz")
+
+        print(f"saved {len(dd)} {name} to {dest}/{name}.json and {name}.npz")
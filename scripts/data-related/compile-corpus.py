@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+
+"""compile-corpus.py
+
+Convert |-segmented text to the training format (syllables~...:--:labels).
+Lines are processed by a pool of workers and written in shards of --shard-size
+input lines; shards that already exist are skipped, so an interrupted run
+continues where it stopped.
+
+Usage:
+  compile-corpus.py <src>... --dest=<dest> [--binary] [--preprocess] [--num-workers=<num-workers>] [--shard-size=<shard-size>] [--chunk-size=<chunk-size>]
+
+Arguments:
+  <src>                         Segmented text file(s), one line per sample
+
+Options:
+  -h --help                     Show this screen.
+  --dest=<dest>                 Output without extension, e.g. ./data/best-syllable-big/training
+  --binary                      Write memory-mapped shards to <dest>.bin instead of <dest>.txt
+  --preprocess                  Apply preprocessing.DEFAULT_PREPROCESSING_STEPS (e.g. removing tags) to lines first
+  --num-workers=<num-workers>   Number of processes, 0 for all cores [default: 0]
+  --shard-size=<shard-size>     Input lines per shard [default: 100000]
+  --chunk-size=<chunk-size>     Input lines per task of a worker [default: 1000]
+"""
+
+import glob
+import itertools
+import os
+import shutil
+import sys
+import time
+from functools import partial
+from multiprocessing import Pool
+
+sys.path.insert(0, os.getcwd())
+
+from docopt import docopt
+
+from attacut import corpus, preprocessing
+
+
+def read_lines(paths):
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as fh:
+            for line in fh:
+                yield line
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+
+    dest = arguments["--dest"]
+    binary = arguments["--binary"]
+    shard_size = int(arguments["--shard-size"])
+    chunk_size = int(arguments["--chunk-size"])
+    num_workers = int(arguments["--num-workers"]) or os.cpu_count()
+
+    steps = tuple(preprocessing.DEFAULT_PREPROCESSING_STEPS) if arguments["--preprocess"] else ()
+    convert = partial(corpus.convert_lines, steps=steps)
+
+    shard_dir = "%s.bin" % dest if binary else "%s.shards" % dest
+
+    if not binary and os.path.exists("%s.txt" % dest) and not os.path.exists(shard_dir):
+        print("%s.txt already exists" % dest)
+        sys.exit(0)
+
+    os.makedirs(shard_dir, exist_ok=True)
+
+    lines = read_lines(arguments["<src>"])
+    total_lines, st_time = 0, time.time()
+
+    with Pool(num_workers) as pool:
+        for shard in itertools.count():
+            shard_lines = list(itertools.islice(lines, shard_size))
+            if not shard_lines:
+                break
+
+            prefix = "%s/%05d" % (shard_dir, shard)
+            if (binary and corpus.is_binary_shard_complete(prefix)) \
+                or (not binary and os.path.exists("%s.txt" % prefix)):
+                print("shard %d: done in a previous run" % shard)
+                continue
+
+            chunks = [shard_lines[i:i+chunk_size] for i in range(0, len(shard_lines), chunk_size)]
+            samples = itertools.chain.from_iterable(pool.imap(convert, chunks))
+
+            if binary:
+                corpus.write_binary_shard(prefix, samples)
+            else:
+                corpus.write_text_shard("%s.txt" % prefix, samples)
+
+            total_lines += len(shard_lines)
+            print("shard %d: %d lines (%.0f lines/s)" % (
+                shard, len(shard_lines), total_lines / (time.time() - st_time)
+            ))
+
+    if not binary:
+        # merge shards into the file that SequenceDataset loads
+        tmp = "%s.txt.tmp" % dest
+        with open(tmp, "w", encoding="utf-8") as fo:
+            for path in sorted(glob.glob("%s/*.txt" % shard_dir)):
+                with open(path, "r", encoding="utf-8") as fh:
+                    shutil.copyfileobj(fh, fo)
+
+        os.replace(tmp, "%s.txt" % dest)
+        shutil.rmtree(shard_dir)
+
+    print("saved to %s" % ("%s.bin" % dest if binary else "%s.txt" % dest))
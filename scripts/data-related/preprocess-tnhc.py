@@ -1,9 +1,33 @@
+#!/usr/bin/env python
+
+"""preprocess-tnhc.py
+
+Clean the TNHC corpus (./data/tnhc-raw/*.json) into ./data/tnhc-processed/*.label,
+one file per worker task, and combine them into ./data/tnhc-final.
+
+Usage:
+  preprocess-tnhc.py [--num-workers=<num-workers>]
+
+Options:
+  -h --help                     Show this screen.
+  --num-workers=<num-workers>   Number of processes, 0 for all cores [default: 0]
+"""
+
 import glob
 import json
-
+import os
 import re
+import shutil
+import sys
+import time
+from collections import Counter
+from multiprocessing import Pool
 
-import os
+sys.path.insert(0, os.getcwd())
+
+from docopt import docopt
+
+from attacut.cleaning import Cleaner, Rule
 
 # tag ref: https://drive.google.com/file/d/1bLOIOEMDNLPyWBOvwEEWCogUTWt_EPTN/view
 
@@ -11,24 +35,48 @@ bad_files = [
     "จดหมายเหตุรายวันของสมเด็จเจ้าฟ้ามหาวชิรุณหิศ"
 ]
 
-files = glob.glob("./data/tnhc-raw/*.json")
+RULES = [
+    Rule("space_tag", "<s>", " "),
+    Rule("tab", "\t", " "),
+    Rule("paragraph_tag", "<p>"),
+    Rule("ss_tag", "ss"),
+    Rule("sz_tag", "sz"),
+    Rule("slash", "/"),
+    Rule("backslash", "\\"),
+    Rule("lgp_tag", "lgp"),
+    Rule("cmn_tag", "cmn"),
+    Rule("byte_order_mark", "\ufeff"),
+    # this specifies type of poem
+    Rule("poem_type", "cc(.+?)cc", regex=True),
+    # this also something similar
+    Rule("cm_tag", "cm(.+?)cm", regex=True),
+]
+
+TRIM_RULES = [
+    Rule("leading_pipes", r"^[\| ]+", regex=True),
+    Rule("trailing_pipes", r"[ \|]+$", regex=True),
+    Rule("repeated_pipes", r"\|+", "|", regex=True),
+]
+
+TITLE_DATE_RX = re.compile(r"b ?\d+")
+DOTS_RX = re.compile(r"\.{5,}")
 
-os.makedirs("./data/tnhc-processed", exist_ok=True)
 
-for f in files:
-    filename = os.path.basename(f).replace(".json", "")
+def clean_file(path):
+    st_time = time.time()
 
-    if filename in bad_files:
-        print(f"skipping {filename}")
-        continue
+    filename = os.path.basename(path).replace(".json", "")
+    dest = f"./data/tnhc-processed/{filename}.label"
 
-    txt = f"./data/tnhc-processed/{filename}.txt"
-    label = f"./data/tnhc-processed/{filename}.label"
+    cleaner, trimmer = Cleaner(RULES), Cleaner(TRIM_RULES)
+    hits = Counter()
+    total_lines, total_chars = 0, 0
+
+    with open(path, "r", encoding="utf-8") as fh, \
+         open(dest, "w", encoding="utf-8") as fl:
 
-    with open(f, "r", encoding="utf-8") as fh, \
-         open(label, "w", encoding="utf-8") as fl:
-        
         for line in json.load(fh):
+            total_lines += 1
 
             line = list(filter(lambda x: x and len(x) > 0, line))
 
@@ -36,53 +84,73 @@ for f in files:
                 continue
 
             if ":" in line: # assume this is a meta tag line
+                hits["skip:meta_tag"] += 1
                 continue
 
-            line = "|".join(line).strip()
-
-            # for token in line:
-            line = line.strip().lower()
-            line = line.replace("<s>", " ")
-            line = line.replace("\t", " ")
-            line = line.replace("<p>", "")
-            line = line.replace("ss", "")
-            line = line.replace("sz", "")
-            line = line.replace("/", "")
-            line = line.replace("\\", "")
-            line = line.replace("lgp", "")
-            line = line.replace("cmn", "")
-            line = line.replace("\ufeff", "") # byte-order mark
-            
-
-            line = re.sub("cc(.+?)cc", "", line) # this specifies type of poem
-            line = re.sub("cm(.+?)cm", "", line) # this also something similar
+            line = cleaner("|".join(line).strip().lower())
 
             # some file has its title embedded in the content, usually in the same name.
             if line.replace("|", "") == filename:
-                print(f"skip filename: {filename}")
+                hits["skip:title"] += 1
                 continue
 
             txt = line.replace("|", "")
-            if len(txt) <= 1 or re.match("b ?\d+", txt) or re.match("\.{5,}", txt):
-                print(f"skip short line or title date line, e.g. b2012: {line}")
+            if len(txt) <= 1 or TITLE_DATE_RX.match(txt) or DOTS_RX.match(txt):
+                # short line or title date line, e.g. b2012
+                hits["skip:short_line"] += 1
                 continue
-        
+
             if len(line) > 0:
-                line = re.sub("^[\| ]+", "", line.strip())
-                line = re.sub("[ \|]+$", "", line)
-                line = re.sub("\|+", "|", line)
+                line = trimmer(line.strip())
+                total_chars += len(line)
                 fl.write(f"{line}\n")
 
+    hits.update(cleaner.hits)
+    hits.update(trimmer.hits)
 
-print("combine file")
-os.makedirs("./data/tnhc-final", exist_ok=True)
+    return dest, hits, total_lines, total_chars, time.time() - st_time
 
-with open("./data/tnhc-final/tnhc.label", "w") as fl, open("./data/tnhc-final/input.txt", "w") as fi:
-    for f in glob.glob("./data/tnhc-processed/*.label"):
-        with open(f, "r") as fh:
-            for line in fh:
-                line = line.strip()
-                fl.write(f"{line}\n")
 
-                txt = line.replace("|", "")
-                fi.write(f"{txt}\n")
\ No newline at end of file
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+
+    num_workers = int(arguments["--num-workers"]) or os.cpu_count()
+
+    files = []
+    for f in glob.glob("./data/tnhc-raw/*.json"):
+        if os.path.basename(f).replace(".json", "") in bad_files:
+            print(f"skipping {f}")
+        else:
+            files.append(f)
+
+    os.makedirs("./data/tnhc-processed", exist_ok=True)
+    os.makedirs("./data/tnhc-final", exist_ok=True)
+
+    hits, total_lines, total_chars = Counter(), 0, 0
+    st_time = time.time()
+
+    with Pool(num_workers) as pool, \
+        open("./data/tnhc-final/tnhc.label", "w", encoding="utf-8") as fl, \
+        open("./data/tnhc-final/input.txt", "w", encoding="utf-8") as fi:
+
+        # files are combined as soon as they (and those before them) are done
+        for dest, file_hits, lines, chars, took in pool.imap(clean_file, files):
+            print(f"{dest}: {lines} lines in {took:.2f}s ({lines / max(took, 1e-9):.0f} lines/s)")
+
+            hits.update(file_hits)
+            total_lines += lines
+            total_chars += chars
+
+            with open(dest, "r", encoding="utf-8") as fh:
+                shutil.copyfileobj(fh, fl)
+
+            with open(dest, "r", encoding="utf-8") as fh:
+                for line in fh:
+                    fi.write(line.replace("|", ""))
+
+    took = time.time() - st_time
+    print(f"{len(files)} files, {total_lines} lines in {took:.2f}s "
+        f"({total_lines / took:.0f} lines/s, {total_chars / took:.0f} chars/s)")
+
+    for name, count in sorted(hits.items(), key=lambda x: -x[1]):
+        print(f"{name}: {count}")
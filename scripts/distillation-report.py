@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""distillation-report.py
+
+Throughput-versus-F1 table for (student) models evaluated with ./scripts/eval.py
+
+Usage:
+  distillation-report.py --model-group=<model-group> --data=<dataset>
+
+Options:
+  -h --help         Show this screen.
+"""
+
+from docopt import docopt
+import json
+import os
+
+from glob import glob
+import pandas as pd
+import yaml
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+
+    model_group = arguments["--model-group"]
+    slug = arguments["--data"].split("/")[-1]
+
+    with open(arguments["--data"] + "/input.txt", "r", encoding="utf-8") as fh:
+        total_chars = sum(len(line.rstrip("\n")) for line in fh)
+
+    data = []
+
+    for path in glob(model_group):
+        stat_file = f"{path}/{slug}.json"
+        if not os.path.exists(stat_file):
+            print(f"skipping {path}: no {slug}.json, please run ./scripts/eval.py first")
+            continue
+
+        with open(f"{path}/params.yml") as fh:
+            dd = yaml.full_load(fh)
+
+        with open(stat_file) as fh:
+            st = json.load(fh)
+
+        teacher = ""
+        if os.path.exists(f"{path}/distillation.yml"):
+            with open(f"{path}/distillation.yml") as fh:
+                teacher = yaml.full_load(fh)["teacher"]
+
+        data.append(dict(
+            model_path=path,
+            name=dd["name"],
+            params=dd["params"],
+            num_trainable_params=dd["num_trainable_params"],
+            teacher=teacher,
+            char_f1=st["char_level:f1"],
+            word_f1=st["word_level:f1"],
+            time_took=st["time_took"],
+            chars_per_sec=total_chars / st["time_took"],
+        ))
+
+    df = pd.DataFrame(data).sort_values("chars_per_sec", ascending=False)
+
+    print(df[["model_path", "teacher", "word_f1", "chars_per_sec"]].to_string(index=False))
+
+    dest = "/".join(model_group.split("/")[:-1]) + f"/distillation-{slug}.csv"
+    print(f"saving file to {dest}")
+    df.to_csv(dest, index=False)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+"""distributed-scaling.py
+
+Train the same configuration with increasing numbers of local workers
+(./scripts/train.py --distributed) and report throughput and scaling efficiency.
+
+Usage:
+  distributed-scaling.py --model-name=<model-name> --model-params=<model-params> --data-dir=<data-dir> [--workers=<workers>] [--threads=<threads>] [--epoch=<epoch>] [--batch-size=<batch-size>] [--dest=<dest>]
+
+Options:
+  -h --help                     Show this screen.
+  --workers=<workers>           Comma-separated numbers of worker processes [default: 1,2,4]
+  --threads=<threads>           Torch threads per worker [default: 1]
+  --epoch=<epoch>               Number of epochs of each run [default: 1]
+  --batch-size=<batch-size>     Batch size per worker [default: 64]
+  --dest=<dest>                 Where to write the results as JSON
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+from docopt import docopt
+
+METRIC = "training:samples_per_sec"
+
+
+def samples_per_sec(stdout):
+    values = []
+    for line in stdout.splitlines():
+        if line.startswith("{") and METRIC in line:
+            values.append(json.loads(line)["value"])
+
+    # the first epoch also pays for warming up
+    return float(np.mean(values[1:] if len(values) > 1 else values))
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+
+    workers = [int(w) for w in arguments["--workers"].split(",")]
+
+    env = dict(os.environ, OMP_NUM_THREADS=arguments["--threads"])
+
+    results = []
+    for n in workers:
+        with tempfile.TemporaryDirectory() as output_dir:
+            cmd = [
+                sys.executable, "-m", "torch.distributed.run",
+                "--standalone", "--nproc_per_node", str(n),
+                "./scripts/train.py",
+                "--model-name", arguments["--model-name"],
+                "--model-params", arguments["--model-params"],
+                "--data-dir", arguments["--data-dir"],
+                "--output-dir", output_dir,
+                "--epoch", arguments["--epoch"],
+                "--batch-size", arguments["--batch-size"],
+                "--no-workers", "0",
+                "--distributed", "True",
+            ]
+
+            print("running: %s" % " ".join(cmd))
+            out = subprocess.run(cmd, env=env, check=True, stdout=subprocess.PIPE, universal_newlines=True)
+
+        results.append(dict(workers=n, samples_per_sec=samples_per_sec(out.stdout)))
+
+    base = results[0]
+    for r in results:
+        r["speedup"] = r["samples_per_sec"] / base["samples_per_sec"]
+        r["efficiency"] = r["speedup"] * base["workers"] / r["workers"]
+
+        print("workers={workers}: {samples_per_sec:.1f} samples/s, "
+            "speedup={speedup:.2f}x, efficiency={efficiency:.2f}".format(**r))
+
+    if arguments["--dest"]:
+        with open(arguments["--dest"], "w") as fh:
+            json.dump(results, fh, indent=2)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+"""eval-many.py
+
+Evaluate several models on several datasets. Inputs are featurized once for
+every group of models sharing a dataset class and dictionaries.
+
+Usage:
+  eval-many.py --data=<dataset>... [--models=<models>] [--batch-size=<batch-size>] [--gpu] [--dump]
+
+Options:
+  -h --help                   Show this screen.
+  --models=<models>           Glob of model directories [default: ./best-models/*]
+  --batch-size=<batch-size>   Batch size [default: 32]
+  --gpu                       Use GPU
+  --dump                      Also write tokenized lines to <model>/<dataset>.txt
+"""
+
+import glob
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.getcwd())
+
+from docopt import docopt
+
+from attacut import Tokenizer, __version__, benchmark, command
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__, version=f"AttaCut: version {__version__}")
+
+    batch_size = int(arguments["--batch-size"])
+    device = "cuda" if arguments["--gpu"] else "cpu"
+
+    # group models that would compute the same features
+    groups = defaultdict(list)
+    for path in sorted(glob.glob(arguments["--models"])):
+        tokenizer = Tokenizer(path)
+        key = (type(tokenizer.dataset).__name__, tokenizer.dataset.dictionary_hash())
+        groups[key].append((path, tokenizer))
+
+    for (dataset_cls, dict_hash), members in groups.items():
+        print(f"{dataset_cls} ({dict_hash[:8]}): {', '.join(p for p, _ in members)}")
+
+    for data in arguments["--data"]:
+        data = data.rstrip("/")
+        slug = data.split("/")[-1]
+        src_file = f"{data}/input.txt"
+
+        with open(f"{data}/label.txt", "r", encoding="utf-8") as fh:
+            evaluator = benchmark.CorpusEvaluator(list(fh))
+
+        for (dataset_cls, _), members in groups.items():
+            st = time.time()
+            features = command.featurize(members[0][1], src_file)
+            featurize_took = time.time() - st
+
+            print(f"{slug}: featurized with {dataset_cls} in {featurize_took:.2f}s")
+
+            for path, tokenizer in members:
+                evaluator.reset()
+
+                st = time.time()
+                command.score(
+                    tokenizer,
+                    src_file,
+                    evaluator,
+                    batch_size,
+                    device,
+                    dest=f"{path}/{slug}.txt" if arguments["--dump"] else None,
+                    data=features
+                )
+
+                statistics = benchmark.summarize(evaluator.stats())
+
+                # comparable with eval.py, which featurizes for every model
+                statistics["time_took"] = featurize_took + time.time() - st
+                statistics["featurize_took"] = featurize_took
+                statistics["model_path"] = path
+
+                print(f"{path} {slug}: word_level:f1={statistics['word_level:f1']:.4f}")
+
+                with open(f"{path}/{slug}.json", "w") as fh:
+                    json.dump(statistics, fh)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+"""hyperopt-pareto.py
+
+Pareto front of (F1, inference throughput) over hyperopt trials of all configs.
+
+Usage:
+  hyperopt-pareto.py [--stats=<stats>] [--f1=<column>] [--benchmark] [--threads=<threads>] [--dest=<dest>]
+
+Options:
+  -h --help             Show this screen.
+  --stats=<stats>       Glob of trial results (see hyperopt.py) [default: ./stats/*.csv]
+  --f1=<column>         F1 column, e.g. best-val:word_level:f1 [default: hyperopt:val_f1]
+  --benchmark           Measure throughput of trials without it, if their model is available
+  --threads=<threads>   Torch threads for --benchmark [default: 1]
+  --dest=<dest>         Where to write the front [default: ./stats/pareto-front.csv]
+"""
+
+import glob
+import os
+import sys
+
+sys.path.insert(0, os.getcwd())
+
+import pandas as pd
+import torch
+from docopt import docopt
+
+from attacut import Tokenizer, hyperopt, perf
+
+THROUGHPUT = "hyperopt:chars_per_sec_per_core"
+MODEL_PATHS = ["hyperopt:model_path", "best-val:model_path"]
+
+
+def benchmark(model_path, threads):
+    torch.set_num_threads(threads)
+
+    stats = perf.measure(Tokenizer(model_path), perf.synthetic_lines(128), batch_size=32, repeat=3)
+
+    return stats["chars_per_sec"] / threads
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+
+    f1, threads = arguments["--f1"], int(arguments["--threads"])
+
+    df = []
+    for path in sorted(glob.glob(arguments["--stats"])):
+        if os.path.abspath(path) == os.path.abspath(arguments["--dest"]):
+            continue
+
+        stats = pd.read_csv(path)
+        stats["config"] = os.path.basename(path)
+
+        df.append(stats)
+
+    df = pd.concat(df, ignore_index=True, sort=False)
+
+    if THROUGHPUT not in df:
+        df[THROUGHPUT] = float("nan")
+
+    if arguments["--benchmark"]:
+        model_paths = df[[c for c in MODEL_PATHS if c in df]].bfill(axis=1).iloc[:, 0]
+
+        for i in df.index[df[THROUGHPUT].isna()]:
+            if isinstance(model_paths[i], str) and os.path.exists(model_paths[i]):
+                print(f"benchmarking {model_paths[i]}")
+                df.loc[i, THROUGHPUT] = benchmark(model_paths[i], threads)
+
+    df = df.dropna(subset=[f1, THROUGHPUT]).reset_index(drop=True)
+
+    front = df.loc[hyperopt.pareto_front(list(zip(df[f1], df[THROUGHPUT])))]
+
+    for _, r in front.iterrows():
+        print(f"{r['config']} {r['name']} {r['params']}: f1={r[f1]:.4f} "
+            f"{r[THROUGHPUT]:.0f} chars/s/core")
+
+    front.to_csv(arguments["--dest"], index=False)
+    print(f"saved {len(front)} of {len(df)} trials to {arguments['--dest']}")
@@ -1,15 +1,25 @@
-"""Usage: hyperopt --config=<config> [--dry-run] --N=<N> [--max-epoch=<max-epoch>]
+"""Usage: hyperopt --config=<config> [--dry-run] --N=<N> [--max-epoch=<max-epoch>] [--local] [--workers=<workers>] [--threads=<threads>] [--min-epoch=<min-epoch>] [--eta=<eta>] [--dataset=<dataset>] [--cost-bias=<bias>]
 
 Options:
   -h --help     Show this screen.
   --version     Show version.
   --max-epoch=<max-epoch>   Maximum number of epoch [default: 20].
+  --local                   Run trials on this machine with successive halving instead of submitting SLURM jobs
+  --workers=<workers>       Number of concurrent trials (--local), 0 for cores / threads [default: 0]
+  --threads=<threads>       Torch threads per trial (--local) [default: 1]
+  --min-epoch=<min-epoch>   Epochs of the first successive-halving rung (--local) [default: 1]
+  --eta=<eta>               Only the top 1/eta of a rung is promoted to the next one (--local) [default: 3]
+  --dataset=<dataset>       Training data [default: ./data/best-syllable-big]
+  --cost-bias=<bias>        Prefer configs with fewer FLOPs, sampling with probability ~ FLOPs^-bias [default: 0]
 """
 
 from docopt import docopt
 
 import numpy as np
 import os
+import shlex
+import subprocess
+import sys
 
 from sklearn.model_selection import ParameterSampler
 from scipy.stats import distributions as dist
@@ -18,7 +28,20 @@ import time
 
 from datetime import datetime
 
-DATASET = "./data/best-syllable-big"
+import pandas as pd
+
+sys.path.insert(0, os.getcwd())
+
+from attacut import hyperopt
+
+# fixed CPU workload for comparing the inference speed of trials
+PERF_TEMPLATE = """
+./scripts/perf-suite.py --models={output_dir} --lengths=128 --batch-sizes=32 \
+    --threads={threads} --repeat=3 --dest={output_dir}/{perf_file}
+"""
+
+# candidates per trial from which --cost-bias picks
+COST_CANDIDATES = 5
 
 
 def merge_arch_params(p):
@@ -35,6 +58,105 @@ def merge_arch_params(p):
 
     return dict(**p, arch="|".join(arch_params))
 
+
+def run_local(param_list, cmd_template, arguments, config_name, n_iters, flops=None):
+    threads = int(arguments["--threads"])
+    workers = int(arguments["--workers"]) or max(1, os.cpu_count() // threads)
+
+    scheduler = hyperopt.SuccessiveHalving(
+        len(param_list),
+        min_epoch=int(arguments["--min-epoch"]),
+        max_epoch=int(arguments["--max-epoch"]),
+        eta=int(arguments["--eta"])
+    )
+    print("rungs (epochs): %s, %d workers x %d threads" % (scheduler.epochs, workers, threads))
+
+    env = dict(os.environ, OMP_NUM_THREADS=str(threads), MKL_NUM_THREADS=str(threads))
+    output_dirs = [f"./artifacts/{config_name}.{n_iters}/run-{i}" for i in range(len(param_list))]
+    stats_path = f"./stats/{config_name}.{n_iters}.csv"
+
+    # validation and throughput of every trial's latest rung
+    extras = [dict(flops=f) for f in flops] if flops else [dict() for _ in param_list]
+
+    os.makedirs("./logs", exist_ok=True)
+    os.makedirs("./stats", exist_ok=True)
+
+    def start(job, stage, cmd):
+        log = open(f"./logs/{config_name}.{n_iters}.{job.trial}.log", "a")
+        proc = subprocess.Popen(
+            [sys.executable] + shlex.split(cmd), env=env, stdout=log, stderr=subprocess.STDOUT
+        )
+        running[proc] = (job, stage, log)
+
+    running = dict()
+    while True:
+        while len(running) < workers:
+            job = scheduler.next_job()
+            if job is None:
+                break
+
+            print(f"[trial {job.trial}] rung {job.rung}: training up to epoch {job.epoch}")
+            start(job, "train", cmd_template.format(
+                **param_list[job.trial],
+                max_epoch=job.epoch,
+                output_dir=output_dirs[job.trial],
+                dataset=arguments["--dataset"]
+            ).strip())
+
+        if not running:
+            break
+
+        # a finished (or early-stopped) trial frees its cores for the next job
+        time.sleep(1)
+        for proc in [p for p in running if p.poll() is not None]:
+            job, stage, log = running.pop(proc)
+            log.close()
+
+            output_dir = output_dirs[job.trial]
+
+            if stage == "train" and proc.returncode == 0:
+                # inference speed on the same cores, before the trial's slot is released;
+                # results of the previous rung mustn't be taken for this one's
+                perf_path = f"{output_dir}/{hyperopt.PERF_FILE}"
+                if os.path.exists(perf_path):
+                    os.remove(perf_path)
+
+                start(job, "perf", PERF_TEMPLATE.format(
+                    output_dir=output_dir, threads=threads, perf_file=hyperopt.PERF_FILE
+                ).strip())
+                continue
+
+            # here, either training failed or it succeeded and perf-suite finished;
+            # a failed perf-suite run only leaves the throughput missing
+            trained = stage == "perf"
+
+            validation = hyperopt.read_validation(output_dir) \
+                if trained else dict(loss=np.inf, f1=0.0)
+            scheduler.report(job, validation["loss"])
+
+            extras[job.trial].update(val_f1=validation["f1"])
+            if trained:
+                extras[job.trial].update(hyperopt.read_throughput(output_dir, threads))
+
+            print(f"[trial {job.trial}] rung {job.rung}: %s" % extras[job.trial])
+
+            rows = []
+            for trial in sorted(set().union(*scheduler.results)):
+                params_path = f"{output_dirs[trial]}/params.yml"
+                if os.path.exists(params_path):
+                    with open(params_path) as fh:
+                        params = yaml.full_load(fh)
+                else:
+                    params = param_list[trial]
+                rows.append(hyperopt.trial_row(
+                    trial, scheduler, params, output_dirs[trial], extras[trial]
+                ))
+
+            pd.DataFrame(rows).to_csv(stats_path, index=False)
+
+    print(f"saved trial results to {stats_path}")
+
+
 if __name__ == '__main__':
     arguments = docopt(__doc__, version='Hyperopt')
     print(arguments)
@@ -60,33 +182,57 @@ if __name__ == '__main__':
 
     n_iters = int(arguments["--N"])
 
-    param_list = list(
-        ParameterSampler(param_grid, n_iter=n_iters)
-    )
+    cost_bias = float(arguments["--cost-bias"])
 
-    cmd_template = """
-sbatch --job-name {job_name} --output "./logs/{job_name}.out" jobscript.sh ./scripts/train.py --model-name {model_name} \
+    param_list = list(map(merge_arch_params,
+        ParameterSampler(param_grid, n_iter=n_iters * (COST_CANDIDATES if cost_bias else 1))
+    ))
+
+    flops = None
+    if cost_bias:
+        flops = [
+            hyperopt.config_flops(p["model_name"], p["arch"], f"{arguments['--dataset']}/dictionary")
+            for p in param_list
+        ]
+        ix = hyperopt.cost_biased_sample(flops, n_iters, cost_bias)
+
+        param_list = [param_list[i] for i in ix]
+        flops = [flops[i] for i in ix]
+
+        print("FLOPs of sampled configs: %s" % flops)
+
+    train_template = """
+./scripts/train.py --model-name {model_name} \
     --data-dir {dataset} \
     --epoch {max_epoch} \
     --output-dir="{output_dir}" \
     --lr {lr} \
     --batch-size={batch_size} \
     --model-params="{arch}" \
-    --weight-decay={weight_decay}
+    --weight-decay={weight_decay} \
+    --checkpoint=1 \
+    --resume=True
     """
+    cmd_template = """
+sbatch --job-name {job_name} --output "./logs/{job_name}.out" jobscript.sh """ + train_template.strip()
 
     print("------------------------")
 
+    if arguments["--local"]:
+        # a trial owns --threads cores; DataLoader workers would be processes on top of them
+        local_template = train_template.strip() + " --no-workers=0"
+        run_local(param_list, local_template, arguments, config_name, n_iters, flops)
+        sys.exit(0)
+
     for i, p in enumerate(param_list):
         job_name = f"{config_name}.{n_iters}.{i}.log"
         output_dir = f"./artifacts/{config_name}.{n_iters}/run-{i}"
-        p = merge_arch_params(p)
         cmd = cmd_template.format(
             **p,
             max_epoch=max_epoch,
             output_dir=output_dir,
             job_name=job_name,
-            dataset=DATASET
+            dataset=arguments["--dataset"]
         ).strip()
 
         if arguments["--dry-run"]:
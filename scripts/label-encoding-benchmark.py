@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+
+"""label-encoding-benchmark.py
+
+Time of encoding word-boundary labels with SchemeA/SchemeB against the
+per-word loop they used to be, line by line and for all lines at once
+(output_tags.encode_lines, as datasets do), on a file in the training format,
+and the load time of SyllableCharacterSeqDataset with each scheme.
+
+Usage:
+  label-encoding-benchmark.py --input=<input> [--dict-dir=<dict-dir>] [--max-lines=<max-lines>] [--repeat=<repeat>] [--dest=<dest>]
+
+Options:
+  -h --help                   Show this screen.
+  --input=<input>             File in the training format, e.g. ./data/best-syllable-big/val.txt
+  --dict-dir=<dict-dir>       Dictionary directory, default: dictionary next to <input>
+  --max-lines=<max-lines>     Maximum number of lines used, 0 for all [default: 0]
+  --repeat=<repeat>           Number of passes over the lines [default: 3]
+  --dest=<dest>               Where to write the results as JSON
+"""
+
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.getcwd())
+
+import numpy as np
+from docopt import docopt
+
+from attacut import __version__, corpus, dataloaders, output_tags
+
+
+def encode_per_word(labels, sy_ix, scheme):
+    # the per-word loop of SchemeA/SchemeB.encode before they were vectorized
+    new_labels = []
+    for st, end in output_tags.find_word_boundaries(labels):
+        num_chars = end - st
+        num_syllables = len(set(sy_ix[st:end]))
+
+        if scheme == "SchemeA":
+            ub = min((num_syllables + 1) // 2, 3) * 2 - 1
+        else:
+            ub = min(num_syllables, 4) * 2 - 1
+
+        new_labels.extend([ub] + [ub-1] * (num_chars-1))
+
+    return np.array(new_labels).astype(int)
+
+
+def character_level(syllables, w_bi_labels):
+    # as in SyllableCharacterSeqDataset._process_training_line
+    labels, sy_ix = [], []
+    for syllable, label in zip(syllables, w_bi_labels):
+        _len = max(len(syllable), 1)
+        labels.extend([label] + [0] * (_len - 1))
+        sy_ix.extend([syllable] * _len)
+
+    return np.array(labels).astype(int), sy_ix
+
+
+def timing(func, samples, repeat):
+    st = time.process_time()
+    for _ in range(repeat):
+        for labels, sy_ix in samples:
+            func(labels, sy_ix)
+
+    return time.process_time() - st
+
+
+def timing_all_lines(scheme, samples, repeat):
+    labels, sy_ix = zip(*samples)
+
+    st = time.process_time()
+    for _ in range(repeat):
+        output_tags.encode_lines(scheme, labels, sy_ix)
+
+    return time.process_time() - st
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__, version=f"AttaCut: version {__version__}")
+
+    path = arguments["--input"]
+    dict_dir = arguments["--dict-dir"] or "%s/dictionary" % os.path.dirname(path)
+    max_lines = int(arguments["--max-lines"]) or None
+    repeat = int(arguments["--repeat"])
+
+    with open(path, "r", encoding="utf-8") as fh:
+        lines = list(itertools.islice(fh, max_lines))
+
+    samples = [character_level(*corpus.parse_training_line(l)) for l in lines]
+
+    results = []
+    for name in ["SchemeA", "SchemeB"]:
+        scheme = output_tags.get_scheme(name)
+
+        for labels, sy_ix in samples:
+            np.testing.assert_array_equal(
+                scheme.encode(labels, sy_ix), encode_per_word(labels, sy_ix, name)
+            )
+
+        stats = dict(
+            scheme=name,
+            lines=len(samples),
+            per_word=timing(lambda l, s: encode_per_word(l, s, name), samples, repeat),
+            per_line=timing(scheme.encode, samples, repeat),
+            all_lines=timing_all_lines(scheme, samples, repeat),
+        )
+        stats["speedup"] = stats["per_word"] / stats["all_lines"]
+
+        print("{scheme}: per-word={per_word:.2f}s per-line={per_line:.2f}s all-lines={all_lines:.2f}s "
+            "speedup={speedup:.2f}x ({lines} lines)".format(**stats))
+
+        results.append(stats)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", encoding="utf-8") as fh:
+        fh.write("".join(lines))
+        fh.flush()
+
+        for name in ["BI", "SchemeA", "SchemeB"]:
+            st = time.process_time()
+            dataloaders.SyllableCharacterSeqDataset(
+                dict_dir=dict_dir, path=fh.name, output_scheme=output_tags.get_scheme(name)
+            )
+            took = time.process_time() - st
+
+            print(f"loading with {name}: {took:.2f}s")
+            results.append(dict(scheme=name, lines=len(lines), load=took))
+
+    if arguments["--dest"]:
+        with open(arguments["--dest"], "w") as fh:
+            json.dump(results, fh, indent=2)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""lstm-packing-benchmark.py
+
+CPU time of LSTM models' forward pass with and without packed sequences,
+on batches of real lines (hence a realistic length distribution).
+
+Usage:
+  lstm-packing-benchmark.py --input=<input> [--models=<models>] [--batch-size=<batch-size>] [--max-lines=<max-lines>] [--repeat=<repeat>] [--threads=<threads>] [--dest=<dest>]
+
+Options:
+  -h --help                   Show this screen.
+  --input=<input>             Text file, e.g. ./data/best-val/input.txt
+  --models=<models>           Glob of model directories [default: ./best-models/*]
+  --batch-size=<batch-size>   Batch size [default: 32]
+  --max-lines=<max-lines>     Maximum number of lines used [default: 2000]
+  --repeat=<repeat>           Number of passes over the batches [default: 3]
+  --threads=<threads>         Torch threads [default: 1]
+  --dest=<dest>               Where to write the results as JSON
+"""
+
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.getcwd())
+
+import torch
+from docopt import docopt
+
+from attacut import Tokenizer, __version__, command, perf
+
+
+def timing(model, batches, repeat):
+    with torch.no_grad():
+        st = time.process_time()
+        for _ in range(repeat):
+            for x in batches:
+                model(x)
+
+    return time.process_time() - st
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__, version=f"AttaCut: version {__version__}")
+
+    batch_size = int(arguments["--batch-size"])
+    repeat = int(arguments["--repeat"])
+
+    torch.set_num_threads(int(arguments["--threads"]))
+
+    lines = perf.read_lines(arguments["--input"], int(arguments["--max-lines"]))
+
+    with tempfile.NamedTemporaryFile("w", suffix=".txt") as fh:
+        fh.write("\n".join(lines))
+        fh.flush()
+
+        results = []
+        for path in sorted(glob.glob(arguments["--models"])):
+            tokenizer = Tokenizer(path)
+            model = tokenizer.model
+
+            if not hasattr(model, "packed"):
+                print(f"skipping {path}: not an LSTM model")
+                continue
+
+            features = command.featurize(tokenizer, fh.name)
+
+            batches, real, padded = [], 0, 0
+            for i in range(0, len(features), batch_size):
+                x, _, _ = tokenizer.dataset.collate_fn([f for f, _ in features[i:i+batch_size]])
+                batches.append(x)
+
+                real += int(x[1].sum())
+                padded += int(x[1].shape[0] * x[1].max())
+
+            stats = dict(model=path, batch_size=batch_size, real_over_padded=real / padded)
+            for packed in [False, True]:
+                model.packed = packed
+                stats["packed" if packed else "padded"] = timing(model, batches, repeat)
+
+            stats["speedup"] = stats["padded"] / stats["packed"]
+
+            print("{model}: padded={padded:.2f}s packed={packed:.2f}s "
+                "speedup={speedup:.2f}x (real/padded positions: {real_over_padded:.2f})".format(**stats))
+
+            results.append(stats)
+
+    if arguments["--dest"]:
+        with open(arguments["--dest"], "w") as fh:
+            json.dump(results, fh, indent=2)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+"""perf-suite.py
+
+Throughput and latency benchmark across models, input lengths, batch sizes and threads.
+
+Usage:
+  perf-suite.py [--models=<models>] [--lengths=<lengths>] [--real=<file>...] [--max-lines=<max-lines>] [--batch-sizes=<batch-sizes>] [--threads=<threads>] [--repeat=<repeat>] [--dest=<dest>] [--baseline=<baseline>] [--tolerance=<tolerance>]
+
+Options:
+  -h --help                     Show this screen.
+  --models=<models>             Comma-separated model names or globs [default: attacut-c,attacut-sc,./best-models/*]
+  --lengths=<lengths>           Comma-separated lengths of synthetic lines [default: 32,128,512]
+  --real=<file>                 Text file(s) whose lines are used as a real workload
+  --max-lines=<max-lines>       Maximum number of lines taken from each real workload [default: 2000]
+  --batch-sizes=<batch-sizes>   Comma-separated batch sizes [default: 1,8,32]
+  --threads=<threads>           Comma-separated torch thread counts [default: 1,2,4]
+  --repeat=<repeat>             Number of passes over each workload [default: 1]
+  --dest=<dest>                 Where to write the results [default: ./perf-results.json]
+  --baseline=<baseline>         Results of a previous run; regressions make the script exit with 1
+                                (as do models failing to load or run, with or without a baseline)
+  --tolerance=<tolerance>       Allowed relative regression [default: 0.1]
+"""
+
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+sys.path.insert(0, os.getcwd())
+
+from docopt import docopt
+
+from attacut import __version__, perf
+
+
+def _int_list(s):
+    return [int(v) for v in s.split(",")]
+
+
+def _resolve_models(spec):
+    models = []
+    for m in spec.split(","):
+        if m in ["attacut-c", "attacut-sc"]:
+            models.append(m)
+        else:
+            models.extend(sorted(glob.glob(m)))
+    return models
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__, version=f"AttaCut: version {__version__}")
+
+    workloads = dict()
+    for length in _int_list(arguments["--lengths"]):
+        workloads[f"synthetic-{length}"] = perf.synthetic_lines(length)
+
+    for path in arguments["--real"]:
+        workloads[f"real-{os.path.basename(path)}"] = perf.read_lines(
+            path, int(arguments["--max-lines"])
+        )
+
+    results, failures = [], []
+    for model in _resolve_models(arguments["--models"]):
+        print(f"benchmarking {model}")
+
+        # one fresh process per model: isolated peak RSS and load time
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as ex:
+            try:
+                results.extend(ex.submit(
+                    perf.run_model_suite,
+                    model,
+                    workloads,
+                    _int_list(arguments["--batch-sizes"]),
+                    _int_list(arguments["--threads"]),
+                    int(arguments["--repeat"]),
+                ).result())
+            except Exception as e:
+                print(f"failed {model}: {e}")
+                failures.append(f"{model}: failed: {e}")
+
+    for r in results:
+        print("{model} {workload} bs={batch_size} threads={threads}: "
+            "{chars_per_sec:.0f} chars/s p50={p50_ms:.2f}ms p99={p99_ms:.2f}ms "
+            "rss={peak_rss_mb:.0f}MB load={load_time:.2f}s".format(**r))
+
+    with open(arguments["--dest"], "w") as fh:
+        json.dump(results, fh, indent=2)
+
+    print(f"saved results to {arguments['--dest']}")
+
+    # a model that doesn't run at all is the worst regression
+    regressions = list(failures)
+
+    if arguments["--baseline"]:
+        with open(arguments["--baseline"], "r") as fh:
+            baseline = json.load(fh)
+
+        regressions.extend(perf.compare(results, baseline, float(arguments["--tolerance"])))
+
+    for r in regressions:
+        print(f"[regression] {r}")
+
+    if regressions:
+        sys.exit(1)
+
+    if arguments["--baseline"]:
+        print("no regressions against %s" % arguments["--baseline"])
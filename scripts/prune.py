@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+"""prune.py
+
+Structured filter pruning for models built on IteratedDilatedConvolutions.
+
+Usage:
+  prune.py --ratio=<ratio> --output-dir=<output-dir> [--models=<models>] [--data=<dataset>] [--fine-tune=<data-dir>] [--epoch=<epoch>] [--length=<length>]
+
+Options:
+  -h --help                 Show this screen.
+  --ratio=<ratio>           Fraction of conv filters to keep, e.g. 0.5
+  --models=<models>         Glob of model directories [default: ./best-models/*]
+  --data=<dataset>          Dataset (with input.txt and label.txt) for computing F1
+  --fine-tune=<data-dir>    Fine-tune pruned models on this preprocessed data dir
+  --epoch=<epoch>           Number of fine-tuning epochs [default: 1]
+  --length=<length>         Sequence length used for FLOPs and latency [default: 512]
+"""
+
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.getcwd())
+
+import numpy as np
+import torch
+import torch.optim as optim
+from docopt import docopt
+
+from attacut import command, models, pruning, utils
+
+SAMPLE_TXT = "ภาษาไทยยากจังไปโรงเรียนดีกว่าไปด้วยซิ "
+
+
+def measure(model, dataset, length, repeat=20):
+    txt = (SAMPLE_TXT * (length // len(SAMPLE_TXT) + 1))[:length]
+    _, (x, seq) = dataset.make_feature(txt)
+
+    # SyllableSeqDataset's features come without the batch dimension
+    if x.dim() == 1:
+        x = x.unsqueeze(0)
+
+    inputs = (x, seq)
+    flops = models.count_flops(model, inputs)
+
+    timings = []
+    with torch.no_grad():
+        for _ in range(repeat):
+            st = time.perf_counter()
+            model(inputs)
+            timings.append(time.perf_counter() - st)
+
+    return dict(flops=flops, latency_ms=float(np.median(timings)) * 1000)
+
+
+def save_pruned(model, src, dest, params):
+    os.makedirs(dest, exist_ok=True)
+
+    for f in glob.glob(f"{src}/*.json") + glob.glob(f"{src}/*.npy"):
+        shutil.copy(f, dest)
+
+    torch.save(model.state_dict(), f"{dest}/model.pth")
+
+    # fresh optimizer state so that train.py can resume from the pruned model
+    torch.save(
+        optim.Adam(model.parameters(), lr=float(params.lr)).state_dict(),
+        f"{dest}/optimizer.pth"
+    )
+
+    utils.save_training_params(dest, params._replace(
+        params=model.model_params,
+        num_trainable_params=model.total_trainable_params()
+    ))
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+
+    ratio = float(arguments["--ratio"])
+    length = int(arguments["--length"])
+    output_dir = arguments["--output-dir"]
+
+    report = []
+
+    for path in sorted(glob.glob(arguments["--models"])):
+        params = utils.load_training_params(path)
+        model_cls = models.get_model(params.name)
+
+        dataset = model_cls.dataset(dict_dir=path)
+        data_config = dataset.setup_featurizer()
+        model = model_cls.load(path, data_config, params.params)
+
+        if not pruning.is_prunable(model):
+            print(f"skipping {path}: {params.name} has no IteratedDilatedConvolutions of full convolutions")
+            continue
+
+        filters = model.id_conv.conv1.conv.out_channels
+        new_filters = max(1, int(round(filters * ratio)))
+
+        dest = "%s/%s-conv%d" % (output_dir, os.path.basename(os.path.normpath(path)), new_filters)
+
+        pruned = pruning.prune(model, data_config, new_filters)
+        save_pruned(pruned, path, dest, params)
+
+        if arguments["--fine-tune"]:
+            cmd = [
+                sys.executable, "./scripts/train.py",
+                "--model-name", params.name,
+                "--model-params", pruned.model_params,
+                "--data-dir", arguments["--fine-tune"],
+                "--output-dir", dest,
+                "--prev-model", dest,
+                "--epoch", arguments["--epoch"],
+                "--lr", params.lr,
+                "--weight-decay", params.weight_decay,
+            ]
+            print("fine-tuning: %s" % " ".join(cmd))
+            subprocess.run(cmd, check=True)
+
+            pruned = model_cls.load(dest, data_config, pruned.model_params)
+
+        stats = dict(model_path=path, pruned_path=dest, conv=filters, pruned_conv=new_filters)
+
+        for prefix, m, p in [("before", model, path), ("after", pruned, dest)]:
+            for k, v in measure(m, dataset, length).items():
+                stats[f"{prefix}:{k}"] = v
+
+            stats[f"{prefix}:num_trainable_params"] = m.total_trainable_params()
+
+            if arguments["--data"]:
+                stats[f"{prefix}:word_level:f1"] = command.word_f1(p, arguments["--data"])
+
+        report.append(stats)
+
+        for k, v in stats.items():
+            print(f"{k}: {v}")
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(f"{output_dir}/pruning-report.json", "w") as fh:
+        json.dump(report, fh, indent=2)
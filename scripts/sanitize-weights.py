@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+"""sanitize-weights.py
+
+Zero the weights of models whose magnitude is below a threshold (by default,
+denormal float32s, which weight-decay leaves behind and which make CPU
+inference slow). With --data, word-level F1 is computed before and after,
+and model.pth is only rewritten if it doesn't change by more than --tolerance.
+Without --dest, model.pth is rewritten in place and the original is kept as model.pth.orig.
+
+Usage:
+  sanitize-weights.py <model>... [--threshold=<threshold>] [--data=<dataset>] [--tolerance=<tolerance>] [--dest=<dest>]
+
+Arguments:
+  <model>                       Model directories
+
+Options:
+  -h --help                     Show this screen.
+  --threshold=<threshold>       Weights with a smaller magnitude are zeroed [default: 1.1754944e-38]
+  --data=<dataset>              Dataset (with input.txt and label.txt) for computing F1
+  --tolerance=<tolerance>       Allowed change of F1 [default: 0]
+  --dest=<dest>                 Write sanitized models to <dest>/<model's dir name> instead
+"""
+
+import glob
+import os
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.getcwd())
+
+import torch
+from docopt import docopt
+
+from attacut import command, models
+
+
+def copy_model_files(src, dest):
+    # everything Tokenizer needs except model.pth
+    os.makedirs(dest, exist_ok=True)
+
+    for f in glob.glob(f"{src}/*.json") + glob.glob(f"{src}/*.npy") + glob.glob(f"{src}/*.yml"):
+        shutil.copy(f, dest)
+
+
+def save(state, path):
+    tmp = "%s.tmp" % path
+    torch.save(state, tmp)
+    os.replace(tmp, path)
+
+
+if __name__ == "__main__":
+    arguments = docopt(__doc__)
+
+    threshold = float(arguments["--threshold"])
+    tolerance = float(arguments["--tolerance"])
+
+    failed = False
+    for path in arguments["<model>"]:
+        path = os.path.normpath(path)
+
+        state = torch.load(f"{path}/model.pth", map_location="cpu")
+        total = sum(w.numel() for w in state.values() if w.is_floating_point())
+
+        zeroed = models.zero_small_weights(state, threshold)
+
+        for name, n in zeroed.items():
+            print(f"{path}: {name}: {n} zeroed")
+
+        print(f"{path}: {sum(zeroed.values())} of {total} weights below {threshold} zeroed")
+
+        if not zeroed:
+            continue
+
+        if arguments["--data"]:
+            with tempfile.TemporaryDirectory() as tmp:
+                copy_model_files(path, tmp)
+                torch.save(state, f"{tmp}/model.pth")
+
+                before, after = command.word_f1(path, arguments["--data"]), command.word_f1(tmp, arguments["--data"])
+
+            print(f"{path}: word_level:f1 {before:.6f} -> {after:.6f}")
+
+            if abs(after - before) > tolerance:
+                print(f"{path}: F1 changed by more than {tolerance}, model.pth is left as is")
+                failed = True
+                continue
+
+        if arguments["--dest"]:
+            dest = "%s/%s" % (arguments["--dest"], os.path.basename(path))
+            copy_model_files(path, dest)
+        else:
+            dest = path
+            shutil.copy(f"{path}/model.pth", f"{path}/model.pth.orig")
+
+        save(state, f"{dest}/model.pth")
+        print(f"{path}: saved to {dest}/model.pth")
+
+    sys.exit(1 if failed else 0)
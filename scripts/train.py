@@ -9,14 +9,21 @@ import time
 sys.path.insert(0, os.getcwd())
 
 import numpy as np
+import yaml
 
 import fire
 import torch
+import torch.distributed as dist
 import torch.optim as optim
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils import data
+from torch.utils.data.distributed import DistributedSampler
 
-from attacut import dataloaders as dl, output_tags
-from attacut import evaluation, models, utils, loss
+from attacut import corpus, dataloaders as dl, output_tags
+from attacut import checkpoint as ckpt, distillation, evaluation, models, utils, loss
+
+# dense (Adam) and, with sparse embeddings, SparseAdam states
+OPTIMIZER_FILES = ["optimizer.pth", "optimizer-sparse.pth"]
 
 def _create_metrics(metrics=["true_pos", "false_pos", "false_neg"]):
     return dict(zip(metrics, [0]*len(metrics)))
@@ -30,38 +37,94 @@ def copy_files(path, dest):
         shutil.copy(f, "%s/%s" % (dest, filename), follow_symlinks=True)
 
 
+def update_boundary_metrics(metrics, model, logits, labels, seq_lengths):
+    # word-boundary tp/fp/fn of a batch from the same logits used for the loss
+    mask = loss.create_mask_with_length(seq_lengths).cpu().numpy()
+
+    preds = model.decode(logits, seq_lengths)
+
+    # crf gives one array per sample, otherwise a padded (batch, len) array
+    preds = np.concatenate(preds) if isinstance(preds, list) else preds[mask]
+    labels = model.output_scheme.decode_condition(labels.cpu().numpy()[mask])
+
+    metrics["true_pos"] += int(np.sum(preds * labels))
+    metrics["false_pos"] += int(np.sum(preds * (1 - labels)))
+    metrics["false_neg"] += int(np.sum((1 - preds) * labels))
+
+
 def do_iterate(model, generator, device,
-    optimizer=None, criterion=None, prefix="", step=0):
+    optimizers=None, criterion=None, prefix="", step=0, net=None, metrics=None):
+    # `net` is the model wrapped for distributed training; the loss still
+    # needs the model itself, e.g. for its CRF.
+    # `metrics` (see `_create_metrics`), if given, gets boundary tp/fp/fn.
+    net = net if net is not None else model
 
     total_loss, total_preds = 0, 0
 
     for _, batch in enumerate(generator):
-        (x, seq), labels, perm_ix = batch
+        (x, seq), labels, perm_ix = batch[:3]
+
+        # distillation batches also carry the teacher's soft targets
+        extra = [b.to(device) for b in batch[3:]]
 
         xd, yd, total_batch_preds = generator.dataset.prepare_model_inputs(
             ((x, seq), labels), device
         )
 
-        if optimizer:
+        if optimizers:
             model.zero_grad()
 
-        logits = model(xd)
+        logits = net(xd)
 
-        loss = criterion(model, logits, yd, seq.to(device))
+        batch_loss = criterion(model, logits, yd, seq.to(device), *extra)
 
-        if optimizer:
-            loss.backward()
-            optimizer.step()
+        if optimizers:
+            batch_loss.backward()
+            for optimizer in optimizers:
+                optimizer.step()
+
+        if metrics is not None:
+            update_boundary_metrics(metrics, model, logits.detach(), yd, seq.to(device))
 
         total_preds += total_batch_preds
-        total_loss += loss.item() * total_batch_preds
+        total_loss += batch_loss.item() * total_batch_preds
+
+    if dist.is_initialized():
+        # every worker sees only its shard
+        keys = sorted(metrics.keys()) if metrics is not None else []
+        totals = torch.tensor(
+            [total_loss, total_preds] + [metrics[k] for k in keys], dtype=torch.float64
+        )
+        dist.all_reduce(totals)
+        total_loss, total_preds = totals[:2].tolist()
+
+        for k, v in zip(keys, totals[2:].tolist()):
+            metrics[k] = int(v)
 
-    avg_loss = total_loss / total_preds if total_preds > 0 else 0
+    avg_loss = float(total_loss / total_preds) if total_preds > 0 else 0
     print(f"[{prefix}] loss {avg_loss:.4f}")
 
     return avg_loss
 
 
+def create_optimizers(model, lr, weight_decay, sparse_embeddings=False):
+    if not sparse_embeddings:
+        return [optim.Adam(model.parameters(), lr=lr, weight_decay=weight_decay)]
+
+    sparse = models.use_sparse_embeddings(model)
+    sparse_ids = set(map(id, sparse))
+    dense = [p for p in model.parameters() if id(p) not in sparse_ids]
+
+    if weight_decay:
+        print("SparseAdam has no weight decay; it is only applied to non-embedding parameters")
+
+    # Adam can't take sparse gradients, SparseAdam can't take dense ones
+    return [
+        optim.Adam(dense, lr=lr, weight_decay=weight_decay),
+        optim.SparseAdam(sparse, lr=lr)
+    ]
+
+
 # taken from https://stackoverflow.com/questions/52660985/pytorch-how-to-get-learning-rate-during-training
 def get_lr(optimizer):
     for param_group in optimizer.param_groups:
@@ -79,7 +142,29 @@ def main(
         output_dir="",
         no_workers=4,
         prev_model="",
+        teacher="",
+        distill_alpha=0.5,
+        distill_temperature=1.0,
+        sparse_embeddings=False,
+        distributed=False,
+        resume=False,
+        early_stopping=0,
+        monitor="loss",
     ):
+    # `checkpoint`: write the full training state every N epochs, see `resume`
+    # `resume`: continue from <output_dir>/checkpoint.pth if it exists
+    # `early_stopping`: stop after N epochs without improvement of validation `monitor`
+    # `monitor`: "loss" or "f1" (word boundaries); the best model is chosen by it too
+    assert monitor in ["loss", "f1"], "monitor should be either loss or f1"
+
+    if distributed:
+        # launched with torch.distributed.run (torchrun), which sets
+        # RANK, WORLD_SIZE, MASTER_ADDR and MASTER_PORT.
+        dist.init_process_group("gloo")
+        print("Worker %d of %d" % (dist.get_rank(), dist.get_world_size()))
+
+    # only this process writes files and metrics
+    is_main = not distributed or dist.get_rank() == 0
 
     model_cls = models.get_model(model_name)
 
@@ -133,26 +218,72 @@ def main(
     else:
         criterion = loss.cross_ent
 
-    optimizer = optim.Adam(model.parameters(), lr=lr, weight_decay=weight_decay)
+    optimizers = create_optimizers(model, lr, weight_decay, sparse_embeddings)
 
     if prev_model:
         print("Loading prev optmizer's state")
-        optimizer.load_state_dict(torch.load("%s/optimizer.pth" % prev_model))
-        print("Previous learning rate", get_lr(optimizer))
-
-        # force torch to use the given lr, not previous one
-        for param_group in optimizer.param_groups:
-            param_group['lr'] = lr
-            param_group['initial_lr'] = lr
+        for optimizer, path in zip(optimizers, OPTIMIZER_FILES):
+            path = "%s/%s" % (prev_model, path)
+            if not os.path.exists(path):
+                print("%s not found, starting with a fresh optimizer" % path)
+                continue
+
+            try:
+                optimizer.load_state_dict(torch.load(path))
+            except ValueError as e:
+                # e.g. the previous model was trained with(out) sparse embeddings
+                print("Unable to load %s: %s" % (path, e))
+                continue
+
+            print("Previous learning rate", get_lr(optimizer))
+
+            # force torch to use the given lr, not previous one
+            for param_group in optimizer.param_groups:
+                param_group['lr'] = lr
+                param_group['initial_lr'] = lr
+
+        print("Current learning rate", get_lr(optimizers[0]))
+
+    train_criterion = criterion
+
+    if teacher:
+        print("Distilling from teacher %s (alpha=%s, T=%s)" % (
+            teacher, distill_alpha, distill_temperature
+        ))
+
+        # the main process fills the cache, the others read it
+        for compute in [is_main, not is_main]:
+            if compute:
+                soft_targets = distillation.compute_teacher_targets(
+                    teacher,
+                    data_dir,
+                    temperature=distill_temperature,
+                    batch_size=batch_size,
+                    device=device
+                )
+
+            if distributed:
+                dist.barrier()
+
+        training_set = distillation.DistillationDataset(
+            training_set,
+            soft_targets,
+            distillation.read_syllables(corpus.find_training_file(data_dir, "training.txt"))
+        )
 
-        print("Current learning rate", get_lr(optimizer))
+        train_criterion = distillation.distillation_loss(
+            criterion, alpha=distill_alpha, temperature=distill_temperature
+        )
 
-    scheduler = optim.lr_scheduler.ReduceLROnPlateau(
-        optimizer,
-        "min",
-        patience=0,
-        verbose=True
-    )
+    schedulers = [
+        optim.lr_scheduler.ReduceLROnPlateau(
+            optimizer,
+            "min",
+            patience=0,
+            verbose=True
+        )
+        for optimizer in optimizers
+    ]
 
     dataloader_params = dict(
         batch_size=batch_size,
@@ -162,14 +293,27 @@ def main(
 
     print("Using dataset: %s" % type(dataset_cls).__name__)
 
+    net, train_sampler, val_sampler = model, None, None
+    if distributed:
+        # gradients are all-reduced in backward; `batch_size` is per worker
+        net = DistributedDataParallel(model)
+        train_sampler = DistributedSampler(training_set, shuffle=True)
+        val_sampler = DistributedSampler(validation_set, shuffle=False)
+
     training_generator = data.DataLoader(
         training_set,
-        shuffle=True,
-        **dataloader_params
+        shuffle=train_sampler is None,
+        sampler=train_sampler,
+        **dict(
+            dataloader_params,
+            # the distillation wrapper pads soft targets alongside labels
+            collate_fn=training_set.collate_fn
+        )
     )
     validation_generator = data.DataLoader(
         validation_set,
         shuffle=False,
+        sampler=val_sampler,
         **dataloader_params
     )
 
@@ -180,67 +324,156 @@ def main(
         (total_train_size, total_test_size)
     )
 
-    # for FloydHub
-    print(
-        '{"metric": "%s:%s", "value": %s}' %
-        ("model", model_name, model.total_trainable_params())
-    )
+    if is_main:
+        # for FloydHub
+        print(
+            '{"metric": "%s:%s", "value": %s}' %
+            ("model", model_name, model.total_trainable_params())
+        )
 
-    os.makedirs(output_dir, exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
 
-    copy_files(
-        "%s/dictionary/*.json" % data_dir,
-        output_dir
-    )
+        copy_files(
+            "%s/dictionary/*.json" % data_dir,
+            output_dir
+        )
+
+    writer = ckpt.CheckpointWriter()
+    checkpoint_path = "%s/%s" % (output_dir, ckpt.CHECKPOINT_FILE)
+
+    stopper = utils.EarlyStopping(early_stopping, mode="min" if monitor == "loss" else "max")
+
+    # validation loss and f1 of the saved model
+    best_validation = dict()
+
+    start_epoch, previous_training_took = 1, 0
+    if resume and os.path.exists(checkpoint_path):
+        print("Resuming from %s" % checkpoint_path)
+        state = torch.load(checkpoint_path, map_location=device)
+
+        model.load_state_dict(state["model"])
+        for obj, obj_state in zip(optimizers + schedulers, state["optimizers"] + state["schedulers"]):
+            obj.load_state_dict(obj_state)
+
+        start_epoch = state["epoch"] + 1
+        stopper.load_state_dict(state["early_stopping"])
+        best_validation = state["validation"]
+        previous_training_took = state["training_took"]
+
+        ckpt.set_rng_state(state["rng"])
+
+        print("Continuing at epoch %d (best val %s %s)" % (start_epoch, monitor, stopper.best))
+
+    # number of epochs trained, less than `epoch` when stopped early
+    trained_epochs = start_epoch - 1
 
-    start_training_time = time.time()
-    best_val_loss = np.inf
-    for e in range(1, epoch+1):
+    if stopper.stopped:
+        print("Training has already stopped early at epoch %d" % trained_epochs)
+        epoch = trained_epochs
+
+    start_training_time = time.time() - previous_training_took
+    for e in range(start_epoch, epoch+1):
         print("===EPOCH %d ===" % (e))
         st_time = time.time()
 
-        curr_lr = get_lr(optimizer)
+        curr_lr = get_lr(optimizers[0])
         print(f"lr={curr_lr}")
 
+        if train_sampler:
+            train_sampler.set_epoch(e)
+
+        train_st_time = time.time()
         with utils.Timer("epoch-training") as timer:
             model.train()
             _ = do_iterate(model, training_generator,
                 prefix="training",
                 step=e,
                 device=device,
-                optimizer=optimizer,
-                criterion=criterion,
+                optimizers=optimizers,
+                criterion=train_criterion,
+                net=net,
+            )
+
+        if is_main:
+            print(
+                '{"metric": "%s", "value": %s, "step": %d}' %
+                ("training:samples_per_sec", total_train_size / (time.time() - train_st_time), e)
             )
 
         with utils.Timer("epoch-validation") as timer, \
             torch.no_grad():
             model.eval()
+            val_metrics = _create_metrics()
             val_loss = do_iterate(model, validation_generator,
                 prefix="validation",
                 step=e,
                 device=device,
                 criterion=criterion,
+                metrics=val_metrics,
             )
 
+        val_f1 = evaluation.metrics_from_counts(
+            val_metrics["true_pos"], val_metrics["false_pos"], val_metrics["false_neg"]
+        ).f1
+
+        if is_main:
+            print('{"metric": "%s", "value": %s, "step": %d}' % ("validation:f1", val_f1, e))
+
         elapsed_time = (time.time() - st_time) / 60.
         print(f"Time took: {elapsed_time:.4f} mins")
 
-        scheduler.step(val_loss)
+        for scheduler in schedulers:
+            scheduler.step(val_loss)
 
-        if val_loss < best_val_loss:
-            model_path = "%s/model.pth" % output_dir
-            opt_path = "%s/optimizer.pth" % output_dir
+        val_score = val_loss if monitor == "loss" else val_f1
+        is_best = stopper.is_better(val_score)
+        should_stop = stopper.step(val_score)
+
+        trained_epochs = e
+
+        if is_best:
+            best_validation = dict(loss=val_loss, f1=val_f1)
 
-            print("Saving model to %s" % model_path)
-            torch.save(model.state_dict(), model_path)
-            torch.save(optimizer.state_dict(), opt_path)
+            model_path = "%s/model.pth" % output_dir
 
-            best_val_loss = val_loss
+            # weights are the same on every worker
+            if is_main:
+                print("Saving model to %s" % model_path)
+                writer.save(model.state_dict(), model_path)
+
+                for optimizer, path in zip(optimizers, OPTIMIZER_FILES):
+                    writer.save(optimizer.state_dict(), "%s/%s" % (output_dir, path))
+
+        if is_main and checkpoint and (e % checkpoint == 0 or e == epoch or should_stop):
+            print("Saving checkpoint to %s" % checkpoint_path)
+            writer.save(dict(
+                model=model.state_dict(),
+                optimizers=[o.state_dict() for o in optimizers],
+                schedulers=[s.state_dict() for s in schedulers],
+                epoch=e,
+                early_stopping=stopper.state_dict(),
+                validation=best_validation,
+                training_took=time.time() - start_training_time,
+                rng=ckpt.rng_state(),
+            ), checkpoint_path)
+
+        if should_stop:
+            print("No improvement of validation %s for %d epochs; stopping at epoch %d" % (
+                monitor, early_stopping, e
+            ))
+            break
+
+    writer.close()
 
     training_took = time.time() - start_training_time
 
     print(f"[training] total time: {training_took}")
 
+    if distributed:
+        dist.destroy_process_group()
+
+    if not is_main:
+        return
 
     config = utils.parse_model_params(model_params)
 
@@ -260,9 +493,17 @@ def main(
             num_trainable_params=model.total_trainable_params(),
             lr=lr,
             weight_decay=weight_decay,
-            epoch=epoch
+            epoch=trained_epochs
         )
     )
 
+    if teacher:
+        with open("%s/distillation.yml" % output_dir, "w") as fh:
+            yaml.dump(dict(
+                teacher=teacher,
+                alpha=distill_alpha,
+                temperature=distill_temperature
+            ), fh, default_flow_style=False)
+
 if __name__ == "__main__":
     fire.Fire(main)
@@ -15,4 +15,90 @@ from attacut import benchmark
     ]
 )
 def test_preprocessing(txt, expected):
-    assert benchmark.preprocessing(txt) == expected
\ No newline at end of file
+    assert benchmark.preprocessing(txt) == expected
+
+REF_SAMPLES = [
+    "วันนี้|ทำไม|",
+    "a|dog|is|here",
+    "<NE>Peter</NE>|likes|cats",
+    "ภาษา|ไทย|ยาก|จัง",
+    "ผม|ไม่|ชอบ|กิน|ผัก",
+    "",
+    "abc|def",
+]
+
+SAMPLES = [
+    "วันนี้|ทำ|ไม|",
+    "a|dog|is|here",
+    "Peter|likes|ca|ts",
+    "ภาษาไทย|ยากจัง",
+    # different length from the reference
+    "ผม|ไม่ชอบ|กินผัก|มาก",
+    "foo",
+    "ab|cdef",
+]
+
+
+@pytest.mark.parametrize("num_workers", [0, 2])
+def test_benchmark_corpus(num_workers):
+    df = benchmark.benchmark(REF_SAMPLES[:5] + REF_SAMPLES[6:], SAMPLES[:5] + SAMPLES[6:])
+
+    stats = benchmark.benchmark_corpus(
+        REF_SAMPLES, SAMPLES, per_sample=True, num_workers=num_workers, chunk_size=2
+    )
+
+    for c in benchmark.COUNT_COLUMNS:
+        assert stats[c] == df[c].sum()
+        np.testing.assert_array_equal(stats["per_sample"][c], df[c].values)
+
+    np.testing.assert_array_equal(
+        stats["per_sample"]["global:tokenisation_indicators"],
+        df["global:tokenisation_indicators"].values
+    )
+
+    np.testing.assert_array_equal(stats["per_sample"]["index"], [0, 1, 2, 3, 4, 6])
+
+
+def test_summarize():
+    stats = benchmark.summarize(benchmark.benchmark_corpus(REF_SAMPLES, REF_SAMPLES))
+
+    assert stats["char_level:f1"] == 1
+    assert stats["word_level:f1"] == 1
+    assert "per_sample" not in stats
+
+
+@pytest.mark.parametrize(
+    "words",
+    [
+        ["ภาษา", "ไทย", "ยาก"],
+        ["ภาษา", " ", "ไทย"],
+        [" ", "ภาษา", "ไทย "],
+        ["<NE>", "Peter", "</NE>"],
+        ["a", "|", "b"],
+        ["a", "", "b"],
+        [" "],
+    ]
+)
+def test_words_to_bits(words):
+    sample = "|".join(words)
+
+    if sample.strip():
+        expected, _ = benchmark._corpus_binary_representation([benchmark.preprocessing(sample)])
+    else:
+        expected = np.zeros(0)
+
+    np.testing.assert_array_equal(benchmark.words_to_bits(words), expected)
+
+
+def test_corpus_evaluator():
+    evaluator = benchmark.CorpusEvaluator(REF_SAMPLES)
+
+    lines = [s.split("|") for s in SAMPLES]
+
+    # in two batches, the second one with a line beyond the reference
+    evaluator.add([0, 1, 2], [benchmark.words_to_bits(w) for w in lines[:3]])
+    evaluator.add([3, 4, 5, 6, 7], [benchmark.words_to_bits(w) for w in lines[3:] + [["x"]]])
+
+    stats = benchmark.benchmark_corpus(REF_SAMPLES, SAMPLES)
+
+    assert evaluator.stats() == dict((c, stats[c]) for c in benchmark.COUNT_COLUMNS)
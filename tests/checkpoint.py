@@ -0,0 +1,35 @@
+import os
+import random
+
+import numpy as np
+import torch
+
+from attacut import checkpoint
+
+
+def test_checkpoint_writer(tmp_path):
+    path = str(tmp_path / "state.pth")
+    weight = torch.zeros(3)
+
+    with checkpoint.CheckpointWriter() as writer:
+        writer.save(dict(weight=weight, epoch=2), path)
+
+        # training goes on while the state is being written
+        weight += 1
+
+    state = torch.load(path)
+
+    assert torch.equal(state["weight"], torch.zeros(3))
+    assert state["epoch"] == 2
+    assert os.listdir(str(tmp_path)) == ["state.pth"]
+
+
+def test_rng_state(tmp_path):
+    path = str(tmp_path / "rng.pth")
+    checkpoint.atomic_save(checkpoint.rng_state(), path)
+
+    expected = (random.random(), np.random.rand(), torch.rand(1))
+
+    checkpoint.set_rng_state(torch.load(path))
+
+    assert (random.random(), np.random.rand(), torch.rand(1)) == expected
@@ -0,0 +1,94 @@
+import random
+import re
+
+import pytest
+
+from attacut.cleaning import Cleaner, Rule
+
+RULES = [
+    Rule("tab", "\t", " "),
+    Rule("slash", "/"),
+    Rule("paragraph", "<p>"),
+    Rule("cmn", "cmn"),
+    Rule("comment", "cm(.+?)cm", regex=True),
+    Rule("pipes", r"\|+", "|", regex=True),
+]
+
+
+@pytest.mark.parametrize(
+    ("line", "expected"),
+    [
+        ("ภาษา|\tไทย", "ภาษา| ไทย"),
+        ("a/b<p>c", "abc"),
+        ("cm|ภาษา|cmn", "cm|ภาษา|"),
+        ("a cmxcm b|||c", "a  b|c"),
+    ]
+)
+def test_cleaner(line, expected):
+    assert Cleaner(RULES)(line) == expected
+
+
+# the rules of scripts/data-related/preprocess-tnhc.py
+TNHC_RULES = [
+    Rule("space_tag", "<s>", " "),
+    Rule("tab", "\t", " "),
+    Rule("paragraph_tag", "<p>"),
+    Rule("ss_tag", "ss"),
+    Rule("sz_tag", "sz"),
+    Rule("slash", "/"),
+    Rule("backslash", "\\"),
+    Rule("lgp_tag", "lgp"),
+    Rule("cmn_tag", "cmn"),
+    Rule("byte_order_mark", "\ufeff"),
+    Rule("poem_type", "cc(.+?)cc", regex=True),
+    Rule("cm_tag", "cm(.+?)cm", regex=True),
+]
+
+
+def _sequential(rules, line):
+    for r in rules:
+        if r.regex:
+            line = re.sub(r.pattern, r.replacement, line)
+        else:
+            line = line.replace(r.pattern, r.replacement)
+
+    return line
+
+
+def _random_lines(n, seed=1):
+    rng = random.Random(seed)
+    pieces = ["s", "z", "c", "m", "n", "l", "g", "p", "<", ">", "/", "\\", "|",
+              "\t", "\ufeff", "<p>", "<s>", "ss", "cmn", "ก", " "]
+
+    return ["".join(rng.choice(pieces) for _ in range(rng.randint(1, 12))) for _ in range(n)]
+
+
+@pytest.mark.parametrize(
+    ("rules", "line"),
+    [
+        (TNHC_RULES, "s<p>s"),
+        (TNHC_RULES, "cmssn"),
+        (TNHC_RULES, "s/s"),
+        (TNHC_RULES, "s<ssp>"),
+        (RULES, "x\t<p>/cmn|cm|ก|cm||<p>/ข"),
+    ]
+)
+def test_cleaner_same_as_sequential(rules, line):
+    assert Cleaner(rules)(line) == _sequential(rules, line)
+
+
+@pytest.mark.parametrize("rules", [TNHC_RULES, RULES])
+def test_cleaner_same_as_sequential_random(rules):
+    cleaner = Cleaner(rules)
+
+    for line in _random_lines(5000):
+        assert cleaner(line) == _sequential(rules, line), repr(line)
+
+
+def test_cleaner_hits():
+    cleaner = Cleaner(RULES)
+
+    for line in ["a//b", "cmxcm", "c"]:
+        cleaner(line)
+
+    assert cleaner.hits == dict(slash=2, comment=1)
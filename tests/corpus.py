@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+from attacut import corpus
+
+
+@pytest.mark.parametrize(
+    ("line", "expected"),
+    [
+        ("ภาษา|ไทย\n", (["ภา", "ษา", "ไทย"], [1, 0, 1])),
+        ("hello| |123", (["hello", " ", "123"], [1, 1, 1])),
+    ]
+)
+def test_raw_to_syllable_and_label(line, expected):
+    assert corpus.raw_to_syllable_and_label(line) == expected
+
+
+def test_training_line():
+    line = corpus.to_training_line(["ภา", "ษา", "ไทย"], [1, 0, 1])
+
+    assert line == "ภา~ษา~ไทย:--:101"
+
+    syllables, labels = corpus.parse_training_line(line + "\n")
+    assert syllables == ["ภา", "ษา", "ไทย"]
+    np.testing.assert_array_equal(labels, [1, 0, 1])
+
+
+def test_binary_corpus(tmpdir):
+    shards = [
+        [(["ภา", "ษา", "ไทย"], [1, 0, 1]), (["a"], [1])],
+        [(["", "ดี"], [1, 1])],
+    ]
+
+    for i, samples in enumerate(shards):
+        prefix = "%s/%05d" % (tmpdir, i)
+        corpus.write_binary_shard(prefix, samples)
+        assert corpus.is_binary_shard_complete(prefix)
+
+    data = corpus.BinaryCorpus(str(tmpdir))
+    expected = shards[0] + shards[1]
+
+    assert len(data) == 3
+    for (syllables, labels), (exp_syllables, exp_labels) in zip(data, expected):
+        assert syllables == exp_syllables
+        np.testing.assert_array_equal(labels, exp_labels)
+
+    with pytest.raises(IndexError):
+        data[3]
+
+
+def test_training_file(tmpdir):
+    samples = [(["ภา", "ษา", "ไทย"], [1, 0, 1]), (["ดี"], [1])]
+
+    # only binary shards
+    tmpdir.mkdir("training.bin")
+    corpus.write_binary_shard("%s/training.bin/00000" % tmpdir, samples)
+
+    path = corpus.find_training_file(str(tmpdir), "training.txt")
+    assert path == "%s/training.bin" % tmpdir
+
+    from_binary = list(corpus.read_training_samples(path))
+
+    # the text file is preferred once it exists
+    corpus.write_text_shard("%s/training.txt" % tmpdir, samples)
+
+    path = corpus.find_training_file(str(tmpdir), "training.txt")
+    assert path == "%s/training.txt" % tmpdir
+
+    for (sy, lb), (exp_sy, exp_lb), (txt_sy, txt_lb) in zip(from_binary, samples, corpus.read_training_samples(path)):
+        assert sy == exp_sy == txt_sy
+        np.testing.assert_array_equal(lb, exp_lb)
+        np.testing.assert_array_equal(txt_lb, exp_lb)
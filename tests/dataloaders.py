@@ -0,0 +1,60 @@
+import pytest
+import torch
+
+from attacut import artifacts, dataloaders, output_tags
+
+DICT_DIR = artifacts.get_path("attacut-sc")
+
+
+@pytest.mark.parametrize(
+    "dataset",
+    [
+        dataloaders.CharacterSeqDataset,
+        dataloaders.SyllableCharacterSeqDataset,
+        dataloaders.SyllableSeqDataset,
+        dataloaders.SyllableStepDataset,
+    ]
+)
+def test_make_feature_with_workspace(dataset):
+    ds = dataset(dict_dir=DICT_DIR)
+
+    # a small workspace, so it has to grow
+    workspace = dataloaders.Workspace(size=4)
+
+    for txt in ["ภาษาไทยยากจัง", "ไป", "ไปโรงเรียนดีกว่าไปด้วยซิ" * 3, "ภาษาไทย"]:
+        tokens, (x, seq) = ds.make_feature(txt)
+        ws_tokens, (ws_x, ws_seq) = ds.make_feature(txt, workspace=workspace)
+
+        assert tokens == ws_tokens
+        assert ws_x.dtype == x.dtype == torch.int64
+        assert torch.equal(ws_x, x)
+        assert torch.equal(ws_seq, seq)
+
+
+def test_workspace_outputs():
+    workspace = dataloaders.Workspace(size=8)
+
+    values, indices = workspace.outputs((1, 5))
+    assert values.shape == indices.shape == (1, 5)
+
+    values, indices = workspace.outputs((1, 20))
+    assert values.shape == indices.shape == (1, 20)
+
+
+@pytest.mark.parametrize(
+    ("scheme", "expected"),
+    [
+        ("BI", [1, 0, 1]),
+        ("SchemeA", [1, 0, 1]),
+        ("SchemeB", [3, 2, 1]),
+        ("SchemeASyLevel", [1, 0, 1]),
+        ("SchemeBSyLevel", [3, 2, 1]),
+    ]
+)
+def test_syllable_step_labels_of_repeated_syllable(scheme, expected):
+    ds = dataloaders.SyllableStepDataset(dict_dir=DICT_DIR)
+
+    # ละ~ละ is a word of two syllables, even though they are the same
+    _, y = ds._process_training_line(["ละ", "ละ", "ไป"], [1, 0, 1], output_tags.get_scheme(scheme))
+
+    assert y.tolist() == expected
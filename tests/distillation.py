@@ -0,0 +1,104 @@
+import os
+
+import numpy as np
+import pytest
+import torch
+from torchcrf import CRF
+
+from attacut import artifacts, corpus, distillation, loss, models, output_tags
+
+
+@pytest.mark.parametrize(
+    ("syllables", "probs", "expected"),
+    [
+        (["ภา", "ษา", "", "ไทย"], [0.9, 0.2, 0.5, 0.7], [0.9, 0, 0.2, 0, 0.5, 0.7, 0, 0]),
+        (["a"], [1.0], [1.0]),
+    ]
+)
+def test_syllable_level_conversion(syllables, probs, expected):
+    probs = np.array(probs)
+
+    expanded = distillation.from_syllable_level(probs, syllables, True)
+    np.testing.assert_array_almost_equal(expanded, expected)
+
+    np.testing.assert_array_almost_equal(
+        distillation.to_syllable_level(expanded, syllables, True),
+        probs
+    )
+
+
+def test_crf_marginals():
+    torch.manual_seed(71)
+
+    crf = CRF(4, batch_first=True)
+    emissions = torch.randn(2, 5, 4)
+    mask = torch.tensor([[1, 1, 1, 1, 1], [1, 1, 1, 0, 0]])
+
+    marginals = distillation.crf_marginals(crf, emissions, mask)
+
+    np.testing.assert_array_almost_equal(
+        marginals.sum(dim=2)[mask.bool()].detach().numpy(),
+        np.ones(8),
+        decimal=5
+    )
+
+
+def test_cache_path_changes_with_teacher_weights(tmp_path):
+    teacher = tmp_path / "teacher"
+    teacher.mkdir()
+    (teacher / "model.pth").write_bytes(b"")
+
+    path = distillation.cache_path(str(tmp_path), str(teacher), 1.0)
+    assert path == distillation.cache_path(str(tmp_path), str(teacher), 1.0)
+
+    os.utime(teacher / "model.pth", (0, 0))
+    assert path != distillation.cache_path(str(tmp_path), str(teacher), 1.0)
+
+
+@pytest.mark.parametrize(
+    ("name", "params"),
+    [
+        ("seq_sy_chpool_conv_3lv", "embc:4|embt:4|embs:4|conv:6|l1:5|do:0.0|oc:BI"),
+        ("seq_sy_ch_conv_3lv", "embc:4|embt:4|embs:4|conv:6|l1:5|do:0.0|oc:BI"),
+        ("seq_sy_conv_3lv", "embs:4|conv:6|l1:5|do:0.0|oc:BI"),
+    ]
+)
+def test_distillation_dataset(tmp_path, name, params):
+    lines = [
+        (["ภา", "ษา", "ไทย", "ยาก", "จัง"], "10111"),
+        (["ไป", "โรง", "เรียน"], "110"),
+    ]
+
+    path = tmp_path / "training.txt"
+    path.write_text("".join(
+        "%s%s%s\n" % (corpus.SYLLABLE_SEP.join(sy), corpus.LABEL_SEP, lb) for sy, lb in lines
+    ), encoding="utf-8")
+
+    model_cls = models.get_model(name)
+    dataset = model_cls.dataset(
+        dict_dir=artifacts.get_path("attacut-sc"), path=str(path),
+        output_scheme=output_tags.get_scheme("BI")
+    )
+
+    # the teacher's probabilities are per syllable
+    soft_targets = [np.linspace(0.1, 0.9, len(sy)).astype(np.float32) for sy, _ in lines]
+
+    distill_set = distillation.DistillationDataset(
+        dataset, soft_targets, distillation.read_syllables(str(path))
+    )
+
+    inputs, labels, perm_idx, soft = distill_set.collate_fn([distill_set[i] for i in range(len(lines))])
+
+    assert soft.shape == labels.shape
+
+    char_level = distillation.is_char_level(model_cls.dataset)
+    for i, ix in enumerate(perm_idx.tolist()):
+        sy = lines[ix][0]
+        expected = distillation.from_syllable_level(soft_targets[ix], sy, char_level)
+        np.testing.assert_array_almost_equal(soft[i, :len(expected)].numpy(), expected)
+
+    model = model_cls(dataset.setup_featurizer(), params)
+    criterion = distillation.distillation_loss(loss.cross_ent, alpha=0.5, temperature=2.0)
+
+    (x, seq), y, _ = distill_set.prepare_model_inputs((inputs, labels))
+    assert torch.isfinite(criterion(model, model((x, seq)), y, seq, soft))
@@ -23,3 +23,15 @@ def test_something(labels, preds, expected):
         actual,
         expected
     )
+
+
+def test_metrics_from_counts():
+    metrics = evaluation.metrics_from_counts(2, 1, 1)
+
+    np.testing.assert_almost_equal(
+        (metrics.precision, metrics.recall, metrics.f1),
+        (2/3, 2/3, 2/3)
+    )
+
+    # no predicted and no true boundaries
+    assert evaluation.metrics_from_counts(0, 0, 0).f1 == 0.0
@@ -0,0 +1,80 @@
+import math
+
+import pytest
+
+from attacut import hyperopt
+
+
+@pytest.mark.parametrize(
+    ("min_epoch", "max_epoch", "eta", "expected"),
+    [
+        (1, 20, 3, [1, 3, 9, 20]),
+        (1, 9, 3, [1, 3, 9]),
+        (2, 2, 2, [2]),
+    ]
+)
+def test_rung_epochs(min_epoch, max_epoch, eta, expected):
+    assert hyperopt.rung_epochs(min_epoch, max_epoch, eta) == expected
+
+
+def test_successive_halving():
+    scheduler = hyperopt.SuccessiveHalving(4, min_epoch=1, max_epoch=4, eta=2)
+
+    jobs = [scheduler.next_job() for _ in range(2)]
+    assert [(j.trial, j.rung, j.epoch) for j in jobs] == [(0, 0, 1), (1, 0, 1)]
+
+    scheduler.report(jobs[0], 2.0)
+    scheduler.report(jobs[1], 1.0)
+
+    # trial 1 is in the top half of the first rung
+    assert scheduler.next_job() == hyperopt.Job(1, 1, 2)
+
+    # trial 0 isn't promoted, so new trials are started
+    assert scheduler.next_job() == hyperopt.Job(2, 0, 1)
+    assert scheduler.next_job() == hyperopt.Job(3, 0, 1)
+
+    scheduler.report(hyperopt.Job(2, 0, 1), math.nan)
+    assert scheduler.next_job() is None
+
+    assert scheduler.rung_of(0) == 0
+    assert scheduler.results[0][2] == math.inf
+
+
+@pytest.mark.parametrize(
+    ("points", "expected"),
+    [
+        ([(0.9, 100), (0.95, 50), (0.8, 80), (0.9, 120)], [1, 3]),
+        ([(0.9, 100), (0.9, 100)], [0]),
+        ([(0.5, 10)], [0]),
+    ]
+)
+def test_pareto_front(points, expected):
+    assert hyperopt.pareto_front(points) == expected
+
+
+def test_cost_biased_sample():
+    costs = [1, 1000, 2, 5000]
+
+    assert hyperopt.cost_biased_sample(costs, 4, bias=1, seed=1) == [0, 1, 2, 3]
+
+    # cheap configs are picked far more often
+    picked = [hyperopt.cost_biased_sample(costs, 1, bias=1, seed=s)[0] for s in range(200)]
+    assert sum(c < 10 for c in map(costs.__getitem__, picked)) > 190
+
+
+@pytest.mark.parametrize(
+    ("content", "expected"),
+    [
+        (None, math.nan),
+        ("[]", math.nan),  # perf-suite couldn't run the model
+        ('[{"chars_per_sec": 4000, "p50_ms": 1.0, "p99_ms": 2.0}]', 2000),
+    ]
+)
+def test_read_throughput(tmp_path, content, expected):
+    if content is not None:
+        (tmp_path / hyperopt.PERF_FILE).write_text(content)
+
+    r = hyperopt.read_throughput(str(tmp_path), threads=2)
+
+    assert r["chars_per_sec_per_core"] == pytest.approx(expected, nan_ok=True)
+    assert set(r) == {"chars_per_sec_per_core", "p50_ms", "p99_ms"}
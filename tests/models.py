@@ -0,0 +1,224 @@
+import pytest
+import torch
+
+from attacut import dataloaders, models
+
+DATA_CONFIG = dict(num_tokens=20, num_char_tokens=20)
+
+
+def _inputs(name, lengths):
+    # random features of the model's dataset
+    dataset = models.get_model(name).dataset
+
+    rows = []
+    for l in lengths:
+        if dataset is dataloaders.SyllableSeqDataset:
+            rows.append(torch.randint(1, 20, (1, l)))
+        elif dataset is dataloaders.SyllableStepDataset:
+            w = dataloaders.SyllableStepDataset.MAX_SYLLABLE_CHARS
+            # syllables of 1 to w characters
+            chars = torch.randint(1, 20, (1, w, l)) \
+                * (torch.arange(w).reshape(1, w, 1) < torch.randint(1, w + 1, (1, 1, l))).long()
+            rows.append(torch.cat((torch.randint(1, 20, (1, 1, l)), chars, torch.randint(0, 12, (1, w, l))), dim=1))
+        elif dataset is dataloaders.CharacterSeqDataset:
+            rows.append(torch.stack((torch.randint(1, 20, (1, l)), torch.randint(0, 12, (1, l))), dim=1))
+        else:
+            rows.append(torch.stack((
+                torch.randint(1, 20, (1, l)), torch.randint(0, 12, (1, l)), torch.randint(1, 20, (1, l))
+            ), dim=1))
+
+    return rows
+
+
+def _pad(x, length):
+    return torch.nn.functional.pad(x, (0, length - x.shape[-1]))
+
+
+@pytest.mark.parametrize(
+    ("name", "params"),
+    [
+        ("seq_sy_lstm", "embs:4|cells:6|l1:5|bi:1|do:0.0|oc:BI"),
+        ("seq_sy_lstm", "embs:4|cells:6|l1:5|bi:0|do:0.0|oc:BI"),
+        ("seq_ch_lstm", "embc:4|embt:4|cells:6|l1:5|bi:1|do:0.0|oc:BI"),
+        ("seq_sy_ch_lstm", "embc:4|embt:4|embs:4|cells:6|l1:5|bi:1|do:0.0|oc:BI|crf:0"),
+    ]
+)
+def test_packed_lstm(name, params):
+    torch.manual_seed(71)
+    model = models.get_model(name)(DATA_CONFIG, params).eval()
+
+    assert not model.packed
+    model.packed = True
+
+    lengths = [9, 7, 3]
+    rows = _inputs(name, lengths)
+
+    x = torch.cat([_pad(r, lengths[0]) for r in rows], dim=0)
+    seq_lengths = torch.tensor(lengths)
+
+    with torch.no_grad():
+        batched = model((x, seq_lengths))
+
+        for i, (r, l) in enumerate(zip(rows, lengths)):
+            single = model((r, torch.tensor([l])))
+            torch.testing.assert_close(batched[i, :l], single[0])
+
+        # without packing, the backward direction also reads the paddings
+        # (the forward one never does)
+        model.packed = False
+        padded = model((x, seq_lengths))
+
+    torch.testing.assert_close(padded[0], batched[0])
+
+    if model.lstm.bidirectional:
+        assert not torch.allclose(padded[2, :3], batched[2, :3])
+    else:
+        torch.testing.assert_close(padded[2, :3], batched[2, :3])
+
+
+@pytest.mark.parametrize(
+    ("name", "params"),
+    [
+        ("seq_ch_conv_3lv", "embc:4|embt:4|conv:6|l1:5|do:0.0|oc:BI"),
+        ("seq_sy_ch_conv_3lv", "embc:4|embt:4|embs:4|conv:6|l1:5|do:0.0|oc:BI"),
+        ("seq_sy_ch_conv_3lv", "embc:4|embt:4|embs:4|conv:6|l1:5|do:0.0|oc:BI|crf:1"),
+        ("seq_sy_conv_3lv", "embs:4|conv:6|l1:5|do:0.0|oc:BI"),
+        ("seq_sy_chpool_conv_3lv", "embc:4|embt:4|embs:4|conv:6|l1:5|do:0.0|oc:BI"),
+        ("seq_sy_ch_sepconv_3lv", "embc:4|embt:4|embs:4|conv:6|l1:5|do:0.0|oc:BI"),
+    ]
+)
+def test_predict_packed(name, params):
+    torch.manual_seed(71)
+    model = models.get_model(name)(DATA_CONFIG, params).eval()
+
+    assert models.can_pack(model)
+    assert model.id_conv.receptive_field == 7
+
+    lengths = [9, 1, 3, 12, 2, 7]
+    rows = [r[0] for r in _inputs(name, lengths)]
+
+    with torch.no_grad():
+        # a small max_length so that the lines span several rows
+        packed = models.predict_packed(model, rows, max_length=24)
+
+        for r, l, p in zip(rows, lengths, packed):
+            single = model.decode(model((r.unsqueeze(0), torch.tensor([l]))), torch.tensor([l]))
+            assert list(p[:l]) == list(single[0][:l])
+
+
+@pytest.mark.parametrize(
+    ("name", "params"),
+    [
+        ("seq_sy_ch_conv_3lv", "embc:4|embt:4|embs:4|conv:6|l1:5|do:0.0|oc:BI"),
+        ("seq_ch_sepconv_3lv", "embc:4|embt:4|conv:6|l1:5|do:0.0|oc:BI"),
+        ("seq_sy_sepconv_3lv", "embs:4|conv:6|l1:5|do:0.0|oc:BI"),
+        ("seq_sy_ch_sepconv_3lv", "embc:4|embt:4|embs:4|conv:6|l1:5|do:0.0|oc:BI"),
+    ]
+)
+def test_receptive_field(name, params):
+    torch.manual_seed(71)
+    model = models.get_model(name)(DATA_CONFIG, params).eval()
+
+    field = model.id_conv.receptive_field
+    assert field == 7
+
+    length, pos = 31, 15
+    x = _inputs(name, [length])[0]
+
+    # another character (or syllable) at pos
+    other = x.clone()
+    ids = other[0] if other.dim() == 2 else other[0, 0]
+    ids[pos] = ids[pos] % 19 + 1
+
+    with torch.no_grad():
+        seq_lengths = torch.tensor([length])
+        changed = (model((x, seq_lengths)) - model((other, seq_lengths))).abs().sum(dim=2)[0] > 0
+
+    # only outputs within the receptive field of the changed position change
+    assert changed.nonzero().reshape(-1).tolist() == list(range(pos - field, pos + field + 1))
+
+
+def test_pool_characters():
+    torch.manual_seed(71)
+    model = models.get_model("seq_sy_chpool_conv_3lv")(
+        DATA_CONFIG, "embc:4|embt:4|embs:4|conv:6|l1:5|do:0.0|oc:BI"
+    ).eval()
+
+    x = _inputs("seq_sy_chpool_conv_3lv", [5])[0]
+    w = model.max_syllable_chars
+
+    # characters beyond a syllable's end don't matter
+    other = x.clone()
+    other[:, 1+w:] = torch.where(x[:, 1:1+w] == 0, torch.zeros_like(x[:, 1+w:]), x[:, 1+w:])
+
+    with torch.no_grad():
+        pooled = model.pool_characters(x[:, 1:1+w], x[:, 1+w:])
+        torch.testing.assert_close(pooled, model.pool_characters(other[:, 1:1+w], other[:, 1+w:]))
+
+        assert pooled.shape == (1, 5, 8)
+
+        # a syllable without characters, e.g. a padding, is all zeros
+        x[:, 1:1+w, 2] = 0
+        assert not model.pool_characters(x[:, 1:1+w], x[:, 1+w:])[0, 2].any()
+
+
+def test_pack_sequences():
+    features = [torch.ones(2, l, dtype=torch.long) for l in [3, 4, 5]]
+
+    x, row_lengths, spans = models.pack_sequences(features, gap=2, max_length=10)
+
+    assert spans == [(0, 0, 3), (0, 5, 4), (1, 0, 5)]
+    assert row_lengths.tolist() == [9, 5]
+    assert x.shape == (2, 2, 9)
+    assert x[0, :, 3:5].sum() == 0
+
+
+@pytest.mark.parametrize("dropout", [0, 0.5])
+def test_embedded_dropout(dropout):
+    torch.manual_seed(71)
+    embed = torch.nn.Embedding(30, 4, padding_idx=0)
+    words = torch.tensor([[1, 2, 3, 2], [3, 1, 0, 0]])
+
+    out = models.embedded_dropout(embed, words, dropout=dropout)
+    expected = embed(words)
+
+    # a dropped id is dropped everywhere in the batch
+    for i in words.unique():
+        rows = out[words == i]
+        assert torch.equal(rows, rows[:1].expand_as(rows))
+
+        if dropout == 0 or rows.abs().sum() > 0:
+            scale = 1 / (1 - dropout)
+            torch.testing.assert_close(rows, expected[words == i] * scale)
+
+
+def test_sparse_embeddings():
+    model = models.get_model("seq_sy_lstm")(DATA_CONFIG, "embs:4|cells:6|l1:5|bi:1|do:0.0|oc:BI")
+    weights = models.use_sparse_embeddings(model)
+
+    assert len(weights) == 1
+
+    model((torch.tensor([[3, 4, 5]]), torch.tensor([3]))).sum().backward()
+
+    assert weights[0].grad.is_sparse
+    assert weights[0].grad.coalesce().indices().tolist() == [[3, 4, 5]]
+
+
+@pytest.mark.parametrize("flush_denormal", [False, True])
+def test_zero_small_weights(flush_denormal):
+    state = dict(
+        w=torch.tensor([1e-40, -1e-40, 1e-20, 0.5, 0.0, -2.0]),
+        steps=torch.tensor([3, 0]),
+    )
+
+    torch.set_flush_denormal(flush_denormal)
+    try:
+        zeroed = models.zero_small_weights(state, threshold=torch.finfo(torch.float32).tiny)
+    finally:
+        torch.set_flush_denormal(False)
+
+    assert zeroed == dict(w=2)
+    assert state["w"].tolist() == [0.0, 0.0, torch.tensor(1e-20).item(), 0.5, 0.0, -2.0]
+    assert state["steps"].tolist() == [3, 0]
+
+    assert models.zero_small_weights(state, threshold=1e-10) == dict(w=1)
@@ -31,6 +31,14 @@ from attacut import output_tags
                 "SchemeB": [3, 2, 2, 2, 2, 1, 0]
             }
         ),
+        ( # character sequence, a syllable repeats within the word
+            [1, 0, 0, 0, 1, 0], [7, 7, 8, 7, 9, 9],
+            {
+                "BI": [1, 0, 0, 0, 1, 0],
+                "SchemeA": [1, 0, 0, 0, 1, 0],
+                "SchemeB": [3, 2, 2, 2, 1, 0]
+            }
+        ),
         ( # syllable sequence
             [1, 0, 1, 1, 1, 0, 0], [7, 8, 9, 2, 1, 3],
             {
@@ -56,6 +64,29 @@ def test_encode(labels, sy_ix, expected):
 
         np.testing.assert_array_equal(scheme.encode(labels, sy_ix), exp)
 
+@pytest.mark.parametrize("name", ["BI", "SchemeA", "SchemeB", "SchemeASyLevel", "SchemeBSyLevel"])
+@pytest.mark.parametrize("first_label", [1, 0])
+def test_encode_lines(name, first_label):
+    scheme = output_tags.get_scheme(name)
+    rng = np.random.RandomState(71)
+
+    labels, sy_ix = [], []
+    for _ in range(50):
+        length = rng.randint(1, 30)
+        lb = (rng.rand(length) < 0.3).astype(int)
+        lb[0], lb[-1] = 1, 1
+        labels.append(lb)
+        sy_ix.append(list(rng.choice(["ก", "ข", "ค", ""], length)))
+
+    # lines not starting with a boundary are encoded one by one
+    labels[-1][0] = first_label
+
+    encoded = output_tags.encode_lines(scheme, labels, sy_ix)
+
+    assert len(encoded) == len(labels)
+    for y, lb, sy in zip(encoded, labels, sy_ix):
+        np.testing.assert_array_equal(y, scheme.encode(lb, sy))
+
 @pytest.mark.parametrize(
     ("preds", "expected"),
     [
@@ -0,0 +1,46 @@
+import pytest
+
+from attacut import perf
+
+
+@pytest.mark.parametrize("length", [1, 16, 100])
+def test_synthetic_lines(length):
+    lines = perf.synthetic_lines(length, total_chars=1000)
+
+    assert len(lines) == max(1, 1000 // length)
+    assert all(0 < len(l) <= length for l in lines)
+    assert lines == perf.synthetic_lines(length, total_chars=1000)
+
+
+def _result(chars_per_sec, p99_ms, **kwargs):
+    r = dict(
+        model="attacut-sc", workload="synthetic-32", batch_size=1, threads=1,
+        chars_per_sec=chars_per_sec, p50_ms=1.0, p99_ms=p99_ms,
+        load_time=1.0, peak_rss_mb=100
+    )
+    r.update(kwargs)
+    return r
+
+
+@pytest.mark.parametrize(
+    ("result", "total_regressions"),
+    [
+        (_result(1000, 2.0), 0),
+        (_result(950, 2.1), 0),
+        (_result(800, 2.0), 1),
+        (_result(800, 3.0), 2),
+        (_result(10, 30.0, threads=2), 1),  # not in the baseline, whose measurement is missing
+    ]
+)
+def test_compare(result, total_regressions):
+    baseline = [_result(1000, 2.0)]
+
+    assert len(perf.compare([result], baseline, tolerance=0.1)) == total_regressions
+
+
+def test_compare_extra_results():
+    baseline = [_result(1000, 2.0)]
+    results = baseline + [_result(10, 30.0, threads=2)]
+
+    assert perf.compare(results, baseline) == []
+    assert perf.compare([], baseline) == ["attacut-sc|synthetic-32|1|1: missing"]
@@ -158,3 +158,27 @@ def test_syllable_tokenize(txt, expected):
     print(f"expected: {exp}")
 
     assert act == exp
+
+
+def _preprocess_step_by_step(txt, steps):
+    for s in steps:
+        txt = getattr(preprocessing, "step_%s" % s)(txt) if isinstance(s, str) else s(txt)
+    return txt
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_normalizer_same_as_step_by_step(seed):
+    rng = np.random.RandomState(seed)
+
+    pieces = ["|", "||", "<NE>", "</AB>", "<", "NE>", "\n", " ", "๑", "๒3", "ก", "a", "B"]
+    names = [
+        "remove_tags", "collapse_pipes", "thai_digit_to_arabic_digit",
+        "new_line_as_space", "remove_first_pipe", "remove_last_pipe", "number_tag"
+    ]
+
+    for _ in range(300):
+        txt = "".join(rng.choice(pieces, size=rng.randint(0, 10)))
+        steps = list(rng.choice(names, size=rng.randint(1, 8)))
+
+        assert preprocessing.preprocess(txt, steps=steps) \
+            == _preprocess_step_by_step(txt, steps), (txt, steps)
@@ -0,0 +1,40 @@
+import pytest
+import torch
+
+from attacut import models, pruning
+
+DATA_CONFIG = dict(num_tokens=20)
+MODEL_PARAMS = "embc:4|embt:4|conv:12|l1:6|do:0.0|oc:BI"
+
+
+def _model():
+    torch.manual_seed(71)
+    return models.get_model("seq_ch_conv_3lv")(DATA_CONFIG, MODEL_PARAMS).eval()
+
+
+def _inputs(length=15):
+    x = torch.stack((torch.randint(1, 20, (2, length)), torch.randint(0, 12, (2, length))), dim=1)
+    return x, torch.tensor([length, length])
+
+
+def test_prune_keeping_every_channel():
+    model = _model()
+    inputs = _inputs()
+
+    pruned = pruning.prune(model, DATA_CONFIG, 12)
+
+    torch.testing.assert_close(model(inputs), pruned(inputs))
+
+
+@pytest.mark.parametrize("filters", [1, 4, 11])
+def test_prune_width(filters):
+    model = _model()
+    pruned = pruning.prune(model, DATA_CONFIG, filters)
+
+    assert pruned.model_params == MODEL_PARAMS.replace("conv:12", "conv:%d" % filters)
+    assert pruned.id_conv.conv3.conv.out_channels == filters
+    assert pruned.linear1.in_features == filters
+    assert pruned(_inputs()).shape == (2, 15, 2)
+
+    assert models.count_flops(pruned, _inputs()) < models.count_flops(model, _inputs())
+
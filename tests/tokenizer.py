@@ -1,6 +1,12 @@
+import math
+import multiprocessing
+import shutil
+
 import pytest
+import torch
+import yaml
 
-from attacut import SingletonTokenizer, Tokenizer, tokenize
+from attacut import SingletonTokenizer, Tokenizer, artifacts, models, perf, tokenize
 
 
 @pytest.mark.parametrize(
@@ -32,3 +38,66 @@ def test_tokenize():
     assert t2 == ["ไป", "ด้วย", "ซิ"]
 
     assert SingletonTokenizer._total_object == 1
+
+
+def _save_model(path, name, params):
+    # an untrained model with attacut-sc's dictionaries
+    dict_dir = artifacts.get_path("attacut-sc")
+    for f in ["characters.json", "syllables.json"]:
+        shutil.copy("%s/%s" % (dict_dir, f), str(path))
+
+    torch.manual_seed(71)
+    model_cls = models.get_model(name)
+    model = model_cls(model_cls.dataset(dict_dir=str(path)).setup_featurizer(), params)
+
+    torch.save(model.state_dict(), str(path / "model.pth"))
+
+    with open(str(path / "params.yml"), "w") as fh:
+        yaml.dump(dict(
+            name=name, params=params, training_took=0, lr=0.001, weight_decay=0, epoch=0,
+            num_trainable_params=model.total_trainable_params(),
+        ), fh)
+
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    ("name", "params"),
+    [
+        ("seq_ch_conv_3lv", "embc:4|embt:4|conv:6|l1:5|do:0.0|oc:BI"),
+        ("seq_sy_ch_conv_3lv", "embc:4|embt:4|embs:4|conv:6|l1:5|do:0.0|oc:BI"),
+    ]
+)
+def test_tokenize_parallel(tmp_path, name, params):
+    atta = Tokenizer(_save_model(tmp_path, name, params))
+    txts = ["ภาษาไทยยากจัง", "", "ไปโรงเรียนดีกว่า", "ไปด้วยซิ", "ภาษาไทย"] * 3
+
+    expected = atta.tokenize_batch(txts)
+
+    assert atta.tokenize_parallel(txts, workers=2, chunk_size=2) == expected
+    assert atta.tokenize_parallel(txts, workers=1, chunk_size=2) == expected
+    assert atta.tokenize_parallel([], workers=2) == []
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="workers are forked"
+)
+def test_tokenize_parallel_memory(tmp_path):
+    atta = Tokenizer(_save_model(tmp_path, "seq_ch_conv_3lv", "embc:4|embt:4|conv:6|l1:5|do:0.0|oc:BI"))
+    txts = ["ภาษาไทยยากจัง", "ไปโรงเรียนดีกว่า"] * 20
+
+    atta.tokenize_parallel(txts, workers=2, chunk_size=4)
+
+    stats = atta.worker_stats
+    assert len(stats) == 2
+    assert sum(s["chunks"] for s in stats.values()) == 10
+
+    # the weights are in shared memory, and workers only hold a fraction of
+    # this process' memory as their own
+    assert all(w.is_shared() for w in atta.model.state_dict().values())
+    for s in stats.values():
+        assert s["shared_weights"]
+        assert s["peak_rss_mb"] > 0
+
+        if not math.isnan(s["private_mb"]):
+            assert s["private_mb"] < 0.5 * perf.peak_rss_mb()
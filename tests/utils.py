@@ -1,6 +1,6 @@
 import pytest
 
-from attacut import utils
+from attacut import perf, utils
 
 
 @pytest.mark.parametrize(
@@ -33,3 +33,69 @@ def test_parse_model_params():
     exp = dict(emb=32, l1=48, do=0.5)
 
     assert act == exp
+
+
+def test_profiler():
+    profiler = utils.Profiler(enabled=True)
+
+    for _ in range(3):
+        with profiler.stage("outer"):
+            with profiler.stage("inner"):
+                pass
+
+    stats = profiler.to_dict()
+
+    assert stats["outer"]["calls"] == 3
+    assert stats["inner"]["calls"] == 3
+    assert stats["outer"]["total_time"] >= stats["inner"]["total_time"]
+    assert "inner" in profiler.summary()
+
+
+def test_disabled_profiler():
+    profiler = utils.Profiler()
+
+    with profiler.stage("something"):
+        pass
+
+    assert profiler.to_dict() == dict()
+
+
+@pytest.mark.parametrize(
+    ("mode", "values", "stop_at"),
+    [
+        ("min", [3.0, 2.0, 2.5, 2.1, 1.0], 4),
+        ("max", [0.5, 0.7, 0.6, 0.8, 0.8, 0.7], 6),
+    ]
+)
+def test_early_stopping(mode, values, stop_at):
+    stopper = utils.EarlyStopping(patience=2, mode=mode)
+
+    stopped = [stopper.step(v) for v in values]
+
+    assert stopped.index(True) + 1 == stop_at
+
+
+def test_early_stopping_state():
+    stopper = utils.EarlyStopping(patience=2)
+    for v in [1.0, 2.0]:
+        stopper.step(v)
+
+    restored = utils.EarlyStopping(patience=2)
+    restored.load_state_dict(stopper.state_dict())
+
+    assert restored.best == 1.0
+    assert restored.step(3.0)
+
+    # patience 0 never stops
+    assert not utils.EarlyStopping(patience=0).step(1.0)
+
+
+def test_profiler_memory():
+    profiler = utils.Profiler(enabled=True)
+
+    with profiler.stage("something"):
+        pass
+
+    stats = profiler.to_dict()["something"]
+    assert stats["max_rss_mb"] == pytest.approx(perf.peak_rss_mb(), rel=0.1)
+    assert stats["max_rss_increase_mb"] >= 0
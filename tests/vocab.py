@@ -0,0 +1,44 @@
+from collections import Counter
+
+import pytest
+
+from attacut import vocab
+
+
+def test_count_tokens():
+    syllables, characters = vocab.count_tokens([["ดี", " ", "123"], ["ดี", "."]])
+
+    assert syllables == Counter({"ดี": 2, "<SPACE>": 1, "<NUMBER>": 1, "<PUNC>": 1})
+    assert characters["ด"] == 2
+    assert characters["<PUNC>"] == 1
+    assert "." not in characters
+
+
+@pytest.mark.parametrize(
+    ("min_freq", "top_k", "expected"),
+    [
+        (1, 0, ["<PAD>", "<UNK>", "b", "a", "c"]),
+        (2, 0, ["<PAD>", "<UNK>", "b", "a"]),
+        (1, 1, ["<PAD>", "<UNK>", "b"]),
+    ]
+)
+def test_build(min_freq, top_k, expected):
+    counts = Counter(a=2, b=3, c=1, **{"<UNK>": 5})
+
+    dd = vocab.build(counts, ["<PAD>", "<UNK>"], min_freq=min_freq, top_k=top_k)
+
+    assert dd == dict((t, i) for i, t in enumerate(expected))
+
+
+def test_binary(tmpdir):
+    counts = Counter({"ดี": 3, "a": 1})
+    dd = vocab.build(counts, vocab.CHARACTER_SPECIAL_TOKENS)
+
+    path = "%s/characters.npz" % tmpdir
+    vocab.save_binary(dd, counts, path)
+
+    loaded, loaded_counts = vocab.load_binary(path)
+
+    assert loaded == dd
+    assert loaded_counts["ดี"] == 3
+    assert loaded_counts["<PAD>"] == 0